@@ -38,9 +38,36 @@ def parse_command_line_args(parg, doc):
     #add output_dir argument that accepts filepath
     parser.add_argument('-export_dir', '--export_dir', dest='export_dir', nargs='?', const=parg.export_dir, type=str,
                         help='Output directory for DEM and Ortho products [default=project directory]')
+    parser.add_argument('-prefetch_metadata', '--prefetch_metadata', dest='prefetch_metadata', default=False,
+                        action='store_true',
+                        help='Build the EXIF/XMP header catalog of each flight during setup, kept in '
+                             '~/.metashape_workflow/image_metadata [default=DISABLED].')
+    parser.add_argument('-prescreen', '--prescreen', dest='prescreen', default=False, action='store_true',
+                        help='Skip blurry, badly exposed and take-off/landing photos during setup [default=DISABLED].')
+    parser.add_argument('-flight_catalog', '--flight_catalog', dest='flight_catalog', nargs='?',
+                        const=parg.flight_catalog, type=str,
+                        help='SQLite catalog of scanned flight folders [default=~/.metashape_workflow/flight_catalog.sqlite]')
+    parser.add_argument('-save_mode', '--save_mode', dest='save_mode', nargs='?', const=parg.save_mode, type=str,
+                        choices=['stage', 'interval', 'milestone', 'risky'],
+                        help='When to save the project: after every stage, every -save_interval minutes, '
+                             'after milestones only, or before risky operations [default=stage]')
+    parser.add_argument('-save_interval', '--save_interval', dest='save_interval', nargs='?',
+                        const=parg.save_interval, type=float,
+                        help='Minutes between saves in interval save mode [default=30]')
+    parser.add_argument('-save_measure_bytes', '--save_measure_bytes', dest='save_measure_bytes', default=False,
+                        action='store_true',
+                        help='Report the bytes written by each save, scans the project .files folder after '
+                             'every save [default=DISABLED]')
     # =================== Alignment args ======================================
     parser.add_argument('-align', '--align_images', dest='align', default=False, action='store_true',
                         help='Align images [default=DISABLED].')
+    parser.add_argument('-import_reference', '--import_reference', dest='import_reference', default=False,
+                        action='store_true',
+                        help='Import the geotag CSVs of all flights into the alignment chunk before aligning '
+                             '[default=DISABLED].')
+    parser.add_argument('-incremental', '--incremental', dest='incremental', default=False, action='store_true',
+                        help='Add only new flights to an existing Raw_Photos chunk and align only the new cameras '
+                             'against the existing Raw_Photos_Align chunk [default=DISABLED].')
 
     # =================== RU args =============================================
     parser.add_argument('-ru', '--reconstruction_uncertainty', dest='ru', default=False, action='store_true',
@@ -68,9 +95,44 @@ def parse_command_line_args(parg, doc):
 
     parser.add_argument('-pcbuild', '--pcbuild', dest='pcbuild', default=False, action='store_true',
                     help='Build point cloud [default=DISABLED]')
+    parser.add_argument('-maxconf', '--maxconf', dest='maxconf', nargs='?', const=str(parg.maxconf), type=str,
+                        help='Max confidence of the points removed from the point cloud, or auto to pick it from '
+                             'the confidence histogram of each chunk [default=2]')
+    parser.add_argument('-maxconf_retain', '--maxconf_retain', dest='maxconf_retain', nargs='?',
+                        const=parg.maxconf_retain, type=float,
+                        help='Fraction of the points kept by -maxconf auto [default=0.8]')
+    parser.add_argument('-maxconf_density', '--maxconf_density', dest='maxconf_density', nargs='?',
+                        const=parg.maxconf_density, type=float,
+                        help='Points per m2 kept by -maxconf auto, instead of -maxconf_retain [default=None]')
+    parser.add_argument('-maxconf_report', '--maxconf_report', dest='maxconf_report', default=False,
+                        action='store_true',
+                        help='Report the points and disk space removed by a fixed -maxconf, exports each point '
+                             'cloud once [default=DISABLED]')
+    parser.add_argument('-light_cloud_copy', '--light_cloud_copy', dest='light_cloud_copy', default=False,
+                        action='store_true',
+                        help='Copy cameras, alignment, calibration and tie points but no keypoints into the '
+                             'per camera group point cloud chunks [default=DISABLED].')
+    parser.add_argument('-cloud_workers', '--cloud_workers', dest='cloud_workers', nargs='?',
+                        const=parg.cloud_workers, type=int,
+                        help='Build the per camera group point clouds in this many Metashape processes at the same '
+                             'time, each in its own project [default=1, no parallel build]')
+    parser.add_argument('-cloud_worker_memory', '--cloud_worker_memory', dest='cloud_worker_memory', nargs='?',
+                        const=parg.cloud_worker_memory, type=float,
+                        help='GB of memory per point cloud worker, limits -cloud_workers [default=16]')
+    parser.add_argument('-cloud_keep_projects', '--cloud_keep_projects', dest='cloud_keep_projects', default=False,
+                        action='store_true',
+                        help='Leave parallel point clouds in their per-date projects instead of importing the '
+                             '_PCFiltered chunks [default=DISABLED].')
     # =================== Export args =========================================
     parser.add_argument('-build', '--build', dest='build', default=False, action='store_true',
                         help='Build DEM and Ortho and Export results [default=DISABLED]')
+    parser.add_argument('-export_tile_size', '--export_tile_size', dest='export_tile_size', nargs='?',
+                        const=parg.export_tile_size, type=int,
+                        help='Export the DEM and Ortho as tiles of this many pixels with a .vrt mosaic, '
+                             'resumed when interrupted [default=0, one GeoTIFF each]')
+    parser.add_argument('-export_workers', '--export_workers', dest='export_workers', nargs='?',
+                        const=parg.export_workers, type=int,
+                        help='Metashape processes exporting tiles at the same time [default=1]')
     
     # =================== Logging args =============================================
     parser.add_argument('-log', '--logfile', dest='logfile', nargs='?', const='default.txt', type=str,
@@ -142,10 +204,54 @@ def parse_command_line_args(parg, doc):
 
     if arglist.pcbuild:
         parg.pcbuild = True
+    if arglist.maxconf is not None:
+        # argparse does not apply type to const, a bare -maxconf gives the default as is
+        maxconf = str(arglist.maxconf)
+        if maxconf == 'auto':
+            parg.maxconf = 'auto'
+        elif maxconf.isdigit():
+            parg.maxconf = int(maxconf)
+        else:
+            print('Exception: -maxconf must be an integer or auto.')
+            raise ValueError('-maxconf must be an integer or auto.')
+    if arglist.maxconf_retain is not None:
+        parg.maxconf_retain = arglist.maxconf_retain
+    if arglist.maxconf_density is not None:
+        parg.maxconf_density = arglist.maxconf_density
+    if arglist.maxconf_report:
+        parg.maxconf_report = True
+    if arglist.light_cloud_copy:
+        parg.light_cloud_copy = True
+    if arglist.cloud_workers is not None:
+        parg.cloud_workers = arglist.cloud_workers
+    if arglist.cloud_worker_memory is not None:
+        parg.cloud_worker_memory = arglist.cloud_worker_memory
+    if arglist.cloud_keep_projects:
+        parg.cloud_keep_projects = True
     if arglist.build:
         parg.build = True
+    if arglist.export_tile_size is not None:
+        parg.export_tile_size = arglist.export_tile_size
+    if arglist.export_workers is not None:
+        parg.export_workers = arglist.export_workers
     if arglist.setup:
         parg.setup = True
+    if arglist.incremental:
+        parg.incremental = True
+    if arglist.import_reference:
+        parg.import_reference = True
+    if arglist.prescreen:
+        parg.prescreen = True
+    if arglist.prefetch_metadata:
+        parg.prefetch_metadata = True
+    if arglist.flight_catalog is not None:
+        parg.flight_catalog = arglist.flight_catalog
+    if arglist.save_mode is not None:
+        parg.save_mode = arglist.save_mode
+    if arglist.save_interval is not None:
+        parg.save_interval = arglist.save_interval
+    if arglist.save_measure_bytes:
+        parg.save_measure_bytes = True
     
     # ======== PARSE -LOG ARGUMENT =============================================
     arglist.logfile = 'default.txt'
@@ -179,6 +285,8 @@ def parse_command_line_args(parg, doc):
         align_params = parg.alignment_params
         for key in align_params:
             print(f"    -{key}: {align_params[key]}")
+        if parg.import_reference:
+            print('    Reference imported from flight geotag CSVs before alignment.')
 
     else:
         print('2. Alignment DISABLED.')
@@ -215,16 +323,42 @@ def parse_command_line_args(parg, doc):
         print('7. Setup ENABLED.')
     else:
         print('7. Setup DISABLED.')
+    if parg.incremental:
+        print('    Incremental setup: only new flights are added and aligned.')
+    if parg.prescreen:
+        print('    Photo pre-screen ENABLED: ' + str(parg.prescreen_thresholds))
     
     if parg.pcbuild:
         print('8. Build Point Cloud ENABLED.')
+        if parg.maxconf == 'auto':
+            if parg.maxconf_density is not None:
+                print(f'    Confidence filter level chosen to keep {parg.maxconf_density} points/m2.')
+            else:
+                print(f'    Confidence filter level chosen to keep {100 * parg.maxconf_retain:.0f}% of the points.')
+        else:
+            print(f'    Points with confidence 0-{parg.maxconf} removed.'
+                  + (' Removed points reported.' if parg.maxconf_report else ''))
+        if parg.light_cloud_copy:
+            print('    Per camera group chunks are light copies (no keypoints).')
+        if parg.cloud_workers > 1:
+            print(f'    Point clouds built in up to {parg.cloud_workers} Metashape processes '
+                  f'({parg.cloud_worker_memory} GB each).')
     else:
         print('8. Build Point Cloud DISABLED.')
     
     if parg.build:
         print('9. Build ENABLED.')
+        if parg.export_tile_size:
+            print(f'    Tiled export: {parg.export_tile_size} px tiles, {parg.export_workers} workers, .vrt mosaic.')
     else:   
         print('9. Build DISABLED.')
+
+    if parg.save_mode == 'interval':
+        print('10. Project saved every ' + str(parg.save_interval) + ' minutes.')
+    else:
+        print('10. Project save mode: ' + parg.save_mode + '.')
+    if parg.save_measure_bytes:
+        print('    Bytes written by each save are reported.')
         
     
     
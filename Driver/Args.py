@@ -5,6 +5,7 @@ from datetime import datetime
 import argparse
 import copy as cp
 import math
+from Image_Quality import DEFAULT_THRESHOLDS
 
 class Args():
     """ Simple class to hold arguments """
@@ -34,13 +35,25 @@ defaults.psx_dict ={
 }
 
 defaults.geoid = r"Z:\JTM\Metashape\us_noaa_g2018u0.tif"              # path to geoid file
+defaults.flight_catalog = None     # SQLite catalog of scanned flight folders (None = ~/.metashape_workflow/flight_catalog.sqlite)
+defaults.prefetch_metadata = False  # build the EXIF/XMP header catalog of each flight (kept in ~/.metashape_workflow/image_metadata)
+defaults.prescreen = False          # score photos (sharpness, exposure, altitude) and skip bad ones before addPhotos
+defaults.prescreen_thresholds = dict(DEFAULT_THRESHOLDS)  # see Image_Quality.py, set a threshold to None to skip that check
+#defaults.prescreen_thresholds["min_sharpness"] = 80.0     # e.g. override a single threshold
+defaults.save_mode = 'stage'        # when to save the project: stage, interval, milestone or risky (see Save_Policy.py)
+defaults.save_interval = 30         # minutes between saves in 'interval' save mode
+defaults.save_measure_bytes = False  # report the bytes written by each save (scans the .files folder after every save)
 defaults.dem_resolution = 0
 defaults.ortho_resolution = 0
+defaults.export_tile_size = 0       # export DEM/Ortho as tiles of this many pixels plus a .vrt mosaic (0 = one GeoTIFF each)
+defaults.export_workers = 1         # Metashape processes exporting tiles at the same time (1 = in this project)
 # ------------Alignment defaults -------------------------------------------------------
 defaults.setup = False              # run MS_PSX_Setup.py
 defaults.pcbuild = False            # run MS_Build_PointCloud.py
 defaults.build = False             # run MS_Build_Products.py
 defaults.align = False              # run image alignment
+defaults.import_reference = False   # import all flight geotag CSVs (merged, one importReference) before alignment
+defaults.incremental = False        # add only new flights to an existing Raw_Photos chunk and align only the new cameras
 
 defaults.alignment_params = {
         "downscale": 1, # 0 = Highest, 1 = High, 2 = Medium, 3 = Low, 4 = Lowest
@@ -120,6 +133,13 @@ defaults.pa_increment = 0.2         # increment by which PA filter advanced when
 defaults.re_increment = 0.01        # increment by which RE filter advanced when finding RE level to select re_cutoff percentage [0.01]
 
 #-------------------Build Products defaults--------------------------------------------
-defaults.maxconf = 2               # max confidence level for dense cloud filtering [2]
+defaults.maxconf = 2               # max confidence level for dense cloud filtering, or 'auto' to pick it from the confidence histogram [2]
+defaults.maxconf_retain = 0.8      # fraction of points kept when maxconf is 'auto' [0.8]
+defaults.maxconf_density = None    # points per m2 kept when maxconf is 'auto', used instead of maxconf_retain [None]
+defaults.maxconf_report = False    # report points/disk removed by a fixed maxconf (exports each point cloud once)
+defaults.light_cloud_copy = False  # per camera group chunks copy cameras, calibration and tie points but no keypoints
+defaults.cloud_workers = 1         # point clouds built at the same time in separate Metashape processes (1 = in this project)
+defaults.cloud_worker_memory = 16.0  # GB of memory reserved per point cloud worker, limits cloud_workers
+defaults.cloud_keep_projects = False  # keep the parallel point clouds in their per-date projects instead of importing them
 
 parg = cp.deepcopy(defaults)
\ No newline at end of file
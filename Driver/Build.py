@@ -1,6 +1,20 @@
+from Chunk_Index import copy_chunk, chunk_exists, chunk_labels_with_suffix, reset_chunk_index
+from Parallel_Cloud import build_clouds_parallel
+from Cloud_Confidence import choose_maxconf
+from Tiled_Export import export_raster_tiled
+from Save_Policy import SavePolicy, save_document
 
 
-def copy_chunks_for_cloud(post_error_chunk, doc):
+def copy_chunks_for_cloud(post_error_chunk, doc, light=False):
+    """
+    Copy the post-error chunk once per camera group (flight date) for building point clouds
+        args:
+            light = copy the cameras, alignment, calibration and tie points but no keypoints, depth maps or
+                    clouds. The tie points are kept because depth map building uses them to estimate the depth
+                    range of each camera; the keypoints are only needed to match more photos.
+        returns:
+            list of str labels of the per-group chunks
+    """
     activate_chunk(doc, post_error_chunk)
     chunk = doc.chunk
     #Re-enable all cameras in the chunk (e.g. select or "check" cameras in reference pane) 
@@ -13,29 +27,29 @@ def copy_chunks_for_cloud(post_error_chunk, doc):
     copied_list = []
     #Create copies of the chunk for each camera group (different flight dates separated for building dense cloiud and rasters)
     print("Camera groups: " + str(chunk.camera_groups))
-    chunk_label_list = [chunk.label for chunk in doc.chunks]
     #check if any chunks already contain "_PostError" suffix 
     #and return the chunks that do
-
-    
-    post_error_chunks = [chunk for chunk in doc.chunks if chunk.label.endswith('_PostError') or chunk.label.endswith('_PostError_PCFiltered')]
+    post_error_chunks = chunk_labels_with_suffix(doc, '_PostError', '_PostError_PCFiltered')
     
     if len(post_error_chunks) > 0:
         print(f"The following PostError chunks already exist, skipping: {post_error_chunks}")
-        return [chunk.label for chunk in post_error_chunks]
+        return post_error_chunks
     
     for group in chunk.camera_groups:
         print("Copying chunk " + chunk.label + " for camera group " + group.label)
         #create a new chunk
         chunk = activate_chunk(doc, post_error_chunk)
 
-        if activate_chunk(doc, group.label + '_PostError') is not None:
+        if chunk_exists(doc, group.label + '_PostError'):
             print("Chunk " + group.label + "_PostError already exists, skipping")
             copied_list.append(chunk.label + '_PostError')
             break
-        new_chunk = chunk.copy()
         #label the new chunk with the group name
-        new_chunk.label = group.label + '_PostError'
+        if light:
+            new_chunk = copy_chunk(doc, chunk, group.label + '_PostError',
+                                   items=[Metashape.DataSource.TiePointsData], keypoints=False)
+        else:
+            new_chunk = copy_chunk(doc, chunk, group.label + '_PostError')
         activate_chunk(doc, new_chunk.label)
         copied_list.append(new_chunk.label)
         #remove all other camera groups from the new chunk
@@ -45,39 +59,42 @@ def copy_chunks_for_cloud(post_error_chunk, doc):
     print("Copied chunks: " + str(copied_list))
     return copied_list
     
-def buildDenseCloud(input_chunk, doc):
+def buildDenseCloud(input_chunk, doc, save_policy=None):
     print("Building Dense Cloud and Filtering Point Cloud for " + input_chunk)
     activate_chunk(doc, input_chunk)
     chunk = doc.chunk
     print("Chunk: " + chunk.label)
     try:
         print("Building Dense Cloud for " + input_chunk)
+        # depth maps are the most likely step to crash or run out of memory
+        save_document(doc, save_policy, 'risky', 'Depth Maps ' + input_chunk)
         #Point Cloud Quality:Ultra = 1, High = 2, Medium = 4, Low = 8, Lowest = 16
         chunk.buildDepthMaps(downscale = 2, filter_mode = Metashape.MildFiltering)
         chunk.buildPointCloud(point_confidence = True, point_colors = True)
-        doc.save()
+        save_document(doc, save_policy, 'stage', 'Dense Cloud ' + input_chunk)
     except RuntimeError as e:
         print("Error building dense cloud for " + input_chunk)
         print(e)
-        doc.save()
+        save_document(doc, save_policy, 'error', 'Dense Cloud ' + input_chunk)
         return
 
-def filter_point_cloud(input_chunk, maxconf, doc):
-    
+def filter_point_cloud(input_chunk, maxconf, doc, retain = None, density = None, report = False):
+    # maxconf = 'auto' picks the highest confidence level that still keeps the retain fraction
+    # (or density in points/m2) of the points, from the confidence histogram of the chunk.
+    # report = print the points and disk space a fixed maxconf removes (exports the point cloud once)
     chunk = activate_chunk(doc, input_chunk)
-    chunk_label_list = [chunk.label for chunk in doc.chunks]
-    #check if any chunks already contain "_PostError" suffix 
+    #check if any chunks already contain "_PCFiltered" suffix 
     #and return the chunks that do
-    chunk = activate_chunk(doc, input_chunk)
-    filtered_chunks = [chunk for chunk_label in chunk_label_list if chunk_label.endswith(str(chunk.label+'_PCFiltered'))]
+    filtered_chunks = chunk_labels_with_suffix(doc, chunk.label + '_PCFiltered')
 
     if len(filtered_chunks) > 0:
         print("Point clouid already filtered, skipping....")
         filt_chunk = input_chunk + '_PCFiltered'
         return filt_chunk
     print("Filtering Point Cloud for " + input_chunk)
-    filter_chunk = chunk.copy()
-    filter_chunk.label = chunk.label + '_PCFiltered'
+    # expected points and disk space removed, reported before the chunk is copied
+    maxconf, _ = choose_maxconf(chunk, maxconf, retain = retain, density = density, report = report)
+    filter_chunk = copy_chunk(doc, chunk, chunk.label + '_PCFiltered')
     print('Copied chunk ' + chunk.label + ' to chunk ' + filter_chunk.label + ' for filtering ')
     filter_chunk.point_cloud.setConfidenceFilter(0, maxconf)  # configuring point cloud filter so that only point with low-confidence currently active
     all_points_classes = list(range(128))
@@ -87,7 +104,7 @@ def filter_point_cloud(input_chunk, maxconf, doc):
     
     return filter_chunk.label
 
-def buildDEMOrtho(input_chunk, doc, ortho_res = None, dem_res = None, interpolation = False):
+def buildDEMOrtho(input_chunk, doc, ortho_res = None, dem_res = None, interpolation = False, save_policy = None):
     # Ensure Metashape is running and a document is open
     print("Building DEM and Orthomosaic for " + input_chunk)
     activate_chunk(doc, input_chunk)  # Assuming doc is defined globally or passed to the function.
@@ -155,9 +172,9 @@ def buildDEMOrtho(input_chunk, doc, ortho_res = None, dem_res = None, interpolat
         
         
         
-    doc.save()
+    save_document(doc, save_policy, 'stage', 'DEM/Orthomosaic ' + input_chunk)
 
-def exportDEMOrtho(input_chunk, path_to_save_dem=None, path_to_save_ortho = None, geoidPath = None, ortho_res = None, dem_res = None):
+def exportDEMOrtho(input_chunk, path_to_save_dem=None, path_to_save_ortho = None, geoidPath = None, ortho_res = None, dem_res = None, save_policy = None, tile_size = 0, workers = 1, proclog = None):
     """
     Export the DEM and Orthomosaic from the provided chunk to specified file paths.
 
@@ -165,6 +182,10 @@ def exportDEMOrtho(input_chunk, path_to_save_dem=None, path_to_save_ortho = None
         chunk (Metashape.Chunk): The chunk containing the DEM and orthomosaic to export.
         path_to_save_dem (str): The file path to save the DEM.
         path_to_save_ortho (str): The file path to save the orthomosaic.
+        save_policy (SavePolicy): When to save the project, None saves after the export.
+        tile_size (int): Export tiles of tile_size pixels and a .vrt mosaic (paths end in .vrt), 0 = one GeoTIFF.
+        workers (int): Metashape processes exporting tiles at the same time (see Tiled_Export.py).
+        proclog (str): Processing log the tiled export report is appended to.
     """
     
     # Ensure Metashape is running and a document is open
@@ -217,7 +238,12 @@ def exportDEMOrtho(input_chunk, path_to_save_dem=None, path_to_save_ortho = None
                     UNIT["metre",1,AUTHORITY["EPSG","9001"]]]]'''
 
     output_projection.crs = Metashape.CoordinateSystem(coordWKT) # or your desired output CRS
-    if path_to_save_dem is not None:
+    save_document(doc, save_policy, 'risky', 'Export ' + input_chunk)
+    if path_to_save_dem is not None and tile_size:
+        export_raster_tiled(doc, chunk, path_to_save_dem, 'dem', output_projection, resolution = dem_res,
+                            tile_size = tile_size, workers = workers, geoid = geoidPath, save_policy = save_policy,
+                            proclog = proclog)
+    elif path_to_save_dem is not None:
         # Exporting the DEM with specified projection
         
         chunk.exportRaster(path=path_to_save_dem,
@@ -226,7 +252,11 @@ def exportDEMOrtho(input_chunk, path_to_save_dem=None, path_to_save_ortho = None
                         resolution = dem_res)  # Using the custom CRS
         print("DEM Exported Successfully!")
     
-    if path_to_save_ortho is not None:
+    if path_to_save_ortho is not None and tile_size:
+        export_raster_tiled(doc, chunk, path_to_save_ortho, 'ortho', output_projection, resolution = ortho_res,
+                            tile_size = tile_size, workers = workers, geoid = geoidPath, save_policy = save_policy,
+                            proclog = proclog)
+    elif path_to_save_ortho is not None:
         # Exporting the Orthomosaic with specified projection
         compression = Metashape.ImageCompression()
         compression.tiff_big = True
@@ -238,7 +268,7 @@ def exportDEMOrtho(input_chunk, path_to_save_dem=None, path_to_save_ortho = None
         print("Orthomosaic Exported Successfully!")
     
 
-    doc.save()
+    save_document(doc, save_policy, 'stage', 'Export ' + input_chunk)
     return output_projection.crs, chunk.crs
 
     
@@ -266,6 +296,10 @@ def main(parg, doc):
             doc.open(psx_file)
         except:
             doc.open(psx_file)
+        # new project loaded into the same document, drop the old label index
+        reset_chunk_index(doc)
+        save_policy = SavePolicy(parg.save_mode, parg.save_interval, measure_bytes=parg.save_measure_bytes,
+                                 proclog=parg.proclogname if parg.log else None)
         # Get the active chunk
         doc = Metashape.app.document
         if parg.setup==False and parg.align==False and parg.ru==False and parg.pa==False and parg.re==False and parg.pcbuild==False and parg.build==False:
@@ -305,35 +339,54 @@ def main(parg, doc):
                     f.write("User Tags: " + str(user_tag) + "\n")
                     
 
-            geo_ref_list, chunk = setup_psx(user_tag,flight_folders, doc)
+            geo_ref_list, chunk = setup_psx(user_tag,flight_folders, doc, catalog_path = parg.flight_catalog,
+                                            incremental = parg.incremental,
+                                            prescreen = parg.prescreen_thresholds if parg.prescreen else None,
+                                            prefetch_metadata = parg.prefetch_metadata)
             geo_ref_dict[psx] = geo_ref_list
         else:
             geo_ref_dict = {}
-            geo_ref_list, chunk = setup_psx(user_tag, flight_folders, doc, load_photos = False)
+            geo_ref_list, chunk = setup_psx(user_tag, flight_folders, doc, load_photos = False, catalog_path = parg.flight_catalog)
             geo_ref_dict[psx] = geo_ref_list
             
-        doc.save(psx)
+        save_policy.save(doc, 'milestone', 'Setup', path=psx)
         # ALIGN IMAGES
         if parg.align:
             align_start = datetime.now()
             #Aactivate last chunk in the list
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             #chunk = activate_chunk(doc, chunk_label_list[-1])
             chunk = activate_chunk(doc, 'Raw_Photos')
-            # copy active chunk, rename, make active
-            align_chunk = chunk.copy()
-            align_chunk.label = chunk.label + '_Align'
-            print('Copied chunk ' + chunk.label + ' to chunk ' + align_chunk.label)
-
             geo_ref_list = geo_ref_dict[psx] 
-
-            align_images(align_chunk, parg.alignment_params)
+            if parg.incremental and chunk_exists(doc, chunk.label + '_Align'):
+                # align only the cameras added since the last alignment against the existing block
+                align_chunk = activate_chunk(doc, chunk.label + '_Align')
+                new_cameras = add_new_cameras(chunk, align_chunk)
+                align_message = 'Added ' + str(len(new_cameras)) + ' new cameras from chunk ' + chunk.label + ' to chunk ' + align_chunk.label
+                print(align_message)
+                if parg.import_reference and len(new_cameras) > 0:
+                    # one merged importReference for all flights
+                    import_references(align_chunk, geo_ref_list)
+                if len(new_cameras) > 0:
+                    align_new_cameras(align_chunk, new_cameras, parg.alignment_params)
+            else:
+                # copy active chunk, rename, make active
+                align_chunk = copy_chunk(doc, chunk, chunk.label + '_Align')
+                align_message = 'Copied chunk ' + chunk.label + ' to chunk ' + align_chunk.label
+                print(align_message)
+                alignment_params = dict(parg.alignment_params)
+                if parg.incremental:
+                    # keep key points so flights added later can be matched against this block
+                    alignment_params['keep_keypoints'] = True
+                if parg.import_reference:
+                    # one merged importReference for all flights
+                    import_references(align_chunk, geo_ref_list)
+                align_images(align_chunk, alignment_params)
 
             if parg.log:    
                 with open(parg.proclogname, 'a') as f:
                     f.write("\n")
                     f.write("============= ALIGNMENT =============\n")
-                    f.write("Copied chunk " + chunk.label + " to chunk " + align_chunk.label + "\n")
+                    f.write(align_message + "\n")
                     f.write("Geo Ref List: " + str(geo_ref_list) + "\n")
                     align_params = parg.alignment_params
                     for key in align_params:
@@ -342,11 +395,10 @@ def main(parg, doc):
             print(f"Geo Ref List: {geo_ref_list}")
             #for geo_ref in geo_ref_list:    
                 #chunk.importReference(os.path.join(geo_ref), delimiter = ',', columns = 'nxyzabcXZ')
-            doc.save()
+            save_policy.save(doc, 'milestone', 'Alignment')
 
         # RECONSTRUCTION UNCERTAINTY
         if parg.ru:
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             #chunk = activate_chunk(doc, chunk_label_list[-1])
             chunk = activate_chunk(doc, 'Raw_Photos_Align')
             # check that chunk has a point cloud
@@ -360,10 +412,9 @@ def main(parg, doc):
                                                             'was performed. Stopping execution.')
 
             # copy active chunk, rename, make active
-            ru_chunk = chunk.copy()
-            ru_chunk.label = chunk.label + '_RU' + str(parg.ru_filt_level)
+            ru_chunk = copy_chunk(doc, chunk, chunk.label + '_RU' + str(parg.ru_filt_level))
             print('Copied chunk ' + chunk.label + ' to chunk ' + ru_chunk.label)
-            doc.save()
+            save_policy.save(doc, 'stage', 'Copied ' + ru_chunk.label)
 
             # Run Reconstruction Uncertainty using reconstruction_uncertainty function
             print('Running Reconstruction Uncertainty optimization')
@@ -380,11 +431,10 @@ def main(parg, doc):
                                         log=True, proclog=parg.proclogname)
             else:
                 reconstruction_uncertainty(ru_chunk, parg.ru_filt_level, parg.ru_cutoff, parg.ru_increment, parg.cam_opt_param)
-            doc.save()
+            save_policy.save(doc, 'stage', 'Reconstruction Uncertainty')
 
         # PROJECTION ACCURACY
         if parg.pa:
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             #chunk = activate_chunk(doc, chunk_label_list[-1])
             chunk = activate_chunk(doc, "Raw_Photos_Align_RU10")
             # check that chunk has a point cloud
@@ -398,8 +448,7 @@ def main(parg, doc):
                                                             'was performed. Stopping execution.')
 
             # copy active chunk, rename, make active
-            pa_chunk = chunk.copy()
-            pa_chunk.label = chunk.label + '_PA' + str(parg.pa_filt_level)
+            pa_chunk = copy_chunk(doc, chunk, chunk.label + '_PA' + str(parg.pa_filt_level))
             print('Copied chunk ' + chunk.label + ' to chunk ' + pa_chunk.label)
 
 
@@ -417,11 +466,10 @@ def main(parg, doc):
                                     proclog=parg.proclogname)
             else:
                 projection_accuracy(pa_chunk, parg.pa_filt_level, parg.pa_cutoff, parg.pa_increment, parg.cam_opt_param)
-            doc.save()
+            save_policy.save(doc, 'stage', 'Projection Accuracy')
 
         # REPROJECTION ERROR
         if parg.re:
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             #chunk = activate_chunk(doc, chunk_label_list[-1])
             chunk = activate_chunk(doc, f"Raw_Photos_Align_RU{parg.ru_filt_level}_PA{parg.pa_filt_level}")
             R1_opt = parg.re_round1_opt # number of optimizations for round 1
@@ -441,8 +489,7 @@ def main(parg, doc):
                                                             'was performed. Stopping execution.')
             # copy active chunk, rename, make active
             label = chunk.label
-            re_chunk = chunk.copy()
-            re_chunk.label = f"{label}_RE{parg.re_filt_level}_TPA{R2_TPA}"
+            re_chunk = copy_chunk(doc, chunk, f"{label}_RE{parg.re_filt_level}_TPA{R2_TPA}")
             print('Copied chunk ' + chunk.label + ' to chunk ' + re_chunk.label)
 
             # Run Reprojection Error using reprojection_error function
@@ -461,7 +508,7 @@ def main(parg, doc):
             else:
                 reprojection_error(re_chunk, parg.re_filt_level, parg.re_cutoff, parg.re_increment, parg.cam_opt_param, RMSE_goal, R1_opt, R2_opt, R2_TPA)
         
-            doc.save()
+            save_policy.save(doc, 'milestone', 'Reprojection Error')
 
         if parg.pcbuild:
             print("----------------------------------------------------------------------------------------")
@@ -469,10 +516,9 @@ def main(parg, doc):
             chunk = doc.chunk
             maxconf = parg.maxconf
             print("Building Point Clouds")
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             post_error_chunk = f"Raw_Photos_Align_RU{parg.ru_filt_level}_PA{parg.pa_filt_level}_RE{parg.re_filt_level}_TPA{parg.re_round2_TPA}"
             pc_chunk = f"{post_error_chunk}_PCFiltered"
-            post_error_chunk_list = [chunk for chunk in chunk_label_list if chunk.endswith(post_error_chunk)]
+            post_error_chunk_list = chunk_labels_with_suffix(doc, post_error_chunk)
             print("Chunks to process: " + str(post_error_chunk_list))
             if len(post_error_chunk_list) == 0:
                 post_error_chunk_list = [chunk.label]
@@ -483,29 +529,45 @@ def main(parg, doc):
             #------------Build Dense Cloud and Filter Point Cloud-----------------#
                 try:
                     print("-------------------------------COPY CHUNKS FOR CLOUD---------------------------------------\n")
-                    copied_list = copy_chunks_for_cloud(current_chunk, doc)
-                    for copied_chunk in copied_list:
-                        chunk = activate_chunk(doc, copied_chunk)
-                        if len(chunk.depth_maps_sets) == 0: #Check that a point cloud doesnt already exist
-                            print("-------------------------------BUILD DENSE CLOUD---------------------------------------\n")
-
-                            cloud_start = datetime.now()
-                            buildDenseCloud(copied_chunk, doc)
-                            if parg.log:
-                                with open(parg.proclogname, 'a') as f:
-                                    f.write("\n==================POINT CLOUD=============================== \n")
-                                    f.write("Built Dense Cloud and Filtered Point Cloud for chunk " + copied_chunk + ".\n")
-                                    f.write("Point Cloud Quality: High \n")
-                                    f.write("Point Cloud Filter: Mild \n")
-                                    f.write("Fltered by Confidence Level: " + str(maxconf) + "\n")
-                                    f.write("Processing time: " + str(datetime.now() - cloud_start) + "\n")
-                        print("-------------------------------FILTER DENSE CLOUD---------------------------------------")
-                        filtered_chunk = filter_point_cloud(copied_chunk, maxconf, doc)
+                    copied_list = copy_chunks_for_cloud(current_chunk, doc, light=parg.light_cloud_copy)
+                    if parg.cloud_workers > 1:
+                        print("-------------------------------BUILD DENSE CLOUDS IN PARALLEL---------------------------------------\n")
+                        build_clouds_parallel(doc, copied_list, maxconf, max_workers=parg.cloud_workers,
+                                              memory_per_worker_gb=parg.cloud_worker_memory,
+                                              import_back=not parg.cloud_keep_projects,
+                                              proclog=parg.proclogname if parg.log else None,
+                                              retain=parg.maxconf_retain, density=parg.maxconf_density,
+                                              report=parg.maxconf_report)
+                    else:
+                        for copied_chunk in copied_list:
+                            chunk = activate_chunk(doc, copied_chunk)
+                            if len(chunk.depth_maps_sets) == 0: #Check that a point cloud doesnt already exist
+                                print("-------------------------------BUILD DENSE CLOUD---------------------------------------\n")
+
+                                cloud_start = datetime.now()
+                                buildDenseCloud(copied_chunk, doc, save_policy=save_policy)
+                                if parg.log:
+                                    with open(parg.proclogname, 'a') as f:
+                                        f.write("\n==================POINT CLOUD=============================== \n")
+                                        f.write("Built Dense Cloud and Filtered Point Cloud for chunk " + copied_chunk + ".\n")
+                                        f.write("Point Cloud Quality: High \n")
+                                        f.write("Point Cloud Filter: Mild \n")
+                                        f.write("Fltered by Confidence Level: " + str(maxconf) + "\n")
+                                        f.write("Processing time: " + str(datetime.now() - cloud_start) + "\n")
+                            print("-------------------------------FILTER DENSE CLOUD---------------------------------------")
+                            filtered_chunk = filter_point_cloud(copied_chunk, maxconf, doc, retain=parg.maxconf_retain,
+                                                                 density=parg.maxconf_density,
+                                                                 report=parg.maxconf_report)
                 except Exception as e:
                     print("Error processing " + current_chunk)
                     print(e)
-                    doc.save()
+                    save_policy.save(doc, 'error', current_chunk)
                     continue
+            # stage mode keeps the original saves (each serial cloud is saved by buildDenseCloud), the other
+            # modes save the filtered point clouds here. Clouds built in parallel are only appended to doc,
+            # so they are saved here in every mode.
+            if save_policy.mode != 'stage' or parg.cloud_workers > 1:
+                save_policy.save(doc, 'milestone', 'Point Clouds')
             if parg.log:
                 with open(parg.proclogname, 'a') as f:
                     f.write(f"\n{len(copied_list)} Point Clouds built and filtered in {datetime.now() - pcbuild_start}\n")
@@ -525,8 +587,7 @@ def main(parg, doc):
             print("Output folder: " + psx_folder)
             os.makedirs(os.path.dirname(psx_folder), exist_ok=True)
             
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
-            pc_chunk_list = [chunk for chunk in chunk_label_list if chunk.endswith("_PCFiltered")]
+            pc_chunk_list = chunk_labels_with_suffix(doc, "_PCFiltered")
             
             #Get the chunk names and create a counter for progress updates
             for current_chunk, i in zip(pc_chunk_list, range(len(pc_chunk_list))):
@@ -540,14 +601,20 @@ def main(parg, doc):
                 
                 chunk = activate_chunk(doc, current_chunk)
                 if chunk.elevation is None:    
-                    buildDEMOrtho(current_chunk, doc, ortho_res = parg.ortho_resolution, dem_res = parg.dem_resolution)
+                    buildDEMOrtho(current_chunk, doc, ortho_res = parg.ortho_resolution, dem_res = parg.dem_resolution, save_policy=save_policy)
                 print("-------------------------------EXPORT DEM/ORTHO---------------------------------------")
-                outputOrtho = os.path.join(psx_folder, os.path.basename(psx)[:-4] + "____" + current_chunk + "_Ortho.tif") #[:-4] removes .psx extension
-                outputDEM = os.path.join(psx_folder, os.path.basename(psx)[:-4] + "____" + current_chunk + "_DEM.tif")
-                if os.path.exists(outputDEM) or os.path.exists(outputOrtho):
+                # tiled exports are a .vrt mosaic, written once all tiles exist
+                raster_ext = ".vrt" if parg.export_tile_size else ".tif"
+                outputOrtho = os.path.join(psx_folder, os.path.basename(psx)[:-4] + "____" + current_chunk + "_Ortho" + raster_ext) #[:-4] removes .psx extension
+                outputDEM = os.path.join(psx_folder, os.path.basename(psx)[:-4] + "____" + current_chunk + "_DEM" + raster_ext)
+                exported = [os.path.exists(outputDEM), os.path.exists(outputOrtho)]
+                # an unfinished tiled export is resumed from its tile state
+                if (all(exported) if parg.export_tile_size else any(exported)):
                     print("File already exists, skipping " + outputDEM + " and " + outputOrtho + " of " + psx_name)
                     continue
-                out_crs, in_crs = exportDEMOrtho(current_chunk, path_to_save_dem = outputDEM, path_to_save_ortho=outputOrtho, geoidPath=geoidPath, ortho_res = parg.ortho_resolution, dem_res = parg.dem_resolution)
+                out_crs, in_crs = exportDEMOrtho(current_chunk, path_to_save_dem = outputDEM, path_to_save_ortho=outputOrtho, geoidPath=geoidPath, ortho_res = parg.ortho_resolution, dem_res = parg.dem_resolution, save_policy=save_policy,
+                                                 tile_size=parg.export_tile_size, workers=parg.export_workers,
+                                                 proclog=parg.proclogname if parg.log else None)
                 if parg.log:
                     # if logging enabled use kwargs
                     print('Logging to file ' + parg.proclogname)
@@ -559,7 +626,7 @@ def main(parg, doc):
                         metadata = chunk.meta
                         for key, value in metadata.items():
                             f.write(f"{key}: {value}\n")
-            doc.save()
+            save_policy.save(doc, 'milestone', 'Exports')
             
             if parg.log:
                 # if logging enabled use kwargs
@@ -576,11 +643,14 @@ def main(parg, doc):
                     
                     #f.write('\nChunk CRS: {}'.format(in_crs))
                     #f.write('\nOutput CRS: {}'.format(out_crs))
+        save_policy.save(doc, 'final', psx_name)
         processing_end = datetime.now()
         if parg.log:
             with open(parg.proclogname, 'a') as f:
                 f.write("\n")
                 f.write("============= PROCESSING END =============\n")
+            save_policy.write_summary()
+            with open(parg.proclogname, 'a') as f:
                 f.write("Processing ended at: " + str(processing_end) + "\n")
                 f.write("Processing time: " + str(processing_end - processing_start) + "\n")
                 f.write("============= END OF PROCESSING =============\n")
@@ -0,0 +1,161 @@
+# Document level label -> chunk index.
+# Reading chunk.label goes through the Python/C++ boundary, so scanning doc.chunks for every lookup
+# gets expensive in projects with dozens of sweep chunks. The index is built once per document and
+# kept current by copy_chunk, relabel_chunk and remove_chunk. Chunks created or removed any other way
+# change the chunk count and rebuild the index; chunks relabeled any other way are caught by the label
+# checks of find_chunks and chunk_labels_with_suffix.
+# Metashape.app.document returns a new wrapper on every access, so documents are identified by their
+# project path (unsaved documents by the wrapper id).
+
+# {doc key: [number of chunks, {label: [chunk, ...]}]}
+_chunk_indexes = {}
+
+
+def _doc_key(doc):
+    return doc.path or id(doc)
+
+
+def refresh_chunk_index(doc):
+    """
+    Rebuild the label index of a document from doc.chunks
+        args:
+            doc = Metashape.Document
+        returns:
+            index = dict of {label: [chunks with that label]}
+    """
+    chunks = doc.chunks
+    index = {}
+    for chunk in chunks:
+        index.setdefault(chunk.label, []).append(chunk)
+    _chunk_indexes[_doc_key(doc)] = [len(chunks), index]
+    return index
+
+
+def reset_chunk_index(doc):
+    """
+    Drop the index of a document, e.g. after doc.open() loads a different project
+    """
+    _chunk_indexes.pop(_doc_key(doc), None)
+
+
+def get_chunk_index(doc):
+    entry = _chunk_indexes.get(_doc_key(doc))
+    if entry is None or entry[0] != len(doc.chunks):
+        return refresh_chunk_index(doc)
+    return entry[1]
+
+
+def find_chunks(doc, label):
+    """
+    Return all chunks labeled label
+        args:
+            doc = Metashape.Document
+            label = str chunk label
+        returns:
+            list of chunks (empty if none)
+    """
+    chunks = get_chunk_index(doc).get(label, [])
+    # a chunk relabeled outside our helpers no longer matches its index entry, rebuild in that case
+    try:
+        current = all(chunk.label == label for chunk in chunks)
+    except (RuntimeError, ValueError):
+        current = False
+    if not current:
+        chunks = refresh_chunk_index(doc).get(label, [])
+    return list(chunks)
+
+
+def chunk_exists(doc, label):
+    return len(find_chunks(doc, label)) > 0
+
+
+def chunk_labels(doc):
+    """ Labels of all indexed chunks, duplicates listed once """
+    return [label for label, chunks in get_chunk_index(doc).items() if chunks]
+
+
+def chunk_labels_with_suffix(doc, *suffixes):
+    """
+    Labels of all indexed chunks ending with any of suffixes
+        args:
+            doc = Metashape.Document
+            suffixes = one or more str suffixes
+        returns:
+            list of str labels
+    """
+    index = get_chunk_index(doc)
+    labels = [label for label, chunks in index.items() if chunks and label.endswith(suffixes)]
+    # chunks relabeled outside our helpers no longer match their index entries, rebuild in that case
+    try:
+        current = all(chunk.label == label for label in labels for chunk in index[label])
+    except (RuntimeError, ValueError):
+        current = False
+    if not current:
+        index = refresh_chunk_index(doc)
+        labels = [label for label, chunks in index.items() if chunks and label.endswith(suffixes)]
+    return labels
+
+
+def _add_to_index(doc, chunk, label, added=False):
+    # added = chunk is new in the document (copy), the stored chunk count follows it
+    entry = _chunk_indexes.get(_doc_key(doc))
+    if entry is None or entry[0] != len(doc.chunks) - (1 if added else 0):
+        # the index is out of date anyway, the rebuild picks up the chunk
+        refresh_chunk_index(doc)
+        return
+    entry[1].setdefault(label, []).append(chunk)
+    if added:
+        entry[0] += 1
+
+
+def _drop_from_index(doc, chunk, label, removed=False):
+    # removed = chunk was removed from the document
+    entry = _chunk_indexes.get(_doc_key(doc))
+    if entry is None or entry[0] != len(doc.chunks) + (1 if removed else 0):
+        refresh_chunk_index(doc)
+        return
+    index = entry[1]
+    if removed:
+        entry[0] -= 1
+    remaining = [c for c in index.get(label, []) if c != chunk]
+    if remaining:
+        index[label] = remaining
+    else:
+        index.pop(label, None)
+
+
+def copy_chunk(doc, chunk, label=None, **copy_kwargs):
+    """
+    Copy a chunk and register the copy in the label index
+        args:
+            doc = Metashape.Document containing chunk
+            chunk = Metashape.Chunk to copy
+            label = str label of the copy [default = same label as chunk]
+            copy_kwargs = passed through to chunk.copy()
+        returns:
+            new_chunk = the copy
+    """
+    new_chunk = chunk.copy(**copy_kwargs)
+    if label is not None:
+        new_chunk.label = label
+    _add_to_index(doc, new_chunk, new_chunk.label, added=True)
+    return new_chunk
+
+
+def relabel_chunk(doc, chunk, label):
+    """
+    Change a chunk label and move its index entry
+    """
+    _drop_from_index(doc, chunk, chunk.label)
+    chunk.label = label
+    _add_to_index(doc, chunk, label)
+    return chunk
+
+
+def remove_chunk(doc, chunk):
+    """
+    Remove a chunk from the document and from the label index
+    """
+    label = chunk.label
+    doc.remove(chunk)
+    _drop_from_index(doc, chunk, label, removed=True)
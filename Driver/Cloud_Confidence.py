@@ -0,0 +1,191 @@
+import Metashape
+import os
+import tempfile
+import numpy as np
+
+# Point confidence histogram of a chunk's point cloud, to choose maxconf before filter_point_cloud.
+# The point cloud is exported once as a binary PLY holding only x, y, z and confidence, the confidence
+# column is read through a memory map and counted with np.bincount. The histogram is kept in the point
+# cloud meta data, so a chunk is only scanned again when its point count changes. From the histogram
+# maxconf is picked for a target fraction of points kept (or points per square metre), and the points
+# and disk space the filter will remove are reported before the chunk is copied.
+
+# approximate size of one point in a Metashape point cloud (position, color, normal, confidence, class)
+BYTES_PER_POINT = 28
+# highest confidence the filter can remove
+MAX_CONFIDENCE = 255
+HISTOGRAM_KEY = 'Confidence/histogram'
+COUNT_KEY = 'Confidence/point_count'
+
+PLY_TYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1', 'short': 'i2', 'int16': 'i2',
+             'ushort': 'u2', 'uint16': 'u2', 'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+             'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+
+def read_ply_vertices(path):
+    """
+    Memory map of the vertex element of a binary PLY file
+        returns:
+            numpy structured array with one field per vertex property
+    """
+    with open(path, 'rb') as f:
+        line = f.readline().strip()
+        if line != b'ply':
+            raise ValueError(path + ' is not a PLY file')
+        order, count, fields, element = '<', 0, [], None
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(path + ' has no end_header')
+            words = line.decode('ascii').split()
+            if not words:
+                continue
+            if words[0] == 'end_header':
+                break
+            if words[0] == 'format':
+                if words[1] == 'ascii':
+                    raise ValueError(path + ' is an ASCII PLY, export with binary=True')
+                order = '>' if words[1] == 'binary_big_endian' else '<'
+            elif words[0] == 'element':
+                element = words[1]
+                if element == 'vertex':
+                    count = int(words[2])
+            elif words[0] == 'property' and element == 'vertex':
+                if words[1] == 'list':
+                    raise ValueError(path + ' has a list property in the vertex element')
+                fields.append((words[2], order + PLY_TYPES[words[1]]))
+        offset = f.tell()
+    if count == 0:
+        return np.zeros(0, dtype=fields)
+    return np.memmap(path, dtype=np.dtype(fields), mode='r', offset=offset, shape=(count,))
+
+
+def _cached_histogram(point_cloud):
+    try:
+        meta = point_cloud.meta
+        if meta[COUNT_KEY] is None or int(meta[COUNT_KEY]) != point_cloud.point_count:
+            return None
+        return np.array([int(v) for v in meta[HISTOGRAM_KEY].split(',')], dtype=np.int64)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _store_histogram(point_cloud, hist):
+    try:
+        point_cloud.meta[COUNT_KEY] = str(point_cloud.point_count)
+        point_cloud.meta[HISTOGRAM_KEY] = ','.join(str(int(v)) for v in hist)
+    except (AttributeError, RuntimeError):
+        pass
+
+
+def confidence_histogram(chunk, cache=True):
+    """
+    Number of points of each confidence level in the point cloud of a chunk
+        args:
+            chunk = Metashape.Chunk with a point cloud built with point_confidence = True
+            cache = reuse (and store) the histogram in the point cloud meta data
+        returns:
+            hist = (MAX_CONFIDENCE + 1,) int array, hist[c] = points with confidence c
+    """
+    if chunk.point_cloud is None:
+        raise ValueError("Chunk " + chunk.label + " has no point cloud")
+    if cache:
+        hist = _cached_histogram(chunk.point_cloud)
+        if hist is not None:
+            return hist
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'confidence.ply')
+        chunk.exportPointCloud(path = path, source_data = Metashape.DataSource.PointCloudData,
+                               format = Metashape.PointCloudFormatPLY, binary = True,
+                               save_point_color = False, save_point_normal = False,
+                               save_point_classification = False, save_point_confidence = True)
+        vertices = read_ply_vertices(path)
+        names = [name for name in vertices.dtype.names or [] if 'confidence' in name.lower()]
+        if len(vertices) and not names:
+            raise ValueError("Point cloud of " + chunk.label + " has no confidence, build it with point_confidence = True")
+        if len(vertices):
+            confidence = np.clip(np.rint(vertices[names[0]]), 0, MAX_CONFIDENCE).astype(np.int64)
+            hist = np.bincount(confidence, minlength=MAX_CONFIDENCE + 1)
+        else:
+            hist = np.zeros(MAX_CONFIDENCE + 1, dtype=np.int64)
+        del vertices
+    if cache:
+        _store_histogram(chunk.point_cloud, hist)
+    return hist
+
+
+def region_area(chunk):
+    """ Horizontal area of the chunk region in square metres (region size times the chunk scale) """
+    scale = chunk.transform.scale or 1.0
+    return chunk.region.size[0] * chunk.region.size[1] * scale * scale
+
+
+def suggest_maxconf(hist, retain=None, density=None, area=None):
+    """
+    Highest maxconf whose filter keeps the target fraction or density of points
+        args:
+            hist = confidence histogram (see confidence_histogram)
+            retain = minimum fraction of points kept, e.g. 0.8
+            density = minimum points per square metre kept (needs area)
+            area = square metres covered by the point cloud
+        returns:
+            maxconf (0 if even removing confidence 0 only misses the target)
+    """
+    if (retain is None) == (density is None):
+        raise ValueError("Give either retain or density")
+    total = int(hist.sum())
+    # kept[m] = points left after removing confidence 0..m
+    kept = total - np.cumsum(hist)
+    if retain is not None:
+        target = retain * total
+    else:
+        if not area:
+            raise ValueError("A density target needs the area of the point cloud")
+        target = density * area
+    candidates = np.flatnonzero(kept >= target)
+    return int(candidates[-1]) if len(candidates) else 0
+
+
+def filter_report(hist, maxconf, bytes_per_point=BYTES_PER_POINT):
+    """
+    Points removed and kept by setConfidenceFilter(0, maxconf) + removePoints
+        returns:
+            dict with total, removed, kept, kept fraction and the estimated bytes saved
+    """
+    total = int(hist.sum())
+    removed = int(hist[:maxconf + 1].sum())
+    return {'maxconf': int(maxconf), 'total': total, 'removed': removed, 'kept': total - removed,
+            'kept_fraction': (total - removed) / total if total else 0.0,
+            'saved_bytes': removed * bytes_per_point}
+
+
+def format_report(label, report):
+    lines = [f"Confidence filter of {label}: maxconf {report['maxconf']}",
+             f"    points: {report['total']:,} -> {report['kept']:,} ({100 * report['kept_fraction']:.1f}% kept)",
+             f"    removed: {report['removed']:,} points, about {report['saved_bytes'] / 1e9:.2f} GB"]
+    return "\n".join(lines)
+
+
+def choose_maxconf(chunk, maxconf, retain=None, density=None, report=False):
+    """
+    maxconf for a chunk: 'auto' picks it from the confidence histogram, an int is kept as is.
+    The histogram (a full point cloud export) is only built for 'auto' or when report is set, and a
+    failed report does not stop a fixed maxconf filter.
+        returns:
+            maxconf, report dict (None when no histogram was built)
+    """
+    if maxconf != 'auto' and not report:
+        return int(maxconf), None
+    try:
+        hist = confidence_histogram(chunk)
+    except (RuntimeError, OSError, ValueError) as e:
+        if maxconf == 'auto':
+            raise
+        print("Could not report the confidence filter of " + chunk.label + ": " + str(e))
+        return int(maxconf), None
+    if maxconf == 'auto':
+        area = region_area(chunk) if density is not None else None
+        maxconf = suggest_maxconf(hist, retain=retain if density is None else None, density=density, area=area)
+    summary = filter_report(hist, int(maxconf))
+    print(format_report(chunk.label, summary))
+    return int(maxconf), summary
@@ -0,0 +1,77 @@
+import Metashape
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from Cloud_Confidence import choose_maxconf
+
+# Point cloud worker started by Parallel_Cloud.py as a separate Metashape process:
+#   metashape -r Cloud_Worker.py -project <date project.psx> -chunk <label> -maxconf 2
+#   (-maxconf auto -retain 0.8 picks maxconf from the confidence histogram, see Cloud_Confidence.py)
+# Builds depth maps and the point cloud of one chunk with the same settings as buildDenseCloud,
+# makes the <label>_PCFiltered copy with the same confidence filter as filter_point_cloud, saves the
+# project and writes the time of each stage to <project>.result.json.
+
+
+def result_path(project):
+    return os.path.splitext(project)[0] + '.result.json'
+
+
+def build_cloud(project, label, maxconf, downscale=2, retain=None, density=None, report=False):
+    result = {'project': project, 'chunk': label, 'filtered_chunk': label + '_PCFiltered',
+              'stages': {}, 'error': None}
+    start = time.perf_counter()
+    try:
+        doc = Metashape.Document()
+        doc.open(project)
+        chunk = [c for c in doc.chunks if c.label == label][0]
+        result['stages']['open'] = time.perf_counter() - start
+
+        t = time.perf_counter()
+        #Point Cloud Quality:Ultra = 1, High = 2, Medium = 4, Low = 8, Lowest = 16
+        chunk.buildDepthMaps(downscale = downscale, filter_mode = Metashape.MildFiltering)
+        result['stages']['depth_maps'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        chunk.buildPointCloud(point_confidence = True, point_colors = True)
+        result['stages']['point_cloud'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        maxconf, result['confidence'] = choose_maxconf(chunk, maxconf, retain=retain, density=density,
+                                                           report=report)
+        filter_chunk = chunk.copy()
+        filter_chunk.label = result['filtered_chunk']
+        filter_chunk.point_cloud.setConfidenceFilter(0, maxconf)
+        filter_chunk.point_cloud.removePoints(list(range(128)))
+        filter_chunk.point_cloud.resetFilters()
+        result['stages']['filter'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        doc.save()
+        result['stages']['save'] = time.perf_counter() - t
+    except (RuntimeError, IndexError, OSError, ValueError) as e:
+        result['error'] = str(e)
+    result['total'] = time.perf_counter() - start
+    with open(result_path(project), 'w') as f:
+        json.dump(result, f, indent=1)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the point cloud of one chunk of a project.')
+    parser.add_argument('-project', required=True, help='Project (.psx) holding the chunk')
+    parser.add_argument('-chunk', required=True, help='Label of the chunk')
+    parser.add_argument('-maxconf', default='2', help='Max confidence of removed points, or auto [default=2]')
+    parser.add_argument('-retain', type=float, default=None, help='Fraction of points kept with -maxconf auto')
+    parser.add_argument('-density', type=float, default=None, help='Points per m2 kept with -maxconf auto')
+    parser.add_argument('-report', action='store_true', help='Report the points removed by a fixed -maxconf')
+    parser.add_argument('-downscale', type=int, default=2, help='Depth map downscale [default=2]')
+    args = parser.parse_args()
+    maxconf = args.maxconf if args.maxconf == 'auto' else int(args.maxconf)
+    result = build_cloud(args.project, args.chunk, maxconf, args.downscale, args.retain, args.density,
+                         args.report)
+    print(json.dumps(result))
+    sys.exit(1 if result['error'] else 0)
@@ -105,6 +105,9 @@ from datetime import datetime
 import argparse
 import copy as cp
 import math
+from Chunk_Index import copy_chunk, chunk_exists, chunk_labels_with_suffix, reset_chunk_index
+from Parallel_Cloud import build_clouds_parallel
+from Save_Policy import SavePolicy
 
     
 def main(parg, doc):
@@ -131,6 +134,10 @@ def main(parg, doc):
             doc.open(psx_file)
         except:
             doc.open(psx_file)
+        # new project loaded into the same document, drop the old label index
+        reset_chunk_index(doc)
+        save_policy = SavePolicy(parg.save_mode, parg.save_interval, measure_bytes=parg.save_measure_bytes,
+                                 proclog=parg.proclogname if parg.log else None)
         # Get the active chunk
         doc = Metashape.app.document
         if parg.setup==False and parg.align==False and parg.ru==False and parg.pa==False and parg.re==False and parg.pcbuild==False and parg.build==False:
@@ -170,35 +177,54 @@ def main(parg, doc):
                     f.write("User Tags: " + str(user_tag) + "\n")
                     
 
-            geo_ref_list, chunk = setup_psx(user_tag,flight_folders, doc)
+            geo_ref_list, chunk = setup_psx(user_tag,flight_folders, doc, catalog_path = parg.flight_catalog,
+                                            incremental = parg.incremental,
+                                            prescreen = parg.prescreen_thresholds if parg.prescreen else None,
+                                            prefetch_metadata = parg.prefetch_metadata)
             geo_ref_dict[psx] = geo_ref_list
         else:
             geo_ref_dict = {}
-            geo_ref_list, chunk = setup_psx(user_tag, flight_folders, doc, load_photos = False)
+            geo_ref_list, chunk = setup_psx(user_tag, flight_folders, doc, load_photos = False, catalog_path = parg.flight_catalog)
             geo_ref_dict[psx] = geo_ref_list
             
-        doc.save(psx)
+        save_policy.save(doc, 'milestone', 'Setup', path=psx)
         # ALIGN IMAGES
         if parg.align:
             align_start = datetime.now()
             #Aactivate last chunk in the list
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             #chunk = activate_chunk(doc, chunk_label_list[-1])
             chunk = activate_chunk(doc, 'Raw_Photos')
-            # copy active chunk, rename, make active
-            align_chunk = chunk.copy()
-            align_chunk.label = chunk.label + '_Align'
-            print('Copied chunk ' + chunk.label + ' to chunk ' + align_chunk.label)
-
             geo_ref_list = geo_ref_dict[psx] 
-
-            align_images(align_chunk, parg.alignment_params)
+            if parg.incremental and chunk_exists(doc, chunk.label + '_Align'):
+                # align only the cameras added since the last alignment against the existing block
+                align_chunk = activate_chunk(doc, chunk.label + '_Align')
+                new_cameras = add_new_cameras(chunk, align_chunk)
+                align_message = 'Added ' + str(len(new_cameras)) + ' new cameras from chunk ' + chunk.label + ' to chunk ' + align_chunk.label
+                print(align_message)
+                if parg.import_reference and len(new_cameras) > 0:
+                    # one merged importReference for all flights
+                    import_references(align_chunk, geo_ref_list)
+                if len(new_cameras) > 0:
+                    align_new_cameras(align_chunk, new_cameras, parg.alignment_params)
+            else:
+                # copy active chunk, rename, make active
+                align_chunk = copy_chunk(doc, chunk, chunk.label + '_Align')
+                align_message = 'Copied chunk ' + chunk.label + ' to chunk ' + align_chunk.label
+                print(align_message)
+                alignment_params = dict(parg.alignment_params)
+                if parg.incremental:
+                    # keep key points so flights added later can be matched against this block
+                    alignment_params['keep_keypoints'] = True
+                if parg.import_reference:
+                    # one merged importReference for all flights
+                    import_references(align_chunk, geo_ref_list)
+                align_images(align_chunk, alignment_params)
 
             if parg.log:    
                 with open(parg.proclogname, 'a') as f:
                     f.write("\n")
                     f.write("============= ALIGNMENT =============\n")
-                    f.write("Copied chunk " + chunk.label + " to chunk " + align_chunk.label + "\n")
+                    f.write(align_message + "\n")
                     f.write("Geo Ref List: " + str(geo_ref_list) + "\n")
                     align_params = parg.alignment_params
                     for key in align_params:
@@ -207,11 +233,10 @@ def main(parg, doc):
             print(f"Geo Ref List: {geo_ref_list}")
             #for geo_ref in geo_ref_list:    
                 #chunk.importReference(os.path.join(geo_ref), delimiter = ',', columns = 'nxyzabcXZ')
-            doc.save()
+            save_policy.save(doc, 'milestone', 'Alignment')
 
         # RECONSTRUCTION UNCERTAINTY
         if parg.ru:
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             #chunk = activate_chunk(doc, chunk_label_list[-1])
             chunk = activate_chunk(doc, 'Raw_Photos_Align')
             # check that chunk has a point cloud
@@ -225,10 +250,9 @@ def main(parg, doc):
                                                             'was performed. Stopping execution.')
 
             # copy active chunk, rename, make active
-            ru_chunk = chunk.copy()
-            ru_chunk.label = chunk.label + '_RU' + str(parg.ru_filt_level)
+            ru_chunk = copy_chunk(doc, chunk, chunk.label + '_RU' + str(parg.ru_filt_level))
             print('Copied chunk ' + chunk.label + ' to chunk ' + ru_chunk.label)
-            doc.save()
+            save_policy.save(doc, 'stage', 'Copied ' + ru_chunk.label)
 
             # Run Reconstruction Uncertainty using reconstruction_uncertainty function
             print('Running Reconstruction Uncertainty optimization')
@@ -245,11 +269,10 @@ def main(parg, doc):
                                         log=True, proclog=parg.proclogname)
             else:
                 reconstruction_uncertainty(ru_chunk, parg.ru_filt_level, parg.ru_cutoff, parg.ru_increment, parg.cam_opt_param)
-            doc.save()
+            save_policy.save(doc, 'stage', 'Reconstruction Uncertainty')
 
         # PROJECTION ACCURACY
         if parg.pa:
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             #chunk = activate_chunk(doc, chunk_label_list[-1])
             chunk = activate_chunk(doc, "Raw_Photos_Align_RU10")
             # check that chunk has a point cloud
@@ -263,8 +286,7 @@ def main(parg, doc):
                                                             'was performed. Stopping execution.')
 
             # copy active chunk, rename, make active
-            pa_chunk = chunk.copy()
-            pa_chunk.label = chunk.label + '_PA' + str(parg.pa_filt_level)
+            pa_chunk = copy_chunk(doc, chunk, chunk.label + '_PA' + str(parg.pa_filt_level))
             print('Copied chunk ' + chunk.label + ' to chunk ' + pa_chunk.label)
 
 
@@ -282,11 +304,10 @@ def main(parg, doc):
                                     proclog=parg.proclogname)
             else:
                 projection_accuracy(pa_chunk, parg.pa_filt_level, parg.pa_cutoff, parg.pa_increment, parg.cam_opt_param)
-            doc.save()
+            save_policy.save(doc, 'stage', 'Projection Accuracy')
 
         # REPROJECTION ERROR
         if parg.re:
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             #chunk = activate_chunk(doc, chunk_label_list[-1])
             chunk = activate_chunk(doc, f"Raw_Photos_Align_RU{parg.ru_filt_level}_PA{parg.pa_filt_level}")
             R1_opt = parg.re_round1_opt # number of optimizations for round 1
@@ -306,8 +327,7 @@ def main(parg, doc):
                                                             'was performed. Stopping execution.')
             # copy active chunk, rename, make active
             label = chunk.label
-            re_chunk = chunk.copy()
-            re_chunk.label = f"{label}_RE{parg.re_filt_level}_TPA{R2_TPA}"
+            re_chunk = copy_chunk(doc, chunk, f"{label}_RE{parg.re_filt_level}_TPA{R2_TPA}")
             print('Copied chunk ' + chunk.label + ' to chunk ' + re_chunk.label)
 
             # Run Reprojection Error using reprojection_error function
@@ -326,7 +346,7 @@ def main(parg, doc):
             else:
                 reprojection_error(re_chunk, parg.re_filt_level, parg.re_cutoff, parg.re_increment, parg.cam_opt_param, RMSE_goal, R1_opt, R2_opt, R2_TPA)
         
-            doc.save()
+            save_policy.save(doc, 'milestone', 'Reprojection Error')
 
         if parg.pcbuild:
             print("----------------------------------------------------------------------------------------")
@@ -334,10 +354,9 @@ def main(parg, doc):
             chunk = doc.chunk
             maxconf = parg.maxconf
             print("Building Point Clouds")
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
             post_error_chunk = f"Raw_Photos_Align_RU{parg.ru_filt_level}_PA{parg.pa_filt_level}_RE{parg.re_filt_level}_TPA{parg.re_round2_TPA}"
             pc_chunk = f"{post_error_chunk}_PCFiltered"
-            post_error_chunk_list = [chunk for chunk in chunk_label_list if chunk.endswith(post_error_chunk)]
+            post_error_chunk_list = chunk_labels_with_suffix(doc, post_error_chunk)
             print("Chunks to process: " + str(post_error_chunk_list))
             if len(post_error_chunk_list) == 0:
                 post_error_chunk_list = [chunk.label]
@@ -348,29 +367,45 @@ def main(parg, doc):
             #------------Build Dense Cloud and Filter Point Cloud-----------------#
                 try:
                     print("-------------------------------COPY CHUNKS FOR CLOUD---------------------------------------\n")
-                    copied_list = copy_chunks_for_cloud(current_chunk, doc)
-                    for copied_chunk in copied_list:
-                        chunk = activate_chunk(doc, copied_chunk)
-                        if len(chunk.depth_maps_sets) == 0: #Check that a point cloud doesnt already exist
-                            print("-------------------------------BUILD DENSE CLOUD---------------------------------------\n")
-
-                            cloud_start = datetime.now()
-                            buildDenseCloud(copied_chunk, doc)
-                            if parg.log:
-                                with open(parg.proclogname, 'a') as f:
-                                    f.write("\n==================POINT CLOUD=============================== \n")
-                                    f.write("Built Dense Cloud and Filtered Point Cloud for chunk " + copied_chunk + ".\n")
-                                    f.write("Point Cloud Quality: High \n")
-                                    f.write("Point Cloud Filter: Mild \n")
-                                    f.write("Fltered by Confidence Level: " + str(maxconf) + "\n")
-                                    f.write("Processing time: " + str(datetime.now() - cloud_start) + "\n")
-                        print("-------------------------------FILTER DENSE CLOUD---------------------------------------")
-                        filtered_chunk = filter_point_cloud(copied_chunk, maxconf, doc)
+                    copied_list = copy_chunks_for_cloud(current_chunk, doc, light=parg.light_cloud_copy)
+                    if parg.cloud_workers > 1:
+                        print("-------------------------------BUILD DENSE CLOUDS IN PARALLEL---------------------------------------\n")
+                        build_clouds_parallel(doc, copied_list, maxconf, max_workers=parg.cloud_workers,
+                                              memory_per_worker_gb=parg.cloud_worker_memory,
+                                              import_back=not parg.cloud_keep_projects,
+                                              proclog=parg.proclogname if parg.log else None,
+                                              retain=parg.maxconf_retain, density=parg.maxconf_density,
+                                              report=parg.maxconf_report)
+                    else:
+                        for copied_chunk in copied_list:
+                            chunk = activate_chunk(doc, copied_chunk)
+                            if len(chunk.depth_maps_sets) == 0: #Check that a point cloud doesnt already exist
+                                print("-------------------------------BUILD DENSE CLOUD---------------------------------------\n")
+
+                                cloud_start = datetime.now()
+                                buildDenseCloud(copied_chunk, doc, save_policy=save_policy)
+                                if parg.log:
+                                    with open(parg.proclogname, 'a') as f:
+                                        f.write("\n==================POINT CLOUD=============================== \n")
+                                        f.write("Built Dense Cloud and Filtered Point Cloud for chunk " + copied_chunk + ".\n")
+                                        f.write("Point Cloud Quality: High \n")
+                                        f.write("Point Cloud Filter: Mild \n")
+                                        f.write("Fltered by Confidence Level: " + str(maxconf) + "\n")
+                                        f.write("Processing time: " + str(datetime.now() - cloud_start) + "\n")
+                            print("-------------------------------FILTER DENSE CLOUD---------------------------------------")
+                            filtered_chunk = filter_point_cloud(copied_chunk, maxconf, doc, retain=parg.maxconf_retain,
+                                                                 density=parg.maxconf_density,
+                                                                 report=parg.maxconf_report)
                 except Exception as e:
                     print("Error processing " + current_chunk)
                     print(e)
-                    doc.save()
+                    save_policy.save(doc, 'error', current_chunk)
                     continue
+            # stage mode keeps the original saves (each serial cloud is saved by buildDenseCloud), the other
+            # modes save the filtered point clouds here. Clouds built in parallel are only appended to doc,
+            # so they are saved here in every mode.
+            if save_policy.mode != 'stage' or parg.cloud_workers > 1:
+                save_policy.save(doc, 'milestone', 'Point Clouds')
             if parg.log:
                 with open(parg.proclogname, 'a') as f:
                     f.write(f"\n{len(copied_list)} Point Clouds built and filtered in {datetime.now() - pcbuild_start}\n")
@@ -390,8 +425,7 @@ def main(parg, doc):
             print("Output folder: " + psx_folder)
             os.makedirs(os.path.dirname(psx_folder), exist_ok=True)
             
-            chunk_label_list = [chunk.label for chunk in doc.chunks]
-            pc_chunk_list = [chunk for chunk in chunk_label_list if chunk.endswith("_PCFiltered")]
+            pc_chunk_list = chunk_labels_with_suffix(doc, "_PCFiltered")
             
             #Get the chunk names and create a counter for progress updates
             for current_chunk, i in zip(pc_chunk_list, range(len(pc_chunk_list))):
@@ -405,14 +439,20 @@ def main(parg, doc):
                 
                 chunk = activate_chunk(doc, current_chunk)
                 if chunk.elevation is None:    
-                    buildDEMOrtho(current_chunk, doc, ortho_res = parg.ortho_resolution, dem_res = parg.dem_resolution)
+                    buildDEMOrtho(current_chunk, doc, ortho_res = parg.ortho_resolution, dem_res = parg.dem_resolution, save_policy=save_policy)
                 print("-------------------------------EXPORT DEM/ORTHO---------------------------------------")
-                outputOrtho = os.path.join(psx_folder, os.path.basename(psx)[:-4] + "____" + current_chunk + "_Ortho.tif") #[:-4] removes .psx extension
-                outputDEM = os.path.join(psx_folder, os.path.basename(psx)[:-4] + "____" + current_chunk + "_DEM.tif")
-                if os.path.exists(outputDEM) or os.path.exists(outputOrtho):
+                # tiled exports are a .vrt mosaic, written once all tiles exist
+                raster_ext = ".vrt" if parg.export_tile_size else ".tif"
+                outputOrtho = os.path.join(psx_folder, os.path.basename(psx)[:-4] + "____" + current_chunk + "_Ortho" + raster_ext) #[:-4] removes .psx extension
+                outputDEM = os.path.join(psx_folder, os.path.basename(psx)[:-4] + "____" + current_chunk + "_DEM" + raster_ext)
+                exported = [os.path.exists(outputDEM), os.path.exists(outputOrtho)]
+                # an unfinished tiled export is resumed from its tile state
+                if (all(exported) if parg.export_tile_size else any(exported)):
                     print("File already exists, skipping " + outputDEM + " and " + outputOrtho + " of " + psx_name)
                     continue
-                out_crs, in_crs = exportDEMOrtho(current_chunk, path_to_save_dem = outputDEM, path_to_save_ortho=outputOrtho, geoidPath=geoidPath, ortho_res = parg.ortho_resolution, dem_res = parg.dem_resolution)
+                out_crs, in_crs = exportDEMOrtho(current_chunk, path_to_save_dem = outputDEM, path_to_save_ortho=outputOrtho, geoidPath=geoidPath, ortho_res = parg.ortho_resolution, dem_res = parg.dem_resolution, save_policy=save_policy,
+                                                 tile_size=parg.export_tile_size, workers=parg.export_workers,
+                                                 proclog=parg.proclogname if parg.log else None)
                 if parg.log:
                     # if logging enabled use kwargs
                     print('Logging to file ' + parg.proclogname)
@@ -424,7 +464,7 @@ def main(parg, doc):
                         metadata = chunk.meta
                         for key, value in metadata.items():
                             f.write(f"{key}: {value}\n")
-            doc.save()
+            save_policy.save(doc, 'milestone', 'Exports')
             
             if parg.log:
                 # if logging enabled use kwargs
@@ -441,11 +481,14 @@ def main(parg, doc):
                     
                     #f.write('\nChunk CRS: {}'.format(in_crs))
                     #f.write('\nOutput CRS: {}'.format(out_crs))
+        save_policy.save(doc, 'final', psx_name)
         processing_end = datetime.now()
         if parg.log:
             with open(parg.proclogname, 'a') as f:
                 f.write("\n")
                 f.write("============= PROCESSING END =============\n")
+            save_policy.write_summary()
+            with open(parg.proclogname, 'a') as f:
                 f.write("Processing ended at: " + str(processing_end) + "\n")
                 f.write("Processing time: " + str(processing_end - processing_start) + "\n")
                 f.write("============= END OF PROCESSING =============\n")
@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import sqlite3
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Cached scanner for the flight folders on the Z: share.
+# Every directory under a flight folder is recorded in a local SQLite catalog with its mtime, its
+# sub directories and its photos. On the next run a directory whose mtime has not changed is taken
+# from the catalog instead of being listed again, so re-runs only list folders that changed.
+# Flight folders are scanned in parallel, one thread per flight folder.
+
+# Regular expression pattern to match the text before "Flight"
+FLIGHT_PATTERN = re.compile(r'(.+?)\s*Flight\s*\d+')
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_CATALOG = os.path.join(os.path.expanduser('~'), '.metashape_workflow', 'flight_catalog.sqlite')
+
+
+def _regexp(pattern, value):
+    return value is not None and re.search(pattern, value) is not None
+
+
+def open_catalog(catalog_path=None):
+    """
+    Open (and create if needed) the flight folder catalog
+        args:
+            catalog_path = str path of the SQLite file [default = ~/.metashape_workflow/flight_catalog.sqlite]
+        returns:
+            sqlite3.Connection with a REGEXP function registered
+    """
+    if catalog_path is None:
+        catalog_path = DEFAULT_CATALOG
+    if catalog_path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(catalog_path)), exist_ok=True)
+    con = sqlite3.connect(catalog_path)
+    con.create_function('REGEXP', 2, _regexp)
+    con.execute('''CREATE TABLE IF NOT EXISTS dirs (
+                       path TEXT PRIMARY KEY,
+                       root TEXT NOT NULL,
+                       name TEXT NOT NULL,
+                       mtime_ns INTEGER NOT NULL,
+                       subdirs TEXT NOT NULL,
+                       photos TEXT NOT NULL,
+                       scanned TEXT NOT NULL)''')
+    con.execute('CREATE INDEX IF NOT EXISTS dirs_root ON dirs (root)')
+    return con
+
+
+def _load_root(con, root):
+    rows = con.execute('SELECT path, mtime_ns, subdirs, photos FROM dirs WHERE root = ?', (root,))
+    return {path: (mtime_ns, json.loads(subdirs), json.loads(photos)) for path, mtime_ns, subdirs, photos in rows}
+
+
+def _scan_root(root, cached, trust_catalog=False):
+    """
+    Walk one flight folder, reusing cached listings of directories whose mtime did not change.
+        args:
+            root = str flight folder
+            cached = dict of {path: (mtime_ns, subdirs, photos)} from the catalog
+            trust_catalog = use cached listings without checking mtimes (no access to the share)
+        returns:
+            entries = dict of {path: (mtime_ns, subdirs, photos)} of every directory visited
+            nlisted = number of directories that had to be listed
+    """
+    entries = {}
+    nlisted = 0
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        entry = cached.get(folder)
+        if entry is None or not trust_catalog:
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            if entry is None or entry[0] != mtime_ns:
+                subdirs = []
+                photos = []
+                try:
+                    with os.scandir(folder) as it:
+                        for item in it:
+                            if item.is_dir():
+                                subdirs.append(item.name)
+                            elif item.name.lower().endswith(PHOTO_EXTENSIONS):
+                                photos.append(item.name)
+                except OSError:
+                    continue
+                entry = (mtime_ns, sorted(subdirs), sorted(photos))
+                nlisted += 1
+        entries[folder] = entry
+        # reversed so folders are visited in name order, like os.walk on the share
+        for name in reversed(entry[1]):
+            stack.append(os.path.join(folder, name))
+    return entries, nlisted
+
+
+def _store_root(con, root, entries):
+    scanned = str(datetime.now())
+    with con:
+        con.execute('DELETE FROM dirs WHERE root = ?', (root,))
+        con.executemany('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        [(path, root, os.path.basename(path), mtime_ns, json.dumps(subdirs), json.dumps(photos), scanned)
+                         for path, (mtime_ns, subdirs, photos) in entries.items()])
+
+
+def scan_flight_folders(flight_folder_list, catalog_path=None, max_workers=8, trust_catalog=False):
+    """
+    Find every folder containing an "OUTPUT" folder under the flight folders.
+        args:
+            flight_folder_list = list of str flight folders
+            catalog_path = str path of the SQLite catalog [default = DEFAULT_CATALOG]
+            max_workers = number of flight folders scanned at the same time
+            trust_catalog = use catalog listings without checking the share when a flight folder
+                            was scanned before (for runs that only need the geotag file names)
+        returns:
+            flights = list of dicts with flight_dir, name, output_dir and photos (file names),
+                      in flight_folder_list order
+    """
+    con = open_catalog(catalog_path)
+    try:
+        cached = {root: _load_root(con, root) for root in flight_folder_list}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(flight_folder_list)))) as pool:
+            results = list(pool.map(lambda root: _scan_root(root, cached[root], trust_catalog), flight_folder_list))
+        flights = []
+        for root, (entries, nlisted) in zip(flight_folder_list, results):
+            print(f"Scanned {root}: {len(entries)} folders, {nlisted} listed, {len(entries) - nlisted} from catalog")
+            if nlisted or not trust_catalog:
+                _store_root(con, root, entries)
+            # walk order: parents before children, folders in name order
+            for folder in _walk_order(root, entries):
+                subdirs = entries[folder][1]
+                if "OUTPUT" in subdirs:
+                    output_dir = os.path.join(folder, "OUTPUT")
+                    output_entry = entries.get(output_dir)
+                    flights.append({
+                        'flight_dir': folder,
+                        'name': os.path.basename(folder),
+                        'output_dir': output_dir,
+                        'photos': list(output_entry[2]) if output_entry else [],
+                    })
+    finally:
+        con.close()
+    return flights
+
+
+def _walk_order(root, entries):
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        if folder not in entries:
+            continue
+        yield folder
+        for name in reversed(entries[folder][1]):
+            stack.append(os.path.join(folder, name))
+
+
+def match_flights(flights, user_tags, pattern=FLIGHT_PATTERN):
+    """
+    Keep flights whose group name (text before "Flight NN") starts with one of user_tags.
+        args:
+            flights = list of dicts from scan_flight_folders or query_catalog
+            user_tags = iterable of str tags
+            pattern = compiled regular expression, group(1) is the group name
+        returns:
+            list of flight dicts with group_name and ref_name ('<flight> geotags.csv') added
+    """
+    matched = []
+    for flight in flights:
+        match = pattern.search(flight['name'])
+        if not match:
+            continue
+        group_name = match.group(1).strip()
+        if any(group_name.startswith(tag) for tag in user_tags):
+            flight = dict(flight)
+            flight['group_name'] = group_name
+            flight['ref_name'] = flight['name'] + ' geotags.csv'
+            matched.append(flight)
+    return matched
+
+
+def query_catalog(user_tags, roots=None, catalog_path=None, pattern=FLIGHT_PATTERN):
+    """
+    Look up flights in the catalog without touching the share.
+        args:
+            user_tags = iterable of str tags
+            roots = optional list of flight folders to restrict the query to
+            catalog_path = str path of the SQLite catalog
+            pattern = compiled regular expression used to extract group names
+        returns:
+            list of flight dicts like match_flights
+    """
+    con = open_catalog(catalog_path)
+    try:
+        sql = 'SELECT path, root, subdirs FROM dirs WHERE name REGEXP ?'
+        params = [pattern.pattern]
+        if roots:
+            sql += ' AND root IN (' + ','.join('?' * len(roots)) + ')'
+            params += list(roots)
+        flights = []
+        for path, root, subdirs in con.execute(sql + ' ORDER BY path', params):
+            if "OUTPUT" not in json.loads(subdirs):
+                continue
+            output_dir = os.path.join(path, "OUTPUT")
+            row = con.execute('SELECT photos FROM dirs WHERE path = ?', (output_dir,)).fetchone()
+            flights.append({
+                'flight_dir': path,
+                'name': os.path.basename(path),
+                'output_dir': output_dir,
+                'photos': json.loads(row[0]) if row else [],
+            })
+    finally:
+        con.close()
+    return match_flights(flights, user_tags, pattern)
@@ -0,0 +1,324 @@
+import os
+import re
+import struct
+import hashlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Header-only EXIF/XMP harvester.
+# Only the JPEG segments before the image data (APP1 EXIF and XMP) are read from each photo, so a
+# 20 MB photo costs a few tens of KB of network reads. Results are stored as one columnar NPZ catalog
+# per flight OUTPUT folder, kept outside the flight folders (writing there would change the folder
+# mtime the flight catalog uses to detect new photos). The image quality pre-screen takes the photo
+# altitudes from the catalog. Rows of unchanged photos (same size and mtime) are reused when a
+# catalog is refreshed.
+
+DEFAULT_CATALOG_DIR = os.path.join(os.path.expanduser('~'), '.metashape_workflow', 'image_metadata')
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg')
+
+# column name -> numpy dtype, float columns are NaN and str columns '' when missing
+COLUMNS = {
+    'name': str,
+    'size': np.int64,
+    'mtime_ns': np.int64,
+    'make': str,
+    'model': str,
+    'focal_length': np.float64,         # mm
+    'capture_time': str,                # EXIF DateTimeOriginal(.SubSecTimeOriginal), ISO format
+    'timestamp': np.float64,            # capture_time as POSIX seconds (camera clock, no time zone)
+    'latitude': np.float64,
+    'longitude': np.float64,
+    'altitude': np.float64,             # GPS altitude (m)
+    'relative_altitude': np.float64,    # DJI height above take-off (m)
+    'h_accuracy': np.float64,           # GPSHPositioningError or DJI RTK std (m)
+    'v_accuracy': np.float64,           # DJI RTK std height (m)
+    'gimbal_roll': np.float64,
+    'gimbal_pitch': np.float64,
+    'gimbal_yaw': np.float64,
+    'flight_roll': np.float64,
+    'flight_pitch': np.float64,
+    'flight_yaw': np.float64,
+}
+
+# XMP attribute (drone-dji namespace) -> column
+XMP_FIELDS = {
+    'RelativeAltitude': 'relative_altitude',
+    'GimbalRollDegree': 'gimbal_roll',
+    'GimbalPitchDegree': 'gimbal_pitch',
+    'GimbalYawDegree': 'gimbal_yaw',
+    'FlightRollDegree': 'flight_roll',
+    'FlightPitchDegree': 'flight_pitch',
+    'FlightYawDegree': 'flight_yaw',
+    'RtkStdLon': 'rtk_std_lon',
+    'RtkStdLat': 'rtk_std_lat',
+    'RtkStdHgt': 'v_accuracy',
+}
+XMP_PATTERN = re.compile(rb'(?:drone-dji:)?(' + b'|'.join(k.encode() for k in XMP_FIELDS) + rb')(?:="|>)\s*([+-]?[0-9.eE+-]+)')
+
+TIFF_TYPES = {1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('I', 4), 5: ('II', 8), 6: ('b', 1), 7: ('B', 1),
+              8: ('h', 2), 9: ('i', 4), 10: ('ii', 8), 11: ('f', 4), 12: ('d', 8)}
+
+
+def read_jpeg_header(path):
+    """
+    Read the APP1 segments of a JPEG without reading the image data
+        returns:
+            exif = bytes of the TIFF block of the EXIF segment (b'' if none)
+            xmp = bytes of the XMP packet (b'' if none)
+    """
+    exif = b''
+    xmp = b''
+    with open(path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            raise ValueError('not a JPEG file')
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                break
+            if marker[1] in (0xD9, 0xDA):
+                # end of image / start of scan, image data follows
+                break
+            length = struct.unpack('>H', f.read(2))[0]
+            if marker[1] == 0xE1:
+                data = f.read(length - 2)
+                if data.startswith(b'Exif\x00\x00') and not exif:
+                    exif = data[6:]
+                elif data.startswith(b'http://ns.adobe.com/xap/1.0/'):
+                    xmp = data
+            else:
+                f.seek(length - 2, os.SEEK_CUR)
+    return exif, xmp
+
+
+def _read_ifd(tiff, offset, endian):
+    """ Return {tag: value} of one IFD, rationals as floats, short arrays as tuples """
+    entries = {}
+    if offset + 2 > len(tiff):
+        return entries
+    count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    for i in range(count):
+        pos = offset + 2 + 12 * i
+        if pos + 12 > len(tiff):
+            break
+        tag, typ, n = struct.unpack(endian + 'HHI', tiff[pos:pos + 8])
+        if typ not in TIFF_TYPES:
+            continue
+        fmt, size = TIFF_TYPES[typ]
+        nbytes = size * n
+        if nbytes <= 4:
+            data = tiff[pos + 8:pos + 8 + nbytes]
+        else:
+            value_offset = struct.unpack(endian + 'I', tiff[pos + 8:pos + 12])[0]
+            data = tiff[value_offset:value_offset + nbytes]
+            if len(data) < nbytes:
+                continue
+        if typ == 2:
+            value = data.split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+        elif typ in (5, 10):
+            parts = struct.unpack(endian + fmt[0] * (2 * n), data)
+            value = tuple(parts[j] / parts[j + 1] if parts[j + 1] else float('nan') for j in range(0, 2 * n, 2))
+            value = value[0] if n == 1 else value
+        else:
+            value = struct.unpack(endian + fmt * n, data)
+            value = value[0] if n == 1 else value
+        entries[tag] = value
+    return entries
+
+
+def _degrees(dms, ref):
+    if not isinstance(dms, tuple) or len(dms) != 3:
+        return float('nan')
+    value = dms[0] + dms[1] / 60 + dms[2] / 3600
+    return -value if ref in ('S', 'W') else value
+
+
+def parse_metadata(exif, xmp):
+    """
+    Parse the EXIF TIFF block and XMP packet of one photo
+        returns:
+            dict of metadata columns (without name, size and mtime_ns)
+    """
+    row = {}
+    if len(exif) >= 8:
+        endian = '<' if exif[:2] == b'II' else '>'
+        ifd0 = _read_ifd(exif, struct.unpack(endian + 'I', exif[4:8])[0], endian)
+        row['make'] = ifd0.get(0x010F, '')
+        row['model'] = ifd0.get(0x0110, '')
+        if 0x8769 in ifd0:
+            sub = _read_ifd(exif, ifd0[0x8769], endian)
+            row['focal_length'] = sub.get(0x920A, float('nan'))
+            capture = sub.get(0x9003) or ifd0.get(0x0132)
+            if capture:
+                try:
+                    when = datetime.strptime(capture, '%Y:%m:%d %H:%M:%S')
+                    subsec = sub.get(0x9291, '')
+                    if subsec and str(subsec).isdigit():
+                        when = when.replace(microsecond=int((str(subsec) + '000000')[:6]))
+                    row['capture_time'] = when.isoformat()
+                    row['timestamp'] = when.timestamp()
+                except ValueError:
+                    row['capture_time'] = capture
+        if 0x8825 in ifd0:
+            gps = _read_ifd(exif, ifd0[0x8825], endian)
+            row['latitude'] = _degrees(gps.get(2), gps.get(1))
+            row['longitude'] = _degrees(gps.get(4), gps.get(3))
+            if 6 in gps:
+                row['altitude'] = -gps[6] if gps.get(5) == 1 else gps[6]
+            if 31 in gps:
+                row['h_accuracy'] = gps[31]
+    if xmp:
+        values = {}
+        for key, value in XMP_PATTERN.findall(xmp):
+            try:
+                values[XMP_FIELDS[key.decode()]] = float(value)
+            except ValueError:
+                pass
+        if 'rtk_std_lon' in values and 'rtk_std_lat' in values:
+            row['h_accuracy'] = (values.pop('rtk_std_lon') ** 2 + values.pop('rtk_std_lat') ** 2) ** 0.5
+        values.pop('rtk_std_lon', None)
+        values.pop('rtk_std_lat', None)
+        row.update(values)
+    return row
+
+
+def read_photo_metadata(path):
+    """
+    Header-only metadata of one photo
+        returns:
+            dict with every key of COLUMNS (missing values NaN / '')
+    """
+    st = os.stat(path)
+    row = {key: ('' if dtype is str else float('nan')) for key, dtype in COLUMNS.items()}
+    row['name'] = os.path.basename(path)
+    row['size'] = st.st_size
+    row['mtime_ns'] = st.st_mtime_ns
+    try:
+        row.update(parse_metadata(*read_jpeg_header(path)))
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Could not read metadata of {path}: {e}")
+    return row
+
+
+def catalog_path(output_dir, catalog_dir=None):
+    """
+    <catalog_dir>/<flight folder>_<hash of the OUTPUT folder path>.npz
+    """
+    output_dir = os.path.abspath(output_dir)
+    digest = hashlib.sha1(os.path.normcase(output_dir).encode('utf-8')).hexdigest()[:16]
+    flight = re.sub(r'[^\w.-]+', '_', os.path.basename(os.path.dirname(output_dir)))
+    return os.path.join(catalog_dir or DEFAULT_CATALOG_DIR, flight + '_' + digest + '.npz')
+
+
+def load_catalog(output_dir, catalog_dir=None):
+    """
+    Load the metadata catalog of a flight folder
+        args:
+            output_dir = str flight OUTPUT folder
+            catalog_dir = folder of the catalogs [default = DEFAULT_CATALOG_DIR]
+        returns:
+            catalog = dict of {column: numpy array}, None if there is no catalog
+    """
+    path = catalog_path(output_dir, catalog_dir)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def save_catalog(output_dir, catalog, catalog_dir=None):
+    path = catalog_path(output_dir, catalog_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **catalog)
+    os.replace(tmp, path)
+
+
+def _rows_to_catalog(rows):
+    catalog = {}
+    for key, dtype in COLUMNS.items():
+        values = [row[key] for row in rows]
+        catalog[key] = np.array(values, dtype=str if dtype is str else dtype) if rows \
+            else np.zeros(0, dtype='<U1' if dtype is str else dtype)
+    return catalog
+
+
+def build_catalog(output_dir, max_workers=16, photos=None, catalog_dir=None):
+    """
+    Create or refresh the metadata catalog of one flight OUTPUT folder
+        args:
+            output_dir = str flight OUTPUT folder
+            max_workers = number of photos read at the same time
+            photos = list of photo file names [default = every .jpg/.jpeg in output_dir]
+            catalog_dir = folder of the catalogs [default = DEFAULT_CATALOG_DIR]
+        returns:
+            catalog = dict of {column: numpy array}, rows in photos order
+    """
+    if photos is None:
+        with os.scandir(output_dir) as it:
+            photos = sorted(entry.name for entry in it if entry.name.lower().endswith(PHOTO_EXTENSIONS))
+    old = load_catalog(output_dir, catalog_dir)
+    old_rows = {}
+    if old is not None and all(key in old for key in COLUMNS):
+        for i, name in enumerate(old['name']):
+            old_rows[str(name)] = i
+
+    rows = [None] * len(photos)
+    todo = []
+    for i, name in enumerate(photos):
+        j = old_rows.get(name)
+        if j is not None:
+            try:
+                st = os.stat(os.path.join(output_dir, name))
+            except OSError:
+                continue
+            if st.st_size == old['size'][j] and st.st_mtime_ns == old['mtime_ns'][j]:
+                rows[i] = {key: old[key][j].item() for key in COLUMNS}
+                continue
+        todo.append(i)
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = pool.map(lambda i: read_photo_metadata(os.path.join(output_dir, photos[i])), todo)
+            for i, row in zip(todo, results):
+                rows[i] = row
+    rows = [row for row in rows if row is not None]
+    catalog = _rows_to_catalog(rows)
+    if todo or len(rows) != len(old_rows):
+        save_catalog(output_dir, catalog, catalog_dir)
+    print(f"Metadata catalog of {output_dir}: {len(rows)} photos, {len(todo)} read")
+    return catalog
+
+
+def prefetch_metadata(output_dirs, max_workers=16, catalog_dir=None):
+    """
+    Build the catalogs of several flights, flights one after another, photos of a flight in parallel
+        returns:
+            dict of {output_dir: catalog}
+    """
+    return {output_dir: build_catalog(output_dir, max_workers, catalog_dir=catalog_dir) for output_dir in output_dirs}
+
+
+def photo_metadata(paths, max_workers=16, catalog_dir=None):
+    """
+    Metadata rows of photos from any flights, read from the catalogs of their folders
+        args:
+            paths = list of photo paths
+        returns:
+            dict of {path: {column: value}}
+    """
+    by_dir = {}
+    for path in paths:
+        by_dir.setdefault(os.path.dirname(path), []).append(path)
+    result = {}
+    for output_dir, dir_paths in by_dir.items():
+        catalog = load_catalog(output_dir, catalog_dir)
+        names = set(str(n) for n in catalog['name']) if catalog is not None else set()
+        if catalog is None or any(os.path.basename(p) not in names for p in dir_paths):
+            catalog = build_catalog(output_dir, max_workers, catalog_dir=catalog_dir)
+        index = {str(name): i for i, name in enumerate(catalog['name'])}
+        for path in dir_paths:
+            i = index.get(os.path.basename(path))
+            if i is not None:
+                result[path] = {key: catalog[key][i].item() for key in catalog}
+    return result
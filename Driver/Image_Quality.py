@@ -0,0 +1,192 @@
+import os
+import json
+import sqlite3
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+from Worker_Python import use_python_executable
+from Image_Metadata import photo_metadata, PHOTO_EXTENSIONS
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    # only needed when the pre-screen is enabled, setup works without them
+    np = None
+    Image = None
+
+# Image quality pre-screen run before photos are added to a chunk.
+# Blurry frames, badly exposed frames and take-off/landing frames slow down matchPhotos and are
+# removed later as bad tie points anyway. Each photo is scored once (sharpness, exposure) in a process
+# pool and the scores are cached per file, keyed by size and mtime, so re-runs only read photos that
+# are new or changed. Altitudes come from the EXIF/XMP catalog of Image_Metadata.
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser('~'), '.metashape_workflow', 'image_quality.sqlite')
+
+DEFAULT_THRESHOLDS = {
+    "min_sharpness": 50.0,      # variance of the Laplacian of the downsampled grey image
+    "min_brightness": 20.0,     # mean grey value (0-255)
+    "max_brightness": 235.0,
+    "max_clipped": 0.25,        # fraction of pixels at 0-5 or 250-255
+    "max_altitude_drop": 20.0,  # m below the median altitude of the flight (take-off/landing frames)
+}
+
+def score_image(path, max_size=512):
+    """
+    Score one photo
+        args:
+            path = str photo path
+            max_size = longest side (pixels) of the downsampled image used for the scores
+        returns:
+            scores = dict of sharpness, brightness and clipped
+    """
+    with Image.open(path) as img:
+        # let the JPEG decoder scale down by 1/2-1/8 instead of decoding every pixel
+        img.draft('L', (max_size, max_size))
+        img = img.convert('L')
+        img.thumbnail((max_size, max_size))
+        grey = np.asarray(img, dtype=np.float32)
+
+    laplacian = (grey[1:-1, :-2] + grey[1:-1, 2:] + grey[:-2, 1:-1] + grey[2:, 1:-1]
+                 - 4 * grey[1:-1, 1:-1])
+    return {
+        'sharpness': float(laplacian.var()),
+        'brightness': float(grey.mean()),
+        'clipped': float(np.count_nonzero((grey <= 5) | (grey >= 250)) / grey.size),
+    }
+
+
+def _score_worker(path):
+    try:
+        return path, score_image(path), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def open_score_cache(cache_path=None):
+    if cache_path is None:
+        cache_path = DEFAULT_CACHE
+    if cache_path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    con = sqlite3.connect(cache_path)
+    con.execute('''CREATE TABLE IF NOT EXISTS scores (
+                       path TEXT PRIMARY KEY,
+                       size INTEGER NOT NULL,
+                       mtime_ns INTEGER NOT NULL,
+                       scores TEXT NOT NULL)''')
+    return con
+
+
+def score_images(paths, cache_path=None, max_workers=None):
+    """
+    Score photos, reading only photos that are not in the cache or changed since they were scored
+        args:
+            paths = list of str photo paths
+            cache_path = str path of the SQLite score cache [default = DEFAULT_CACHE]
+            max_workers = number of worker processes [default = cpu count], 1 scores in this process
+        returns:
+            scores = dict of {path: scores dict}, photos that could not be read are left out
+    """
+    if np is None or Image is None:
+        raise ImportError('The image quality pre-screen needs numpy and Pillow (pip install numpy pillow).')
+    con = open_score_cache(cache_path)
+    try:
+        scores = {}
+        stats = {}
+        todo = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stats[path] = (st.st_size, st.st_mtime_ns)
+            row = con.execute('SELECT size, mtime_ns, scores FROM scores WHERE path = ?', (path,)).fetchone()
+            if row is not None and (row[0], row[1]) == stats[path]:
+                scores[path] = json.loads(row[2])
+            else:
+                todo.append(path)
+
+        ncached = len(scores)
+        if todo:
+            if max_workers == 1 or len(todo) == 1:
+                results = list(map(_score_worker, todo))
+            else:
+                use_python_executable()
+                with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                    results = list(pool.map(_score_worker, todo, chunksize=max(1, len(todo) // 64)))
+            new_rows = []
+            for path, result, error in results:
+                if result is None:
+                    print(f"Could not score {path}: {error}")
+                    continue
+                scores[path] = result
+                new_rows.append((path, stats[path][0], stats[path][1], json.dumps(result)))
+            with con:
+                con.executemany('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)', new_rows)
+        print(f"Scored {len(todo)} photos, {ncached} from cache")
+    finally:
+        con.close()
+    return scores
+
+
+def photo_altitudes(paths, catalog_dir=None):
+    """
+    Altitude of each photo from the metadata catalogs of their folders
+        returns:
+            dict of {path: altitude}, DJI relative altitude when every photo has it, GPS altitude otherwise
+            (photos without an altitude, or of a format the catalog does not read, are left out)
+    """
+    # the catalogs only hold JPEGs, other photos would never be found and rebuild them on every call
+    paths = [path for path in paths if path.lower().endswith(PHOTO_EXTENSIONS)]
+    metadata = photo_metadata(paths, catalog_dir=catalog_dir)
+    rows = [metadata[path] for path in paths if path in metadata]
+    key = 'relative_altitude' if rows and all(row['relative_altitude'] == row['relative_altitude'] for row in rows) \
+        else 'altitude'
+    # NaN marks a missing value in the catalog
+    return {path: metadata[path][key] for path in paths
+            if path in metadata and metadata[path][key] == metadata[path][key]}
+
+
+def screen_photos(paths, thresholds=None, cache_path=None, max_workers=None, catalog_dir=None):
+    """
+    Split photos of one flight into photos that pass the quality thresholds and rejected photos
+        args:
+            paths = list of str photo paths (one flight, the altitude check uses the flight median)
+            thresholds = dict overriding DEFAULT_THRESHOLDS, a threshold set to None is not checked
+            cache_path = str path of the SQLite score cache
+            max_workers = number of worker processes
+            catalog_dir = folder of the metadata catalogs (see Image_Metadata.py)
+        returns:
+            passed = list of photo paths, in the order of paths
+            rejected = dict of {path: reason}
+    """
+    limits = dict(DEFAULT_THRESHOLDS)
+    if thresholds:
+        limits.update(thresholds)
+    scores = score_images(paths, cache_path, max_workers)
+    altitudes = photo_altitudes(paths, catalog_dir)
+    median_altitude = statistics.median(altitudes.values()) if altitudes else None
+
+    passed = []
+    rejected = {}
+    for path in paths:
+        s = scores.get(path)
+        if s is None:
+            # unreadable photos are left for Metashape to report
+            passed.append(path)
+            continue
+        if limits['min_brightness'] is not None and s['brightness'] < limits['min_brightness']:
+            rejected[path] = f"under-exposed (brightness {s['brightness']:.1f})"
+        elif limits['max_brightness'] is not None and s['brightness'] > limits['max_brightness']:
+            rejected[path] = f"over-exposed (brightness {s['brightness']:.1f})"
+        elif limits['max_clipped'] is not None and s['clipped'] > limits['max_clipped']:
+            rejected[path] = f"clipped ({100 * s['clipped']:.0f}% of pixels)"
+        elif limits['min_sharpness'] is not None and s['sharpness'] < limits['min_sharpness']:
+            # exposure is checked first, dark frames also have little contrast
+            rejected[path] = f"blurry (sharpness {s['sharpness']:.1f})"
+        elif (limits['max_altitude_drop'] is not None and median_altitude is not None and path in altitudes
+              and median_altitude - altitudes[path] > limits['max_altitude_drop']):
+            rejected[path] = f"low altitude ({median_altitude - altitudes[path]:.1f} m below flight median)"
+        else:
+            passed.append(path)
+    return passed, rejected
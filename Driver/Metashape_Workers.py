@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import time
+import subprocess
+
+# Queue of Metashape worker processes shared by Parallel_Cloud.py and Tiled_Export.py.
+# Every job is a script run by a separate Metashape process (metashape -r <script> ...) that writes its
+# result as JSON to a file. At most `workers` processes run at a time, finished processes are polled
+# every POLL_SECONDS and their result file is handed back to the caller.
+
+# extra arguments of the worker processes, e.g. ['--platform', 'offscreen'] on headless Linux nodes
+METASHAPE_ARGS = []
+POLL_SECONDS = 1.0
+
+
+def worker_command(script, args, metashape_exe=None):
+    """ Command line running script in a new Metashape [default = sys.executable, i.e. the running Metashape] """
+    return [metashape_exe or sys.executable] + METASHAPE_ARGS + ['-r', script] + [str(a) for a in args]
+
+
+def read_result(path):
+    """ Parsed JSON result file of a worker, None when it is missing or incomplete """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def run_worker_queue(jobs, workers, finished, started=None):
+    """
+    Run worker processes, at most workers at a time
+        args:
+            jobs = list of (job, cmd, result path), a result file left by an earlier run is removed first
+            workers = simultaneous processes
+            finished = called as finished(job, result, returncode) when a process exits,
+                       result = parsed result file (None when the worker wrote none)
+            started = called as started(job) when a process is started
+    """
+    queue = list(jobs)
+    running = []
+    while queue or running:
+        while queue and len(running) < workers:
+            job, cmd, result = queue.pop(0)
+            if os.path.exists(result):
+                os.remove(result)
+            if started is not None:
+                started(job)
+            running.append((job, result, subprocess.Popen(cmd, stdout=subprocess.DEVNULL)))
+        time.sleep(POLL_SECONDS)
+        for item in list(running):
+            job, result, proc = item
+            if proc.poll() is None:
+                continue
+            running.remove(item)
+            finished(job, read_result(result), proc.returncode)
@@ -0,0 +1,192 @@
+import Metashape
+import os
+import sys
+import time
+from datetime import datetime
+
+from Chunk_Index import chunk_exists, refresh_chunk_index
+from Cloud_Worker import result_path
+from Metashape_Workers import worker_command, run_worker_queue
+
+# Concurrent per-date point cloud builds.
+# Each per camera group chunk (from copy_chunks_for_cloud) is written to its own project, and the depth
+# maps, point cloud and confidence filter are built by separate Metashape processes running
+# Cloud_Worker.py. The number of simultaneous workers is bounded by max_workers and by the available
+# memory divided by memory_per_worker_gb. The _PCFiltered chunks are appended back to the main project
+# (or left in the per-date projects), and the time of every stage is reported with the speed-up over
+# running the same work one chunk after another.
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Cloud_Worker.py')
+STAGES = ['open', 'depth_maps', 'point_cloud', 'filter', 'save']
+
+
+def available_memory_gb():
+    """ Free physical memory in GB, None when it cannot be determined """
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 1e9
+    except ImportError:
+        pass
+    if hasattr(os, 'sysconf') and 'SC_AVPHYS_PAGES' in os.sysconf_names:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 1e9
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+        return status.ullAvailPhys / 1e9
+    return None
+
+
+def worker_count(njobs, max_workers=None, memory_per_worker_gb=16.0):
+    """ Number of simultaneous workers allowed by the job count, max_workers and free memory """
+    workers = min(njobs, max_workers or os.cpu_count() or 1)
+    memory = available_memory_gb()
+    if memory is not None and memory_per_worker_gb:
+        workers = min(workers, int(memory // memory_per_worker_gb))
+    return max(1, workers)
+
+
+def export_chunk_projects(doc, chunk_labels, folder):
+    """
+    Write each chunk to its own project <folder>/<label>.psx
+        returns:
+            list of (label, project path)
+    """
+    os.makedirs(folder, exist_ok=True)
+    projects = []
+    for label in chunk_labels:
+        chunk = [c for c in doc.chunks if c.label == label][0]
+        project = os.path.join(folder, label + '.psx')
+        date_doc = Metashape.Document()
+        date_doc.append(doc, chunks=[chunk])
+        date_doc.save(project)
+        projects.append((label, project))
+    return projects
+
+
+def run_workers(projects, maxconf, workers, metashape_exe=None, retain=None, density=None, report=False):
+    """
+    Run Cloud_Worker.py for every (label, project), at most workers at a time
+        returns:
+            list of worker result dicts (see Cloud_Worker.build_cloud)
+    """
+    jobs = []
+    for label, project in projects:
+        args = ['-project', project, '-chunk', label, '-maxconf', maxconf]
+        if retain is not None:
+            args += ['-retain', retain]
+        if density is not None:
+            args += ['-density', density]
+        if report:
+            args += ['-report']
+        jobs.append(((label, project), worker_command(WORKER_SCRIPT, args, metashape_exe), result_path(project)))
+    results = []
+
+    def finished(job, result, returncode):
+        label, project = job
+        if result is None:
+            result = {'project': project, 'chunk': label, 'stages': {}, 'total': 0.0,
+                      'error': f"worker exited with code {returncode} without a result"}
+        print(f"Worker for {label} finished" + (f" with error: {result['error']}" if result['error'] else ""))
+        results.append(result)
+
+    run_worker_queue(jobs, workers, finished, started=lambda job: print(f"Starting point cloud worker for {job[0]}"))
+    return results
+
+
+def import_clouds(doc, results):
+    """ Append the _PCFiltered chunks of the finished per-date projects to doc """
+    imported = []
+    for result in results:
+        if result['error'] or chunk_exists(doc, result['filtered_chunk']):
+            continue
+        date_doc = Metashape.Document()
+        date_doc.open(result['project'], read_only=True)
+        chunks = [c for c in date_doc.chunks if c.label == result['filtered_chunk']]
+        doc.append(date_doc, chunks=chunks)
+        imported.append(result['filtered_chunk'])
+    refresh_chunk_index(doc)
+    return imported
+
+
+def throughput_report(results, wall_seconds, export_seconds, import_seconds, workers):
+    """
+    Lines describing the time of each stage summed over workers, against the wall time of the build
+    """
+    lines = [f"Parallel point clouds: {len(results)} chunks, {workers} workers"]
+    total = 0.0
+    for stage in STAGES:
+        seconds = sum(r['stages'].get(stage, 0.0) for r in results)
+        total += seconds
+        lines.append(f"    {stage}: {seconds:.1f} s summed over workers")
+    lines.append(f"    export to per-date projects: {export_seconds:.1f} s")
+    lines.append(f"    import of filtered chunks: {import_seconds:.1f} s")
+    lines.append(f"    worker wall time: {wall_seconds:.1f} s, serial time: {total:.1f} s, "
+                 f"speed-up: {total / wall_seconds if wall_seconds else 0:.2f}x")
+    errors = [r for r in results if r['error']]
+    if errors:
+        lines.append("    failed: " + ", ".join(r['chunk'] for r in errors))
+    return lines
+
+
+def build_clouds_parallel(doc, chunk_labels, maxconf, max_workers=None, memory_per_worker_gb=16.0,
+                          folder=None, import_back=True, metashape_exe=None, proclog=None, retain=None,
+                          density=None, report=False):
+    """
+    Build and filter the point clouds of several chunks in parallel Metashape processes
+        args:
+            doc = Metashape.Document (saved, the per-date projects go next to it)
+            chunk_labels = labels of the per camera group chunks (from copy_chunks_for_cloud)
+            maxconf = max confidence of the points removed by the filter, or 'auto' (see Cloud_Confidence.py)
+            max_workers = simultaneous workers [default = cpu count], also bounded by free memory
+            memory_per_worker_gb = memory reserved per worker
+            folder = folder of the per-date projects [default = '<project> Clouds' next to doc]
+            import_back = append the _PCFiltered chunks to doc, otherwise they stay in the per-date projects
+            metashape_exe = Metashape executable [default = sys.executable, i.e. the running Metashape]
+            proclog = str processing log to append the report to
+            retain, density = targets of maxconf = 'auto', fraction of points or points/m2 kept
+            report = report the points a fixed maxconf removes (exports each point cloud once)
+        returns:
+            list of _PCFiltered labels built
+    """
+    labels = [label for label in chunk_labels if not chunk_exists(doc, label + '_PCFiltered')]
+    if len(labels) < len(chunk_labels):
+        print("Point clouds already filtered, skipping: " + str(sorted(set(chunk_labels) - set(labels))))
+    if not labels:
+        return []
+    if folder is None:
+        folder = os.path.splitext(doc.path)[0] + ' Clouds'
+    workers = worker_count(len(labels), max_workers, memory_per_worker_gb)
+
+    start = time.perf_counter()
+    projects = export_chunk_projects(doc, labels, folder)
+    export_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = run_workers(projects, maxconf, workers, metashape_exe, retain, density, report)
+    wall_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    imported = import_clouds(doc, results) if import_back else []
+    import_seconds = time.perf_counter() - start
+
+    lines = throughput_report(results, wall_seconds, export_seconds, import_seconds, workers)
+    if import_back:
+        lines.append("    imported: " + ", ".join(imported))
+    else:
+        lines.append("    per-date projects kept in " + folder)
+    print("\n".join(lines))
+    if proclog:
+        with open(proclog, 'a') as f:
+            f.write("\n==================PARALLEL POINT CLOUDS=============================== \n")
+            f.write(f"{datetime.now()}\n")
+            f.write("\n".join(lines) + "\n")
+    return [r['filtered_chunk'] for r in results if not r['error']]
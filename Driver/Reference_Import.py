@@ -0,0 +1,136 @@
+import Metashape
+import os
+import csv
+
+# Single-pass reference import for the geotag CSVs of all flights.
+# The column layout of each CSV is worked out from its header and cached by header signature, so
+# flights written by the same tool are only sniffed once. All CSVs are merged into one normalized
+# table and each chunk gets one importReference call instead of one per flight.
+
+# header signature (delimiter, lower case header cells) -> layout
+_layout_cache = {}
+
+# Column order of the merged table
+MERGED_HEADER = ['label', 'longitude', 'latitude', 'altitude', 'yaw', 'pitch', 'roll',
+                 'accuracy horizontal', 'accuracy vertical']
+MERGED_COLUMNS = 'nxyzabc[XY]Z'
+
+# header text (start of the lower case cell) -> merged column
+HEADER_KEYS = [
+    (('image name', 'imagename', 'image', 'label', 'name', 'filename', 'file'), 'label'),
+    (('longitude', 'lon', 'easting', 'x'), 'longitude'),
+    (('latitude', 'lat', 'northing', 'y'), 'latitude'),
+    (('altitude', 'alt', 'elevation', 'height', 'z'), 'altitude'),
+    (('yaw', 'heading'), 'yaw'),
+    (('pitch',), 'pitch'),
+    (('roll',), 'roll'),
+    (('accuracy horizontal', 'horizontal accuracy', 'hacc', 'h accuracy'), 'accuracy horizontal'),
+    (('accuracy vertical', 'vertical accuracy', 'vacc', 'v accuracy'), 'accuracy vertical'),
+]
+
+
+def _sniff_delimiter(line):
+    counts = {d: line.count(d) for d in (',', '\t', ';')}
+    return max(counts, key=counts.get)
+
+
+def sniff_layout(path):
+    """
+    Work out the column layout of a geotag CSV from its header, cached by header signature
+        args:
+            path = str path of the CSV
+        returns:
+            layout = dict with delimiter and columns ({merged column: index in the CSV})
+    """
+    with open(path, newline='') as csvfile:
+        first = csvfile.readline()
+    delimiter = _sniff_delimiter(first)
+    header = next(csv.reader([first], delimiter=delimiter))
+    signature = (delimiter, tuple(cell.strip().lower() for cell in header))
+    layout = _layout_cache.get(signature)
+    if layout is not None:
+        return layout
+
+    columns = {}
+    # short keys ('x', 'lat') only match a whole word, longer keys match the start of the cell
+    for i, cell in enumerate(signature[1]):
+        for keys, column in HEADER_KEYS:
+            if column in columns:
+                continue
+            if any(cell == key or cell.startswith(key + ' ') or (len(key) > 3 and cell.startswith(key))
+                   for key in keys):
+                columns[column] = i
+                break
+    if 'label' not in columns and header:
+        columns['label'] = 0
+    if 'longitude' not in columns or 'latitude' not in columns:
+        # same rule as get_setup_string_for_csv: the second column is latitude or longitude
+        if len(header) > 3 and header[1].lower().startswith("latitude"):
+            columns.update({'latitude': 1, 'longitude': 2, 'altitude': 3})
+        elif len(header) > 3:
+            columns.update({'longitude': 1, 'latitude': 2, 'altitude': 3})
+    layout = {'delimiter': delimiter, 'columns': columns}
+    _layout_cache[signature] = layout
+    return layout
+
+
+def merge_reference_csvs(paths, merged_path):
+    """
+    Merge geotag CSVs into one table with MERGED_HEADER columns
+        args:
+            paths = list of CSV paths (missing files are skipped)
+            merged_path = str path of the merged CSV
+        returns:
+            nrows = number of rows written
+            used = list of CSVs that were merged
+    """
+    nrows = 0
+    used = []
+    with open(merged_path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(MERGED_HEADER)
+        for path in paths:
+            if not os.path.exists(path):
+                print(f"Reference file {path} not found, skipping")
+                continue
+            layout = sniff_layout(path)
+            index = [layout['columns'].get(column) for column in MERGED_HEADER]
+            with open(path, newline='') as csvfile:
+                reader = csv.reader(csvfile, delimiter=layout['delimiter'])
+                next(reader, None)
+                rows = [[row[i].strip() if i is not None and i < len(row) else '' for i in index]
+                        for row in reader if row]
+            writer.writerows(rows)
+            nrows += len(rows)
+            used.append(path)
+    return nrows, used
+
+
+def import_references(chunks, geo_ref_list, merged_path=None):
+    """
+    Import all geotag CSVs into one or more chunks with a single importReference call per chunk
+        args:
+            chunks = Metashape.Chunk or list of chunks
+            geo_ref_list = list of geotag CSV paths (from setup_psx)
+            merged_path = str path of the merged CSV [default = geotags_merged.csv next to the project]
+        returns:
+            merged_path
+    """
+    if not isinstance(chunks, (list, tuple)):
+        chunks = [chunks]
+    if len(geo_ref_list) == 0:
+        print("No reference files to import")
+        return None
+    if merged_path is None:
+        doc_path = Metashape.app.document.path
+        folder = os.path.dirname(doc_path) if doc_path else os.path.dirname(geo_ref_list[0])
+        merged_path = os.path.join(folder, 'geotags_merged.csv')
+    nrows, used = merge_reference_csvs(geo_ref_list, merged_path)
+    print(f"Merged {nrows} reference rows from {len(used)} files into {merged_path}")
+    if nrows == 0:
+        return merged_path
+    for chunk in chunks:
+        chunk.importReference(merged_path, format=Metashape.ReferenceFormatCSV, skip_rows=1,
+                              columns=MERGED_COLUMNS, delimiter=',')
+        print(f"Imported reference into chunk '{chunk.label}'")
+    return merged_path
@@ -0,0 +1,181 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+# When doc.save() is called, by save mode.
+# Events raised by the workflow:
+#   stage     = a processing step finished (chunk copied, gradual selection pass, DEM built...)
+#   milestone = an expensive result exists that would take hours to redo (alignment, error reduction,
+#               point clouds, exports)
+#   risky     = about to run an operation that is known to crash or run out of memory
+#               (depth maps, point cloud, raster export)
+#   error     = a stage raised an exception
+#   final     = end of processing for a project, saved whenever anything is unsaved
+SAVE_MODES = {
+    'stage': ('stage', 'milestone', 'error', 'final'),      # save after every stage (original behaviour)
+    'interval': ('final',),                                 # save when save_interval minutes have passed
+    'milestone': ('milestone', 'final'),                    # save only after expensive results
+    'risky': ('risky', 'milestone', 'error', 'final'),      # save before crash-prone operations
+}
+
+
+class SavePolicy():
+    """
+    Decide when the Metashape document is saved and record what each save cost.
+    On multi-GB projects on a network share a save can take minutes, so the policy lets each
+    project trade durability against throughput.
+        args:
+            mode = key of SAVE_MODES
+            interval_minutes = minimum time between saves in 'interval' mode
+            measure_bytes = sum the size of project files written by each save (walks the whole
+                            <name>.files tree after every save, slow on network shares)
+            proclog = str name of processing log, each save is appended to it (optional)
+    """
+
+    def __init__(self, mode='stage', interval_minutes=30, measure_bytes=False, proclog=None):
+        if mode not in SAVE_MODES:
+            print('Exception: Unknown save mode "' + str(mode) + '", choose from ' + ', '.join(SAVE_MODES) + '.')
+            raise ValueError('Unknown save mode "' + str(mode) + '", choose from ' + ', '.join(SAVE_MODES) + '.')
+        self.mode = mode
+        self.interval = timedelta(minutes=interval_minutes)
+        self.measure_bytes = measure_bytes
+        self.proclog = proclog
+        self.records = []
+        self.skipped = 0
+        self.dirty = False
+        self.last_save = datetime.now()
+
+    def should_save(self, event):
+        if event == 'final':
+            return self.dirty
+        if self.mode == 'interval':
+            return datetime.now() - self.last_save >= self.interval
+        return event in SAVE_MODES[self.mode]
+
+    def save(self, doc, event='stage', label='', path=None, force=False):
+        """
+        Save the document if the policy asks for it.
+            args:
+                doc = Metashape.Document
+                event = one of stage, milestone, risky, error, final
+                label = str description of the stage, used in the log
+                path = save to a new path (doc.save(path))
+                force = save regardless of mode
+            returns:
+                True if the document was saved
+        """
+        if not (force or path is not None or self.should_save(event)):
+            if event != 'risky':
+                # something changed since the last save
+                self.dirty = True
+            self.skipped += 1
+            return False
+
+        start = datetime.now()
+        start_time = time.time()
+        if path is not None:
+            doc.save(path)
+        else:
+            doc.save()
+        seconds = time.time() - start_time
+        nbytes = project_bytes_written(doc.path, start_time) if self.measure_bytes else None
+        record = {
+            'event': event,
+            'label': label,
+            'start': start,
+            'seconds': seconds,
+            'bytes': nbytes,
+        }
+        self.records.append(record)
+        self.dirty = False
+        self.last_save = datetime.now()
+        print(f"Saved project ({event}{': ' + label if label else ''}) in {seconds:.1f} s"
+              + (f", {format_bytes(nbytes)} written" if nbytes is not None else ""))
+        if self.proclog:
+            with open(self.proclog, 'a') as f:
+                f.write(f"Saved project ({event}{': ' + label if label else ''}) in {timedelta(seconds=seconds)}"
+                        + (f", {format_bytes(nbytes)} written" if nbytes is not None else "") + "\n")
+        return True
+
+    def summary(self):
+        """
+        returns:
+            dict with number of saves, skipped saves, total save time (s) and total bytes written
+        """
+        return {
+            'mode': self.mode,
+            'saves': len(self.records),
+            'skipped': self.skipped,
+            'seconds': sum(r['seconds'] for r in self.records),
+            'bytes': sum(r['bytes'] or 0 for r in self.records),
+        }
+
+    def write_summary(self, proclog=None):
+        proclog = proclog or self.proclog
+        if not proclog:
+            return
+        s = self.summary()
+        with open(proclog, 'a') as f:
+            f.write(f"Save mode: {s['mode']}, {s['saves']} saves ({s['skipped']} skipped) took "
+                    f"{timedelta(seconds=s['seconds'])}, {format_bytes(s['bytes'])} written\n")
+
+
+def save_document(doc, save_policy=None, event='stage', label=''):
+    """
+    Save through save_policy, or call doc.save() directly like the original workflow when no
+    policy is given (risky events are only used by policies, so they never save in that case).
+    """
+    if save_policy is not None:
+        return save_policy.save(doc, event, label)
+    if event == 'risky':
+        return False
+    doc.save()
+    return True
+
+
+def project_bytes_written(psx_path, since):
+    """
+    Sum the size of project files modified since a time stamp.
+        args:
+            psx_path = path of the .psx file, data lives in the sibling <name>.files folder
+            since = time.time() value taken before the save
+        returns:
+            bytes written
+    """
+    if not psx_path:
+        return 0
+    # allow for coarse file system time stamps (SMB shares round to 1-2 s)
+    since = since - 2
+    nbytes = 0
+    try:
+        st = os.stat(psx_path)
+        if st.st_mtime >= since:
+            nbytes += st.st_size
+    except OSError:
+        pass
+    stack = [os.path.splitext(psx_path)[0] + '.files']
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_mtime >= since:
+                        nbytes += st.st_size
+    return nbytes
+
+
+def format_bytes(nbytes):
+    if nbytes is None:
+        return 'unknown'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024:
+            return f"{nbytes:.1f} {unit}"
+        nbytes = nbytes / 1024
+    return f"{nbytes:.1f} TB"
@@ -1,7 +1,11 @@
 
 import Metashape
 import os
-import re
+from Chunk_Index import find_chunks, refresh_chunk_index, copy_chunk
+from Flight_Catalog import scan_flight_folders, match_flights
+from Image_Quality import screen_photos
+from Image_Metadata import build_catalog
+from Reference_Import import import_references
 
 
 def activate_chunk(doc, chunk_name):
@@ -13,23 +17,24 @@ def activate_chunk(doc, chunk_name):
         returns:
             chunk = activated chunk
     """
-    # Get list of chunk labels
-    chunk_label_list = [chunk.label for chunk in doc.chunks]
-    # find all indices of chunks labeled chunk_name in document
-    chunk_idx = [idx for idx, label in enumerate(chunk_label_list) if label == chunk_name]
-    if len(chunk_idx) == 0:
+    # find all chunks labeled chunk_name in the document label index
+    chunk_list = find_chunks(doc, chunk_name)
+    if len(chunk_list) == 0:
+        # chunk may have been added outside the index helpers, rebuild the index once before giving up
+        chunk_list = refresh_chunk_index(doc).get(chunk_name, [])
+    if len(chunk_list) == 0:
         # no chunks with that label
         # print exception so it will be visible in console
         print('Exception: No chunk named ' + '"' + chunk_name + '"' + ' in project, stopping execution.')
         #raise Exception('No chunk named ' + '"' + chunk_name + '"' + ' in project.')
         return None
-    if len(chunk_idx) > 1:
+    if len(chunk_list) > 1:
         # more than one chunk with that label
         # print exception so it will be visible in console
         print('Exception: More than one chunk named ' + '"' + chunk_name + '"' + ' in project, stopping execution.')
         raise Exception('More than one chunk named ' + '"' + chunk_name + '"' + ' in project.')
     # if only one chunk with that name, then activate chunk
-    doc.chunk = doc.chunks[chunk_idx[0]]
+    doc.chunk = chunk_list[0]
     chunk = doc.chunk
     return chunk
 
@@ -48,53 +53,117 @@ def align_images(chunk, alignment_params):
     print(f"Images in chunk '{chunk.label}' have been aligned.")
 
 
-def setup_psx(user_tags, flight_folder_list, doc, load_photos = True):
+def align_new_cameras(chunk, cameras, alignment_params):
+    """
+    Match and align only new cameras against the already aligned cameras of a chunk.
+    Matching reuses the key points of the existing cameras, so the chunk has to be aligned with
+    keep_keypoints = True (setup with -incremental does this).
+
+    Parameters:
+        chunk (Metashape.Chunk): The chunk containing the aligned block and the new cameras.
+        cameras (list): Metashape.Camera objects to align.
+    """
+    params = dict(alignment_params)
+    params['keep_keypoints'] = True
+    params['reset_matches'] = False
+    chunk.matchPhotos(cameras=cameras, **params)
+    chunk.alignCameras(cameras=cameras, reset_alignment=False)
+    aligned = len([True for camera in cameras if camera.transform])
+    print(f"Aligned {aligned} of {len(cameras)} new cameras in chunk '{chunk.label}'.")
+
+
+def add_new_cameras(source_chunk, target_chunk):
+    """
+    Add cameras of source_chunk that are not in target_chunk (by label) to target_chunk, in camera
+    groups with the same labels.
+        args:
+            source_chunk = Metashape.Chunk with all photos (Raw_Photos)
+            target_chunk = Metashape.Chunk to append to (Raw_Photos_Align)
+        returns:
+            new_cameras = list of cameras added to target_chunk
+    """
+    existing_labels = {camera.label for camera in target_chunk.cameras}
+    group_dict = {group.label: i for i, group in enumerate(target_chunk.camera_groups)}
+    photos_by_group = {}
+    for camera in source_chunk.cameras:
+        if camera.label in existing_labels or camera.photo is None:
+            continue
+        group_name = camera.group.label if camera.group is not None else None
+        photos_by_group.setdefault(group_name, []).append(camera.photo.path)
+    for group_name, photos in photos_by_group.items():
+        group = None
+        if group_name is not None:
+            if group_name not in group_dict:
+                group_dict[group_name] = len(target_chunk.camera_groups)
+                current_group = target_chunk.addCameraGroup()
+                current_group.label = group_name
+            group = group_dict[group_name]
+        print(f"Adding {len(photos)} new photos to group {group_name} of chunk '{target_chunk.label}'")
+        target_chunk.addPhotos(photos, group=group)
+    return [camera for camera in target_chunk.cameras if camera.label not in existing_labels]
+
+
+def setup_psx(user_tags, flight_folder_list, doc, load_photos = True, catalog_path = None, incremental = False,
+              prescreen = None, prefetch_metadata = False):
 
     # Initialize an empty dictionary
     tag_dict = {}
     group_dict = {}
-    # Regular expression pattern to match the text before "Flight"
-    pattern = re.compile(r'(.+?)\s*Flight\s*\d+')
 
     geo_ref_list =[]
     if load_photos:
-        orig_chunk = doc.chunk
-        chunk = orig_chunk.copy()
-        chunk.label = "Raw_Photos"
+        raw_chunks = find_chunks(doc, "Raw_Photos") if incremental else []
+        if raw_chunks:
+            # append new flights to the existing Raw_Photos chunk instead of starting over
+            doc.chunk = raw_chunks[0]
+        else:
+            orig_chunk = doc.chunk
+            chunk = copy_chunk(doc, orig_chunk, "Raw_Photos")
+            if incremental:
+                # later runs append to Raw_Photos, so the photos have to go there from the start
+                doc.chunk = chunk
     chunk = doc.chunk
-    for flight_folder in flight_folder_list:
-        # Walk through the subdirectories
-        for subdir, dirs, _ in os.walk(flight_folder):
-            if "OUTPUT" in dirs:
-                # Extract group name using regular expression
-                match = pattern.search(os.path.basename(subdir))
-                temp_name =os.path.basename(subdir)
-                if match:
-                    group_name = match.group(1).strip()  # Get the matched group and strip whitespace
-                    ref_name = temp_name + ' geotags.csv'    # Check if the group name starts with any of the user-specified tags
-                    
-                    if any(group_name.startswith(tag) for tag in user_tags):
-                        if group_name not in tag_dict:
-                            tag_dict[group_name] = []
-                        tag_dict[group_name].append(subdir)
-
-                        output_dir = os.path.join(subdir, "OUTPUT")
-                        if load_photos:
-                            photos = [os.path.join(output_dir, f) for f in os.listdir(output_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-                            if group_name not in group_dict:
-                                ##check if group_dict is empty
-                                if not group_dict:
-                                    group_dict[group_name] = 0
-                                else:
-                                    group_dict[group_name] = max(group_dict.values()) + 1
-                                current_group = chunk.addCameraGroup()
-                                current_group.label = group_name
-                            # Here you might want to add photos to the Metashape chunk
-                            print(f"Adding photos from {output_dir} to group {group_name}")
-                            chunk.addPhotos(photos, group=group_dict[group_name])
-                            
-                        geo_ref_list.append(os.path.join(output_dir, ref_name))
-                        chunk = doc.chunk
+    existing_labels = set()
+    if incremental and load_photos:
+        existing_labels = {camera.label for camera in chunk.cameras}
+        group_dict = {group.label: i for i, group in enumerate(chunk.camera_groups)}
+    # Folders containing "OUTPUT" come from the flight catalog, only folders that changed since the last
+    # run are listed again. Without photos to load only the geotag file names are needed, so the catalog
+    # is used as is for flight folders scanned before.
+    flights = scan_flight_folders(flight_folder_list, catalog_path, trust_catalog = not load_photos)
+    for flight in match_flights(flights, user_tags):
+        group_name = flight['group_name']
+        subdir = flight['flight_dir']
+        if group_name not in tag_dict:
+            tag_dict[group_name] = []
+        tag_dict[group_name].append(subdir)
+
+        output_dir = flight['output_dir']
+        if prefetch_metadata:
+            # EXIF/XMP header catalog, read by the pre-screen for the photo altitudes
+            build_catalog(output_dir, photos = [f for f in flight['photos'] if f.lower().endswith(('.jpg', '.jpeg'))])
+        if load_photos:
+            photos = [os.path.join(output_dir, f) for f in flight['photos']
+                      if os.path.splitext(f)[0] not in existing_labels]
+            if prescreen is not None and len(photos) > 0:
+                # drop blurry, badly exposed and take-off/landing frames before matching
+                photos, rejected = screen_photos(photos, prescreen)
+                for photo, reason in rejected.items():
+                    print(f"Skipping {os.path.basename(photo)}: {reason}")
+                print(f"Pre-screen kept {len(photos)} of {len(photos) + len(rejected)} photos from {output_dir}")
+            if len(photos) == 0:
+                print(f"No new photos to add from {output_dir}")
+            else:
+                if group_name not in group_dict:
+                    group_dict[group_name] = len(chunk.camera_groups)
+                    current_group = chunk.addCameraGroup()
+                    current_group.label = group_name
+                # Here you might want to add photos to the Metashape chunk
+                print(f"Adding photos from {output_dir} to group {group_name}")
+                chunk.addPhotos(photos, group=group_dict[group_name])
+
+        geo_ref_list.append(os.path.join(output_dir, flight['ref_name']))
+        chunk = doc.chunk
     return geo_ref_list, chunk
 
 def main():
@@ -0,0 +1,48 @@
+import Metashape
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from Tiled_Export import read_state, export_tile
+
+# Tile export worker started by Tiled_Export.py as a separate Metashape process:
+#   metashape -r Tile_Worker.py -project <project.psx> -state <name>_tiles/tiles.json -result <batch.json> -tiles r000_c000,r000_c001
+# Opens the project read only and exports the listed tiles of the chunk and product recorded in
+# tiles.json, writing the status and time of every tile to the result file.
+
+
+def export_batch(project, state_path, names, result_path):
+    state = read_state(state_path)
+    tiles = {tile['name']: tile for tile in state['tiles']}
+    results = {}
+    try:
+        if state['geoid']:
+            Metashape.CoordinateSystem.addGeoid(state['geoid'])
+        projection = Metashape.OrthoProjection()
+        if state['crs']:
+            projection.crs = Metashape.CoordinateSystem(state['crs'])
+        doc = Metashape.Document()
+        doc.open(project, read_only=True, ignore_lock=True)
+        chunk = [c for c in doc.chunks if c.label == state['chunk']][0]
+        for name in names:
+            results[name] = export_tile(chunk, state, tiles[name], projection)
+    except (RuntimeError, IndexError, OSError) as e:
+        for name in names:
+            results.setdefault(name, {'status': 'failed', 'seconds': 0.0, 'error': str(e)})
+    with open(result_path, 'w') as f:
+        json.dump(results, f, indent=1)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export tiles of a DEM or orthomosaic.')
+    parser.add_argument('-project', required=True, help='Project (.psx) holding the chunk')
+    parser.add_argument('-state', required=True, help='tiles.json of the tiled export')
+    parser.add_argument('-result', required=True, help='JSON file the tile results are written to')
+    parser.add_argument('-tiles', required=True, help='Comma separated tile names')
+    args = parser.parse_args()
+    results = export_batch(args.project, args.state, args.tiles.split(','), args.result)
+    print(json.dumps(results))
+    sys.exit(1 if any(r['status'] == 'failed' for r in results.values()) else 0)
@@ -0,0 +1,293 @@
+import Metashape
+import os
+import json
+import math
+import time
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from Metashape_Workers import worker_command, run_worker_queue
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+# Tiled DEM and orthomosaic export.
+# Instead of one BigTIFF per product, the product extent is split into a grid of tiles aligned to the
+# output pixel grid and every tile is written by exportRaster(region=...) to <name>_tiles/. Tiles are
+# exported by this Metashape (workers = 1) or by up to `workers` Metashape processes running
+# Tile_Worker.py on the saved project. A tile is written under a _partial name and renamed when done,
+# and <name>_tiles/tiles.json keeps the grid and the status of every tile, so an interrupted export
+# only redoes the missing tiles. When all tiles exist a GDAL VRT (<name>.vrt) mosaics them into one dataset.
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Tile_Worker.py')
+STATE_FILE = 'tiles.json'
+# tiles handed to a worker process at a time
+TILES_PER_BATCH = 16
+# Metashape export layouts, used to write the VRT when GDAL is not available
+DEM_NODATA = -32767.0
+BANDS = {'dem': [('Float32', 'Gray')],
+         'ortho': [('Byte', 'Red'), ('Byte', 'Green'), ('Byte', 'Blue'), ('Byte', 'Alpha')]}
+
+
+def product_source(product):
+    return Metashape.DataSource.ElevationData if product == 'dem' else Metashape.DataSource.OrthomosaicData
+
+
+def product_bounds(chunk, product, crs):
+    """
+    (xmin, ymin, xmax, ymax) of the chunk DEM or orthomosaic in crs
+    """
+    raster = chunk.elevation if product == 'dem' else chunk.orthomosaic
+    if raster is None:
+        raise RuntimeError("Chunk " + chunk.label + " has no " + ('DEM' if product == 'dem' else 'orthomosaic'))
+    corners = [(raster.left, raster.bottom), (raster.left, raster.top), (raster.right, raster.bottom),
+               (raster.right, raster.top)]
+    if raster.crs is not None and crs is not None and raster.crs.wkt != crs.wkt:
+        corners = [Metashape.CoordinateSystem.transform(Metashape.Vector([x, y, 0]), raster.crs, crs)
+                   for x, y in corners]
+    xs = [c[0] for c in corners]
+    ys = [c[1] for c in corners]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def tile_grid(bounds, resolution, tile_size):
+    """
+    Tiles of tile_size x tile_size pixels covering bounds, edges on multiples of resolution
+        returns:
+            origin = (x of the left edge, y of the top edge), width, height = pixels of the mosaic,
+            tiles = list of tile dicts (name, row, col, bbox, xoff, yoff, width, height)
+    """
+    xmin, ymin, xmax, ymax = bounds
+    left = math.floor(xmin / resolution) * resolution
+    top = math.ceil(ymax / resolution) * resolution
+    width = max(1, int(math.ceil((xmax - left) / resolution - 1e-9)))
+    height = max(1, int(math.ceil((top - ymin) / resolution - 1e-9)))
+    tiles = []
+    for row, yoff in enumerate(range(0, height, tile_size)):
+        for col, xoff in enumerate(range(0, width, tile_size)):
+            w = min(tile_size, width - xoff)
+            h = min(tile_size, height - yoff)
+            bbox = [left + xoff * resolution, top - (yoff + h) * resolution,
+                    left + (xoff + w) * resolution, top - yoff * resolution]
+            tiles.append({'name': f"r{row:03d}_c{col:03d}", 'row': row, 'col': col, 'bbox': bbox,
+                          'xoff': xoff, 'yoff': yoff, 'width': w, 'height': h,
+                          'status': 'pending', 'seconds': 0.0, 'error': None})
+    return (left, top), width, height, tiles
+
+
+def tile_path(state, tile):
+    return os.path.join(state['folder'], state['base'] + '_' + tile['name'] + '.tif')
+
+
+def read_state(state_path):
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def write_state(state, state_path):
+    tmp = state_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, state_path)
+
+
+def tile_state(chunk, path, product, projection, resolution, tile_size, geoid=None):
+    """
+    Tile state of a tiled export, reloaded from <name>_tiles/tiles.json when the grid is unchanged
+        returns:
+            state dict, path of tiles.json
+    """
+    folder = os.path.splitext(path)[0] + '_tiles'
+    state_path = os.path.join(folder, STATE_FILE)
+    raster = chunk.elevation if product == 'dem' else chunk.orthomosaic
+    resolution = resolution or raster.resolution
+    origin, width, height, tiles = tile_grid(product_bounds(chunk, product, projection.crs), resolution, tile_size)
+    state = {'product': product, 'chunk': chunk.label, 'crs': projection.crs.wkt if projection.crs else None,
+             'geoid': geoid, 'resolution': resolution, 'tile_size': tile_size, 'origin': list(origin),
+             'width': width, 'height': height, 'folder': folder, 'base': os.path.basename(os.path.splitext(path)[0]),
+             'tiles': tiles}
+    if os.path.exists(state_path):
+        previous = read_state(state_path)
+        keys = ['product', 'chunk', 'crs', 'resolution', 'tile_size', 'origin', 'width', 'height']
+        if all(previous.get(k) == state[k] for k in keys):
+            state['tiles'] = previous['tiles']
+        else:
+            print("Tile grid of " + path + " changed, exporting all tiles again")
+    for tile in state['tiles']:
+        # only tiles renamed from _partial after a finished export count as done
+        if tile['status'] == 'done' and not os.path.exists(tile_path(state, tile)):
+            tile['status'] = 'pending'
+    os.makedirs(folder, exist_ok=True)
+    write_state(state, state_path)
+    return state, state_path
+
+
+def export_tile(chunk, state, tile, projection):
+    """
+    Export one tile with exportRaster, written under a _partial name and renamed when complete
+        returns:
+            tile result dict (status, seconds, error)
+    """
+    out = tile_path(state, tile)
+    partial = os.path.splitext(out)[0] + '_partial.tif'
+    xmin, ymin, xmax, ymax = tile['bbox']
+    start = time.perf_counter()
+    kwargs = {}
+    if state['product'] == 'ortho':
+        compression = Metashape.ImageCompression()
+        compression.tiff_big = False
+        kwargs['image_compression'] = compression
+    try:
+        chunk.exportRaster(path=partial, source_data=product_source(state['product']), projection=projection,
+                           resolution=state['resolution'],
+                           region=Metashape.BBox(Metashape.Vector([xmin, ymin]), Metashape.Vector([xmax, ymax])),
+                           **kwargs)
+        if os.path.exists(partial):
+            os.replace(partial, out)
+            status = 'done'
+        else:
+            # nothing of the product inside the tile
+            status = 'empty'
+        error = None
+    except (RuntimeError, OSError) as e:
+        status, error = 'failed', str(e)
+    return {'status': status, 'seconds': time.perf_counter() - start, 'error': error}
+
+
+def pending_tiles(state):
+    return [tile for tile in state['tiles'] if tile['status'] not in ('done', 'empty')]
+
+
+def export_tiles_serial(chunk, state, state_path, projection):
+    """ Export the pending tiles in this Metashape, saving the tile state after each tile """
+    for tile in pending_tiles(state):
+        tile.update(export_tile(chunk, state, tile, projection))
+        write_state(state, state_path)
+        print(f"Tile {tile['name']} {tile['status']} in {tile['seconds']:.1f} s")
+
+
+def batch_result_path(state_path, batch):
+    return os.path.join(os.path.dirname(state_path), f"batch_{batch:04d}.result.json")
+
+
+def export_tiles_parallel(project, state, state_path, workers, metashape_exe=None):
+    """
+    Export the pending tiles with Tile_Worker.py processes, at most workers at a time.
+    Each worker opens the saved project read only and exports a batch of TILES_PER_BATCH tiles.
+    """
+    names = [tile['name'] for tile in pending_tiles(state)]
+    jobs = []
+    for batch, start in enumerate(range(0, len(names), TILES_PER_BATCH)):
+        batch_names = names[start:start + TILES_PER_BATCH]
+        result = batch_result_path(state_path, batch)
+        cmd = worker_command(WORKER_SCRIPT, ['-project', project, '-state', state_path, '-result', result,
+                                             '-tiles', ','.join(batch_names)], metashape_exe)
+        jobs.append(((batch, batch_names), cmd, result))
+    tiles = {tile['name']: tile for tile in state['tiles']}
+
+    def finished(job, results, returncode):
+        batch, batch_names = job
+        for name in batch_names:
+            tiles[name].update((results or {}).get(name, {'status': 'failed', 'seconds': 0.0,
+                                                          'error': f"worker exited with code {returncode}"}))
+        write_state(state, state_path)
+        done = sum(tile['status'] in ('done', 'empty') for tile in state['tiles'])
+        print(f"Tile batch {batch} finished, {done} of {len(state['tiles'])} tiles exported")
+
+    run_worker_queue(jobs, workers, finished)
+
+
+def write_vrt(vrt_path, state):
+    """
+    GDAL VRT mosaic of the exported tiles, with gdal.BuildVRT when GDAL is available
+    """
+    files = [tile_path(state, tile) for tile in state['tiles'] if tile['status'] == 'done']
+    if gdal is not None:
+        vrt = gdal.BuildVRT(vrt_path, files)
+        vrt.FlushCache()
+        vrt = None
+        return vrt_path
+    res = state['resolution']
+    left, top = state['origin']
+    folder = os.path.relpath(state['folder'], os.path.dirname(os.path.abspath(vrt_path)))
+    lines = [f'<VRTDataset rasterXSize="{state["width"]}" rasterYSize="{state["height"]}">']
+    if state['crs']:
+        lines.append(f'  <SRS>{escape(state["crs"])}</SRS>')
+    lines.append(f'  <GeoTransform>{left!r}, {res!r}, 0.0, {top!r}, 0.0, {-res!r}</GeoTransform>')
+    for band, (data_type, color) in enumerate(BANDS[state['product']], start=1):
+        lines.append(f'  <VRTRasterBand dataType="{data_type}" band="{band}">')
+        if state['product'] == 'dem':
+            lines.append(f'    <NoDataValue>{DEM_NODATA!r}</NoDataValue>')
+        lines.append(f'    <ColorInterp>{color}</ColorInterp>')
+        for tile in state['tiles']:
+            if tile['status'] != 'done':
+                continue
+            source = os.path.join(folder, os.path.basename(tile_path(state, tile))).replace(os.sep, '/')
+            lines += ['    <SimpleSource>',
+                      f'      <SourceFilename relativeToVRT="1">{escape(source)}</SourceFilename>',
+                      f'      <SourceBand>{band}</SourceBand>',
+                      f'      <SrcRect xOff="0" yOff="0" xSize="{tile["width"]}" ySize="{tile["height"]}" />',
+                      f'      <DstRect xOff="{tile["xoff"]}" yOff="{tile["yoff"]}" xSize="{tile["width"]}" '
+                      f'ySize="{tile["height"]}" />',
+                      '    </SimpleSource>']
+        lines.append('  </VRTRasterBand>')
+    lines.append('</VRTDataset>')
+    with open(vrt_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return vrt_path
+
+
+def export_raster_tiled(doc, chunk, path, product, projection, resolution=0, tile_size=8192, workers=1,
+                        geoid=None, metashape_exe=None, save_policy=None, proclog=None):
+    """
+    Export the DEM or orthomosaic of a chunk as tiles and a VRT mosaic, restarting from tiles.json
+        args:
+            doc = Metashape.Document (saved before starting worker processes)
+            chunk = Metashape.Chunk with the product
+            path = .vrt path of the mosaic, tiles go to <name>_tiles/
+            product = 'dem' or 'ortho'
+            projection = Metashape.OrthoProjection of the export
+            resolution = output resolution [0 = product resolution]
+            tile_size = tile width and height in pixels
+            workers = Metashape processes exporting tiles at the same time (1 = this Metashape)
+            geoid = geoid file added in the worker processes
+            metashape_exe = Metashape executable [default = sys.executable, i.e. the running Metashape]
+            save_policy = SavePolicy recording the save before the workers start (None = doc.save())
+            proclog = str processing log to append the report to
+        returns:
+            dict with the vrt path (None while tiles are missing) and tile counts
+    """
+    state, state_path = tile_state(chunk, path, product, projection, resolution, tile_size, geoid)
+    todo = len(pending_tiles(state))
+    print(f"Tiled export of {path}: {len(state['tiles'])} tiles of {tile_size} px, {todo} to export")
+    start = time.perf_counter()
+    if todo and workers > 1:
+        # workers read the project from disk, so it is saved whatever the save mode
+        if save_policy is not None:
+            save_policy.save(doc, 'risky', 'Tiled export ' + product, force=True)
+        else:
+            doc.save()
+        export_tiles_parallel(doc.path, state, state_path, min(workers, todo), metashape_exe)
+    elif todo:
+        export_tiles_serial(chunk, state, state_path, projection)
+    wall_seconds = time.perf_counter() - start
+
+    failed = [tile['name'] for tile in state['tiles'] if tile['status'] == 'failed']
+    missing = pending_tiles(state)
+    vrt = write_vrt(path, state) if not missing else None
+    tile_seconds = sum(tile['seconds'] for tile in state['tiles'])
+    lines = [f"Tiled export of {os.path.basename(path)}: {len(state['tiles'])} tiles, {workers} workers",
+             f"    exported this run: {todo - len(missing)}, failed: {len(failed)}",
+             f"    wall time: {wall_seconds:.1f} s, tile time: {tile_seconds:.1f} s summed over tiles"]
+    if failed:
+        lines.append("    failed tiles (run the export again to retry): " + ", ".join(failed))
+    lines.append("    mosaic: " + (vrt if vrt else "not written, tiles missing"))
+    print("\n".join(lines))
+    if proclog:
+        with open(proclog, 'a') as f:
+            f.write("\n==================TILED EXPORT=============================== \n")
+            f.write(f"{datetime.now()}\n")
+            f.write("\n".join(lines) + "\n")
+    return {'vrt': vrt, 'tiles': len(state['tiles']), 'exported': todo - len(missing), 'failed': failed}
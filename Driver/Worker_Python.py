@@ -0,0 +1,23 @@
+import os
+import sys
+import multiprocessing
+
+# Worker processes started from the Metashape console.
+# In the Metashape console sys.executable is Metashape itself, so process pools would start new
+# Metashape instances instead of python. use_python_executable() points multiprocessing at the python
+# interpreter bundled with Metashape; outside Metashape it leaves sys.executable unchanged.
+
+
+def python_executable():
+    exe = sys.executable
+    if os.path.basename(exe).lower().startswith('metashape'):
+        for name in ('python.exe', 'python3', 'python'):
+            candidate = os.path.join(os.path.dirname(exe), 'python', name)
+            if os.path.exists(candidate):
+                return candidate
+    return exe
+
+
+def use_python_executable():
+    """ Call before creating a ProcessPoolExecutor """
+    multiprocessing.set_executable(python_executable())
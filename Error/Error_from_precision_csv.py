@@ -1,61 +1,34 @@
-import csv
-import math
 import os
+import sys
 
-def calc_precision_error(input_file_path):
-    # Initialize sums for calculating RMS
-    sum_sq_x, sum_sq_y, sum_sq_z = 0, 0, 0
-    count = 0
-
-    # Open the input file for reading and the output file for writing
-    with open(input_file_path, 'r', newline='') as infile:
-        # Create a CSV reader and writer with tab delimiter
-        reader = csv.DictReader(infile, delimiter='\t')
-        fieldnames = reader.fieldnames  # No need to add new fields for RMS in the output file
-        
-        # Iterate through each row in the input file
-        for row in reader:
-            # Convert standard deviations from mm to meters for consistency with squared terms
-            sX = float(row['sX(mm)']) / 1000
-            sY = float(row['sY(mm)']) / 1000
-            sZ = float(row['sZ(mm)']) / 1000
-            
-            count += 1  # Increment count for each point
-            # Add the squared standard deviations to the running sums
-            sum_sq_x += sX
-            sum_sq_y += sY
-            sum_sq_z += sZ
-            # Write the original row to the output file
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from precision_stats import file_statistics, folder_statistics, write_precision_results
 
-    #Average of the squared standard deviations
-    avg_sq_x = sum_sq_x / count
-    avg_sq_y = sum_sq_y / count
-    avg_sq_z = sum_sq_z / count
+def calc_precision_error(input_file_path):
+    # RMS precision (m) of one text or binary file, read in blocks (see precision_stats.py)
+    stats = file_statistics(input_file_path)
+    rms_x = stats['X rms']
+    rms_y = stats['Y rms']
+    rms_z = stats['Z rms']
 
     print(f"File: {input_file_path}")
-    print(f"Average precision in X: {avg_sq_x}")
-    print(f"Average precision in Y: {avg_sq_y}")
-    print(f"Average precision in Z: {avg_sq_z}")
-    result = [avg_sq_x, avg_sq_y, avg_sq_z]
+    print(f"Mean precision in X, Y, Z: {stats['X mean']}, {stats['Y mean']}, {stats['Z mean']}")
+    print(f"RMS precision in X: {rms_x}")
+    print(f"RMS precision in Y: {rms_y}")
+    print(f"RMS precision in Z: {rms_z}")
+    result = [rms_x, rms_y, rms_z]
     return result
 
-input_folder = r"Y:\ATD\Drone Data Processing\Metashape_Processing\East_Troublesome\072023 - 092022"
-results_dict = {}
+# worker processes re-import this file, so the script only runs as __main__
+if __name__ == "__main__":
+    input_folder = r"Y:\ATD\Drone Data Processing\Metashape_Processing\East_Troublesome\072023 - 092022"
 
-for file in os.listdir(input_folder):
-    if file.endswith("_pt_prec.txt"):
-        file_path = os.path.join(input_folder, file)
-        results_dict[file] = calc_precision_error(file_path)
-        
-#Rank the results from smallest to largest z precision
-sorted_results = sorted(results_dict.items(), key=lambda x: x[1][2])
-print("\nSorted results")
-print(sorted_results)
+    # Mean, RMS, median and p95 of every _pt_prec.txt/.npy file, files are read in parallel
+    # (the binary file is used when a project has both)
+    stats = folder_statistics(input_folder)
 
-#Write the results to a CSV file
-output_file = os.path.join(input_folder, "precision_results.csv")
-with open(output_file, "w") as fid:
-    fwriter = csv.writer(fid, delimiter=',', lineterminator='\n')
-    fwriter.writerow(["File", "X Precision", "Y Precision", "Z Precision"])
-    for key, value in sorted_results:
-        fwriter.writerow([key] + value)
\ No newline at end of file
+    #Rank the results from smallest to largest Z RMS precision and write them to a CSV file
+    output_file = os.path.join(input_folder, "precision_results.csv")
+    sorted_results = write_precision_results(stats, output_file)
+    print("\nSorted results")
+    print([(s['file'], [s['X rms'], s['Y rms'], s['Z rms']]) for s in sorted_results])
@@ -1,6 +1,9 @@
 import Metashape
-import csv
-import math
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from point_precision import export_chunk_precision, export_precision_parallel
 
 # For use with Metashape Pro v.1.5
 #
@@ -30,7 +33,7 @@ import math
 # Updates: Check http://tinyurl.com/sfmgeoref
 
 
-def export_point_precision(doc):
+def export_point_precision(doc, binary=False):
 	
 	chunk = doc.chunk
 
@@ -50,65 +53,53 @@ def export_point_precision(doc):
 			file_name = chunk_name.split('_')[0]
 			out_path = os.path.join(dir_name, ws_prefix + '_' + file_name + '_pt_prec.txt')
 			print(f"Saving precision estimates for {chunk_name} to {out_path}")
-			# Get transforms to account for real-world coordinate system (CRS)
-			# Note, this resets the region to the default
-			M = chunk.transform.matrix
-			region = chunk.region
-			T = chunk.crs.localframe(M.mulp(chunk.region.center)) * M
-			if chunk.transform.scale:
-				R = chunk.transform.scale * T.rotation()
-			else:
-				R = T.rotation()
-	
-			print(f"Exporting precision estimates for {chunk_name} to {out_path}")
-			# Open the output file and write the precision estimates to file
-			with open(out_path, "w") as fid:
-				# Open the output file
-				fwriter = csv.writer(fid, delimiter='\t', lineterminator='\n')
-				
-				# Write the header line
-				fwriter.writerow( [	'X(m)', 'Y(m)', 'Z(m)', 'sX(mm)', 'sY(mm)', 'sZ(mm)',
-									'covXX(m2)', 'covXY(m2)', 'covXZ(m2)', 'covYY(m2)', 'covYZ(m2)', 'covZZ(m2)'] )					
+			# Coordinates, precisions and covariances of all valid points are computed as arrays and
+			# written in blocks (see point_precision.py)
+			npoints = export_chunk_precision(chunk, out_path, points, binary=binary)
+			print(f"Exported {npoints} points for {chunk_name}")
+
+
+def precision_out_path(doc, chunk_name, binary=False):
+	ws_prefix = os.path.basename(doc.path).split('_')[0]
+	dir_name = os.path.dirname(doc.path)
+	file_name = chunk_name.split('_')[0]
+	return os.path.join(dir_name, ws_prefix + '_' + file_name + ('_pt_prec.npy' if binary else '_pt_prec.txt'))
 
-				# Iterate through all valid points, writing a line to the file for each point
-				for point in points:
-					if not point.valid:
-						continue
-					
-					# Transform the point coordinates into the output local coordinate system
-					if chunk.crs:
-						V = M * (point.coord)
-						V.size = 3
-						pt_coord = chunk.crs.project(V)
-					else:
-						V = M * (point.coord)
-						V.size = 3
-						pt_coord = V
 
-					# Transform the point covariance matrix into the output local coordinate system
-					pt_covars = R * point.cov * R.t()
+def precision_jobs(project_paths, binary=False):
+	"""
+	Open the projects one at a time and yield (project, chunk, out_path) for every PCFiltered chunk.
+	Each chunk is extracted before the next one is requested, so the projects are only open in turn.
+	"""
+	for ms_prj in project_paths:
+		doc = Metashape.Document()
+		doc.open(ms_prj)
+		for chunk in doc.chunks:
+			if chunk.label.endswith("PCFiltered") and chunk.tie_points:
+				yield ms_prj, chunk, precision_out_path(doc, chunk.label, binary)
+		# the export resets the region of the chunks
+		doc.save()
+
 
-					# Write the line of coordinates, precisions and covariances to the text file
-					fwriter.writerow( [ 
-						'{0:0.5f}'.format( pt_coord[0] ), '{0:0.5f}'.format( pt_coord[1] ), '{0:0.5f}'.format( pt_coord[2] ),
-						'{0:0.7f}'.format( math.sqrt(pt_covars[0, 0])*1000 ), '{0:0.7f}'.format( math.sqrt(pt_covars[1,1])*1000 ), '{0:0.7f}'.format( math.sqrt(pt_covars[2, 2] )*1000),
-						'{0:0.9f}'.format( pt_covars[0, 0] ), '{0:0.9f}'.format( pt_covars[0, 1] ), '{0:0.9f}'.format( pt_covars[0, 2] ),
-						'{0:0.9f}'.format( pt_covars[1, 1] ), '{0:0.9f}'.format( pt_covars[1, 2] ), '{0:0.9f}'.format( pt_covars[2, 2] ) ] )
+def export_point_precision_batch(project_paths, manifest_path=None, max_workers=None, binary=False):
+	"""
+	Export the precision of the PCFiltered chunks of several projects. Tie points are extracted here
+	and the projection, covariance rotation and writing run in worker processes.
+		args:
+			project_paths = list of .psx paths
+			manifest_path = str path of the manifest CSV [default = pt_prec_manifest.csv next to the first project]
+			max_workers = number of worker processes [default = cpu count]
+			binary = write _pt_prec.npy/.json instead of _pt_prec.txt
+		returns:
+			list of manifest rows (file, project, chunk, points, elapsed times)
+	"""
+	if manifest_path is None and project_paths:
+		manifest_path = os.path.join(os.path.dirname(project_paths[0]), 'pt_prec_manifest.csv')
+	return export_precision_parallel(precision_jobs(project_paths, binary), manifest_path, max_workers, binary)
 
-							
-				# Close the text file
-				fid.close()
 
 if __name__ == "__main__":
-	import os
 	metashape_project_folder = r"Y:\ATD\Drone Data Processing\Metashape_Processing\East_Troublesome\072023 - 092022" 
 	metashape_project_list = [file for file in os.listdir(metashape_project_folder) if file.endswith(".psx")]
 	metashape_project_list = [r"Y:\ATD\Drone Data Processing\Metashape_Processing\East_Troublesome\072023 - 092022\MM_072023-092022.psx"]
-	doc = Metashape.Document()
-	for ms_prj in metashape_project_list:
-		doc.open(os.path.join(metashape_project_folder, ms_prj))
-		doc = Metashape.app.document		
-		export_point_precision(doc)
-		doc.save()
-
- 
\ No newline at end of file
+	export_point_precision_batch([os.path.join(metashape_project_folder, ms_prj) for ms_prj in metashape_project_list])
@@ -1,37 +1,195 @@
-
+import os
+import sys
 import json
 import csv
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
-# Load the raw data from the file
-jfile = r"Z:\ATD\Metashape_Alignment_Tests\Only_Checking_Initial_Photos\Test\MM_102123 Flight 02.geotaglog"
-csv_fn = r"Z:\ATD\Metashape_Alignment_Tests\Only_Checking_Initial_Photos\Test\MM_102123 Flight 02.csv"
-with open(jfile, 'r') as file:
-    data = json.load(file)
-    images = data['images']  # Access the list of images
-
-# Open a new CSV file for writing the converted data
-with open(csv_fn, 'w', newline='') as csvfile:
-    fieldnames = ['image name', 'longitude [decimal degrees]', 'latitude [decimal degrees]', 'altitude [meter]',
-                  'yaw [degrees]', 'pitch [degrees]', 'roll [degrees]', 'accuracy horizontal [meter]',
-                  'accuracy vertical [meter]']
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    
-    # Write the header row
-    writer.writeheader()
-
-    # Iterate over each image in the list
-    for item in images:
-        geo_ref = item['geotaggedImage']['geoRef']
-        coordinate = geo_ref['coordinate']
-        writer.writerow({
-            'image name': item['imageName'],
-            'longitude [decimal degrees]': coordinate[1],
-            'latitude [decimal degrees]': coordinate[0],
-            'altitude [meter]': coordinate[2],
-            'yaw [degrees]': np.degrees(geo_ref['yaw']),
-            'pitch [degrees]': np.degrees(geo_ref['pitch']),
-            'roll [degrees]': np.degrees(geo_ref['roll']),
-            'accuracy horizontal [meter]': geo_ref['hAccuracy'],
-            'accuracy vertical [meter]': geo_ref['vAccuracy']
-        })
\ No newline at end of file
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Driver'))
+from Worker_Python import use_python_executable
+
+# Convert Wingtra .geotaglog files (JSON) to the geotag CSV files read by setup_psx.
+# The log is streamed: images are decoded one at a time from a bounded read buffer instead of
+# json.load on the whole file, and angles are converted to degrees in numpy batches.
+# All flights under a trip folder are converted in parallel, one process per flight.
+
+FIELDNAMES = ['image name', 'longitude [decimal degrees]', 'latitude [decimal degrees]', 'altitude [meter]',
+              'yaw [degrees]', 'pitch [degrees]', 'roll [degrees]', 'accuracy horizontal [meter]',
+              'accuracy vertical [meter]']
+
+
+def iter_geotaglog_images(jfile, read_size=1 << 20):
+    """
+    Yield the items of the "images" list of a .geotaglog one at a time
+        args:
+            jfile = str path of the .geotaglog
+            read_size = characters read from the file at a time
+    """
+    decoder = json.JSONDecoder()
+    with open(jfile, 'r') as file:
+        buf = ''
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = file.read(read_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        # find the start of the images list
+        while True:
+            key = buf.find('"images"', pos)
+            if key >= 0:
+                bracket = buf.find('[', key)
+                if bracket >= 0:
+                    pos = bracket + 1
+                    break
+            if eof:
+                return
+            if key >= 0:
+                # key found, its list starts in a later read
+                pos = key
+            else:
+                # keep the tail in case the key is split between reads
+                pos = max(0, len(buf) - 16)
+            fill()
+
+        while True:
+            # skip white space and separators
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                fill()
+            if pos >= len(buf) or buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # item continues in the next read
+                fill()
+                continue
+            pos = end
+            yield item
+
+
+def convert_geotaglog(jfile, csv_fn, batch_size=2000):
+    """
+    Write the geotag CSV of one .geotaglog
+        args:
+            jfile = str path of the .geotaglog
+            csv_fn = str path of the CSV to write
+            batch_size = images converted per numpy batch
+        returns:
+            number of images written
+    """
+    count = 0
+    with open(csv_fn, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        # Write the header row
+        writer.writerow(FIELDNAMES)
+
+        names, coords, angles, accuracy = [], [], [], []
+
+        def flush():
+            # yaw, pitch, roll of the whole batch in one call
+            degrees = np.degrees(np.array(angles, dtype=np.float64)).tolist()
+            writer.writerows([name, coord[1], coord[0], coord[2], ypr[0], ypr[1], ypr[2], acc[0], acc[1]]
+                             for name, coord, ypr, acc in zip(names, coords, degrees, accuracy))
+            names.clear()
+            coords.clear()
+            angles.clear()
+            accuracy.clear()
+
+        for item in iter_geotaglog_images(jfile):
+            geo_ref = item['geotaggedImage']['geoRef']
+            names.append(item['imageName'])
+            coords.append(geo_ref['coordinate'])
+            angles.append((geo_ref['yaw'], geo_ref['pitch'], geo_ref['roll']))
+            accuracy.append((geo_ref['hAccuracy'], geo_ref['vAccuracy']))
+            count += 1
+            if len(names) >= batch_size:
+                flush()
+        if names:
+            flush()
+    return count
+
+
+def geotag_csv_path(jfile):
+    """
+    Path of the CSV setup_psx expects for a .geotaglog: '<flight> geotags.csv' in the OUTPUT folder
+    of the flight folder containing the log (or next to the log when there is no OUTPUT folder)
+    """
+    folder = os.path.dirname(os.path.abspath(jfile))
+    if os.path.basename(folder) == 'OUTPUT':
+        folder = os.path.dirname(folder)
+    output_dir = os.path.join(folder, 'OUTPUT')
+    if os.path.isdir(output_dir):
+        return os.path.join(output_dir, os.path.basename(folder) + ' geotags.csv')
+    return os.path.join(os.path.dirname(os.path.abspath(jfile)),
+                        os.path.splitext(os.path.basename(jfile))[0] + ' geotags.csv')
+
+
+def find_geotaglogs(trip_folder):
+    logs = []
+    for root, dirs, files in os.walk(trip_folder):
+        logs += [os.path.join(root, f) for f in files if f.lower().endswith('.geotaglog')]
+    return sorted(logs)
+
+
+def _convert_worker(jfile):
+    csv_fn = geotag_csv_path(jfile)
+    try:
+        return jfile, csv_fn, convert_geotaglog(jfile, csv_fn), None
+    except (OSError, ValueError, KeyError) as e:
+        return jfile, csv_fn, 0, str(e)
+
+
+def convert_trip(trip_folder, max_workers=None):
+    """
+    Convert every .geotaglog under a trip folder, flights in parallel
+        args:
+            trip_folder = str trip folder (e.g. "070923 Trip")
+            max_workers = number of worker processes [default = cpu count]
+        returns:
+            list of (geotaglog, csv, number of images, error or None)
+    """
+    logs = find_geotaglogs(trip_folder)
+    if max_workers == 1 or len(logs) <= 1:
+        results = [_convert_worker(jfile) for jfile in logs]
+    else:
+        use_python_executable()
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_convert_worker, logs))
+    for jfile, csv_fn, count, error in results:
+        if error:
+            print(f"Failed to convert {jfile}: {error}")
+        else:
+            print(f"Wrote {count} images from {os.path.basename(jfile)} to {csv_fn}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert Wingtra .geotaglog files to geotag CSV files.')
+    parser.add_argument('paths', nargs='*', help='.geotaglog files or trip folders')
+    parser.add_argument('-workers', '--workers', dest='workers', type=int, default=None,
+                        help='Number of flights converted at the same time [default=cpu count]')
+    args = parser.parse_args()
+    paths = args.paths or [r"Z:\ATD\Metashape_Alignment_Tests\Only_Checking_Initial_Photos\Test\MM_102123 Flight 02.geotaglog"]
+    for path in paths:
+        if os.path.isdir(path):
+            convert_trip(path, args.workers)
+        else:
+            _, csv_fn, count, error = _convert_worker(path)
+            print(error if error else f"Wrote {count} images to {csv_fn}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from ypr_opk import ypr_to_opk, opk_to_ypr, ypr_to_mat, angle_difference
+
+# Check the vectorized conversion in ypr_opk.py against Metashape.Utils.
+# Run inside Metashape to compare directly and, with -write, to save the Metashape results as the
+# fixture file. Without Metashape the fixture file is used; its "source" entry says where the
+# reference values come from (the committed file holds exact hand-derived cases until it is
+# replaced by a capture from Metashape).
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ypr_opk_fixtures.json')
+
+
+def random_ypr(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # pitch and roll of survey cameras stay well away from the +-90 degree singularity
+    return np.column_stack([rng.uniform(0, 360, n), rng.uniform(-60, 60, n), rng.uniform(-60, 60, n)])
+
+
+def metashape_reference(ypr):
+    """ OPK, matrices and round trip YPR from Metashape.Utils, one camera at a time """
+    import Metashape
+    opk, mats, back = [], [], []
+    for row in ypr:
+        mat = Metashape.Utils.ypr2mat(Metashape.Vector(list(row)))
+        o = Metashape.Utils.mat2opk(mat)
+        opk.append(list(o))
+        mats.append([[mat[i, j] for j in range(3)] for i in range(3)])
+        back.append(list(Metashape.Utils.mat2ypr(Metashape.Utils.opk2mat(o))))
+    return {'source': 'Metashape.Utils, Metashape ' + Metashape.app.version,
+            'ypr': ypr.tolist(), 'opk': opk, 'mat': mats, 'ypr_back': back}
+
+
+def compare(fixture, tolerance=1e-6):
+    ypr = np.array(fixture['ypr'], dtype=np.float64)
+    opk = np.array(fixture['opk'], dtype=np.float64)
+    errors = {
+        'opk': np.abs(angle_difference(ypr_to_opk(ypr), opk)).max(),
+        'ypr_back': np.abs(angle_difference(opk_to_ypr(opk), np.array(fixture['ypr_back']))).max(),
+    }
+    if 'mat' in fixture:
+        errors['mat'] = np.abs(ypr_to_mat(ypr) - np.array(fixture['mat'])).max()
+    ok = True
+    for key, error in errors.items():
+        print(f"max |{key} difference| = {error:.3e}")
+        ok = ok and error <= tolerance
+    print('PASSED' if ok else 'FAILED')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate ypr_opk.py against Metashape.Utils.')
+    parser.add_argument('-n', type=int, default=1000, help='number of random orientations')
+    parser.add_argument('-write', action='store_true', help='save the Metashape results to ' + FIXTURE)
+    args = parser.parse_args()
+    try:
+        import Metashape
+        has_metashape = hasattr(Metashape.Utils, 'ypr2mat')
+    except ImportError:
+        has_metashape = False
+    if has_metashape:
+        fixture = metashape_reference(random_ypr(args.n))
+        if args.write:
+            with open(FIXTURE, 'w') as f:
+                json.dump(fixture, f)
+            print('Wrote ' + FIXTURE)
+    elif os.path.exists(FIXTURE):
+        with open(FIXTURE) as f:
+            fixture = json.load(f)
+        print('Reference: ' + fixture.get('source', FIXTURE))
+    else:
+        print('Metashape is not available and there is no fixture file, run this script in Metashape with -write first.')
+        sys.exit(1)
+    sys.exit(0 if compare(fixture) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import numpy as np
+
+# Vectorized yaw/pitch/roll <-> omega/phi/kappa conversion for whole missions.
+# Angles are in degrees and arrays are (N, 3); a single (3,) orientation is also accepted.
+# Conventions follow Metashape.Utils (ypr2mat, mat2ypr, opk2mat, mat2opk), with rotation matrices
+# from the camera frame (x right, y up, z back) to the local east/north/up frame:
+#   ypr: R = Rz(-yaw) * Rx(pitch) * Ry(roll)   yaw clockwise from north, pitch = roll = 0 is nadir
+#   opk: R = Rx(omega) * Ry(phi) * Rz(kappa)
+# validate_ypr_opk.py compares these functions with Metashape.Utils.
+
+
+def _angles(values):
+    a = np.radians(np.asarray(values, dtype=np.float64))
+    if a.shape[-1] != 3:
+        raise ValueError('Expected angles with shape (N, 3) or (3,), got ' + str(a.shape))
+    return a
+
+
+def _rx(a):
+    c, s = np.cos(a), np.sin(a)
+    m = np.zeros(a.shape + (3, 3))
+    m[..., 0, 0] = 1
+    m[..., 1, 1] = c
+    m[..., 1, 2] = -s
+    m[..., 2, 1] = s
+    m[..., 2, 2] = c
+    return m
+
+
+def _ry(a):
+    c, s = np.cos(a), np.sin(a)
+    m = np.zeros(a.shape + (3, 3))
+    m[..., 0, 0] = c
+    m[..., 0, 2] = s
+    m[..., 1, 1] = 1
+    m[..., 2, 0] = -s
+    m[..., 2, 2] = c
+    return m
+
+
+def _rz(a):
+    c, s = np.cos(a), np.sin(a)
+    m = np.zeros(a.shape + (3, 3))
+    m[..., 0, 0] = c
+    m[..., 0, 1] = -s
+    m[..., 1, 0] = s
+    m[..., 1, 1] = c
+    m[..., 2, 2] = 1
+    return m
+
+
+def ypr_to_mat(ypr):
+    """
+    Stacked rotation matrices from yaw, pitch, roll
+        args:
+            ypr = (N, 3) array of yaw, pitch, roll in degrees
+        returns:
+            (N, 3, 3) array of rotation matrices
+    """
+    a = _angles(ypr)
+    return _rz(-a[..., 0]) @ _rx(a[..., 1]) @ _ry(a[..., 2])
+
+
+def mat_to_ypr(mat):
+    """
+    Yaw (0-360), pitch, roll in degrees from (N, 3, 3) rotation matrices
+    """
+    m = np.asarray(mat, dtype=np.float64)
+    pitch = np.arcsin(np.clip(m[..., 2, 1], -1.0, 1.0))
+    roll = np.arctan2(-m[..., 2, 0], m[..., 2, 2])
+    yaw = np.arctan2(m[..., 0, 1], m[..., 1, 1])
+    ypr = np.degrees(np.stack([yaw, pitch, roll], axis=-1))
+    ypr[..., 0] %= 360.0
+    return ypr
+
+
+def opk_to_mat(opk):
+    """
+    Stacked rotation matrices from omega, phi, kappa
+        args:
+            opk = (N, 3) array of omega, phi, kappa in degrees
+        returns:
+            (N, 3, 3) array of rotation matrices
+    """
+    a = _angles(opk)
+    return _rx(a[..., 0]) @ _ry(a[..., 1]) @ _rz(a[..., 2])
+
+
+def mat_to_opk(mat):
+    """
+    Omega, phi, kappa in degrees from (N, 3, 3) rotation matrices
+    """
+    m = np.asarray(mat, dtype=np.float64)
+    phi = np.arcsin(np.clip(m[..., 0, 2], -1.0, 1.0))
+    omega = np.arctan2(-m[..., 1, 2], m[..., 2, 2])
+    kappa = np.arctan2(-m[..., 0, 1], m[..., 0, 0])
+    return np.degrees(np.stack([omega, phi, kappa], axis=-1))
+
+
+def ypr_to_opk(ypr):
+    """
+    Convert yaw, pitch, roll to omega, phi, kappa
+        args:
+            ypr = (N, 3) array (or (3,) for one camera) in degrees
+        returns:
+            opk = array of the same shape in degrees
+    """
+    return mat_to_opk(ypr_to_mat(ypr))
+
+
+def opk_to_ypr(opk):
+    """
+    Convert omega, phi, kappa to yaw, pitch, roll (inverse of ypr_to_opk)
+        args:
+            opk = (N, 3) array (or (3,) for one camera) in degrees
+        returns:
+            ypr = array of the same shape in degrees, yaw in 0-360
+    """
+    return mat_to_ypr(opk_to_mat(opk))
+
+
+def angle_difference(a, b):
+    """ Element-wise difference of angles in degrees, wrapped to -180..180 """
+    return (np.asarray(a) - np.asarray(b) + 180.0) % 360.0 - 180.0
+
+
+if __name__ == '__main__':
+    ypr = np.array([[72.66743443, -1.81625184, -3.60504727]])
+    opk = ypr_to_opk(ypr)
+    print("Yaw, Pitch, Roll (deg): ", ypr[0])
+    print("Omega, Phi, Kappa (deg): ", opk[0])
+    print("Back to Yaw, Pitch, Roll (deg): ", opk_to_ypr(opk)[0])
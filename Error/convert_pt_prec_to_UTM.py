@@ -1,8 +1,32 @@
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Driver'))
+from Worker_Python import use_python_executable
+from point_precision import read_precision, precision_files, write_precision_header
 
+# Transformers are expensive to create (PROJ database lookups), keep one per (src, dst) pair for the
+# life of the process. Each worker process of the batch conversion builds its own cache.
+_transformers = {}
+
+
+def get_transformer(src_crs, dst_crs):
+    """
+    Cached pyproj.Transformer (always_xy = True) from src_crs to dst_crs
+    """
+    key = (src_crs, dst_crs)
+    transformer = _transformers.get(key)
+    if transformer is None:
+        transformer = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+        _transformers[key] = transformer
+    return transformer
 
-import pandas as pd
-from pyproj import Transformer
 
 def convert_wgs84_to_nad83_utm13n(file_path, output_file):
     """
@@ -17,8 +41,8 @@ def convert_wgs84_to_nad83_utm13n(file_path, output_file):
     # Read the data from the text file
     df = pd.read_csv(file_path, sep='\t')
 
-    # Initialize the transformer from WGS84 to NAD83 UTM Zone 13N
-    transformer = Transformer.from_crs("EPSG:4326", "EPSG:26913", always_xy=True)
+    # Transformer from WGS84 to NAD83 UTM Zone 13N
+    transformer = get_transformer("EPSG:4326", "EPSG:26913")
 
     # Extract longitude and latitude from the DataFrame
     longitudes = df['X(m)'].values
@@ -38,6 +62,107 @@ def convert_wgs84_to_nad83_utm13n(file_path, output_file):
     return df
 
 
+def convert_pt_prec_file(file_path, output_file, src_crs="EPSG:4326", dst_crs="EPSG:26913", chunksize=1000000):
+    """
+    Reproject X(m), Y(m) of a point precision file in chunks of rows, memory use does not grow with
+    the file size. Output has the same columns as convert_wgs84_to_nad83_utm13n.
+    Binary (.npy) input is memory-mapped and written as a binary file with the same layout.
+
+    Parameters:
+        file_path (str): The path to the input _pt_prec.txt or _pt_prec.npy file.
+        output_file (str): The path of the output file.
+        src_crs, dst_crs (str): CRS of the input coordinates and of Easting(m), Northing(m).
+        chunksize (int): Rows read and transformed at a time.
+
+    Returns:
+        int: Number of points written.
+    """
+    if file_path.endswith('.npy'):
+        return convert_pt_prec_binary(file_path, output_file, src_crs, dst_crs, chunksize)
+    transformer = get_transformer(src_crs, dst_crs)
+    npoints = 0
+    # write to a temporary file so an interrupted run never leaves a truncated output behind
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w', newline='') as out:
+        for i, df in enumerate(pd.read_csv(file_path, sep='\t', chunksize=chunksize)):
+            eastings, northings = transformer.transform(df['X(m)'].values, df['Y(m)'].values)
+            df['Easting(m)'] = eastings
+            df['Northing(m)'] = northings
+            df.to_csv(out, sep='\t', index=False, header=(i == 0))
+            npoints += len(df)
+    os.replace(tmp_file, output_file)
+    return npoints
+
+
+def convert_pt_prec_binary(file_path, output_file, src_crs="EPSG:4326", dst_crs="EPSG:26913", chunksize=1000000):
+    """
+    Binary version of convert_pt_prec_file: the input columns are memory-mapped and the output
+    (input columns + Easting(m), Northing(m)) is written through a memory-mapped .npy file.
+
+    Returns:
+        int: Number of points written.
+    """
+    transformer = get_transformer(src_crs, dst_crs)
+    columns, header = read_precision(file_path)
+    names = header['columns'] + ['Easting(m)', 'Northing(m)']
+    npoints = header['points']
+    tmp_file = output_file + '.tmp'
+    out = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.float64, shape=(len(names), npoints))
+    for start in range(0, npoints, chunksize):
+        stop = min(start + chunksize, npoints)
+        for i, name in enumerate(header['columns']):
+            out[i, start:stop] = columns[name][start:stop]
+        eastings, northings = transformer.transform(columns['X(m)'][start:stop], columns['Y(m)'][start:stop])
+        out[-2, start:stop] = eastings
+        out[-1, start:stop] = northings
+    out.flush()
+    del out
+    os.replace(tmp_file, output_file)
+    write_precision_header(output_file, names, npoints, header.get('crs'),
+                           {'source': os.path.basename(file_path), 'easting_northing_crs': dst_crs})
+    return npoints
+
+
+def _convert_worker(args):
+    file_path, output_file, src_crs, dst_crs, chunksize = args
+    try:
+        return file_path, output_file, convert_pt_prec_file(file_path, output_file, src_crs, dst_crs, chunksize), None
+    except (OSError, ValueError, KeyError) as e:
+        return file_path, output_file, 0, str(e)
+
+
+def output_name(file_path, suffix='_nad83_utm13n'):
+    root, ext = os.path.splitext(file_path)
+    return root + suffix + ext
+
+
+def convert_pt_prec_files(file_paths, src_crs="EPSG:4326", dst_crs="EPSG:26913", suffix='_nad83_utm13n',
+                          chunksize=1000000, max_workers=None):
+    """
+    Reproject several point precision files, one file per worker process.
+
+    Parameters:
+        file_paths (list): Input _pt_prec.txt or _pt_prec.npy files, outputs are written next to them with suffix.
+        max_workers (int): Number of worker processes [default = cpu count].
+
+    Returns:
+        list: (input file, output file, number of points, error or None) per file.
+    """
+    jobs = [(f, output_name(f, suffix), src_crs, dst_crs, chunksize) for f in file_paths]
+    if max_workers == 1 or len(jobs) <= 1:
+        results = [_convert_worker(job) for job in jobs]
+    else:
+        use_python_executable()
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_convert_worker, jobs))
+    for file_path, output_file, npoints, error in results:
+        if error:
+            print(f"Failed to convert {file_path}: {error}")
+        else:
+            print(f"Converted {npoints} points from {file_path} to {output_file}")
+    return results
+
+
 def progress_callback(progress):
     if progress == -1:
         print("An error occurred during processing.")
@@ -46,9 +171,20 @@ def progress_callback(progress):
 
 
 if __name__ == '__main__':
-    filename = r"Y:\ATD\Drone Data Processing\Metashape_Processing\East_Troublesome\072023 - 092022\LM2_072023_pt_prec.txt"  # Replace with your actual file path
-    output_file = r"Y:\ATD\Drone Data Processing\Metashape_Processing\East_Troublesome\072023 - 092022\LM2_072023_pt_prec_nad83_utm13n.txt"
-    #convert_wgs84_to_nad83_utm13n(filename, output_file)
-    
-    
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Reproject X(m), Y(m) of point precision files.')
+    parser.add_argument('files', nargs='*', help='_pt_prec.txt/.npy files or folders containing them')
+    parser.add_argument('-src', default="EPSG:4326", help='CRS of the input coordinates [default=EPSG:4326]')
+    parser.add_argument('-dst', default="EPSG:26913", help='Output CRS [default=EPSG:26913]')
+    parser.add_argument('-suffix', default='_nad83_utm13n', help='Suffix of the output files')
+    parser.add_argument('-chunksize', type=int, default=1000000, help='Rows processed at a time')
+    parser.add_argument('-workers', type=int, default=None, help='Number of worker processes')
+    args = parser.parse_args()
+
+    files = []
+    for path in args.files:
+        if os.path.isdir(path):
+            files += precision_files(path)
+        else:
+            files.append(path)
+    if files:
+        convert_pt_prec_files(files, args.src, args.dst, args.suffix, args.chunksize, args.workers)
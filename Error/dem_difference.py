@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import argparse
+from statistics import NormalDist
+import numpy as np
+
+try:
+    import rasterio
+    from rasterio.windows import Window
+    from rasterio.vrt import WarpedVRT
+    from rasterio.enums import Resampling
+except ImportError:
+    rasterio = None
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from precision_raster import NODATA
+
+# Precision-weighted DEM of difference (James et al., 2017; Lane et al., 2003).
+# dz = new DEM - old DEM, and the level of detection is LoD = t * sqrt(sZ_new^2 + sZ_old^2 + reg^2),
+# with t the two-sided normal quantile of the confidence level. sZ comes from the precision rasters of
+# precision_raster.py (band 1, metres) or a constant. Changes with |dz| < LoD are set to 0 in the
+# thresholded band, and erosion/deposition volumes are summed from it.
+# All rasters are read in windows on the grid of the new DEM (other grids are warped on the fly), so
+# DEMs larger than memory are processed one tile at a time. Requires rasterio.
+
+TILE_SIZE = 1024
+
+
+def _require_rasterio():
+    if rasterio is None:
+        raise ImportError("dem_difference needs rasterio to read and write GeoTIFFs (pip install rasterio)")
+
+
+def t_value(confidence):
+    """ Two-sided normal quantile, 1.96 for 0.95 """
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _aligned(src, ref, resampling):
+    """ src on the grid of ref, src itself when the grids already match """
+    if src.crs == ref.crs and src.transform == ref.transform and src.shape == ref.shape:
+        return src
+    return WarpedVRT(src, crs=ref.crs, transform=ref.transform, width=ref.width, height=ref.height,
+                     resampling=resampling, src_nodata=src.nodata, nodata=src.nodata)
+
+
+def _read(dataset, window):
+    """ Band 1 of a window as float64 with nodata as NaN """
+    values = dataset.read(1, window=window, masked=True)
+    return np.ma.filled(values.astype(np.float64), np.nan)
+
+
+def _precision(source, window, shape):
+    if source is None:
+        return np.zeros(shape)
+    if isinstance(source, (int, float)):
+        return np.full(shape, float(source))
+    return _read(source, window)
+
+
+def dem_of_difference(new_dem, old_dem, out_path, new_precision=None, old_precision=None, confidence=0.95,
+                      registration_error=0.0, tile_size=TILE_SIZE):
+    """
+    Precision-weighted DEM of difference with level of detection thresholding, tile by tile
+        args:
+            new_dem, old_dem = str paths of the DEM GeoTIFFs, the output is on the grid of new_dem
+            out_path = str path of the output GeoTIFF (bands: dz, LoD, thresholded dz)
+            new_precision, old_precision = str paths of sZ rasters (metres) or constant sZ (metres),
+                pixels without a precision value (no tie points in the cell) are left out
+            confidence = confidence level of the LoD
+            registration_error = additional vertical error (m) of the DEM registration
+            tile_size = pixels per tile side
+        returns:
+            summary = dict of areas (m2) and volumes (m3) of erosion and deposition, raw and thresholded
+    """
+    _require_rasterio()
+    t = t_value(confidence)
+    opened = []
+
+    def open_raster(path, ref, resampling):
+        if not isinstance(path, str):
+            return path
+        src = rasterio.open(path)
+        aligned = _aligned(src, ref, resampling)
+        # close the warped view before its source
+        opened.extend([aligned, src] if aligned is not src else [src])
+        return aligned
+
+    summary = {'confidence': confidence, 't': t, 'registration_error': registration_error,
+               'pixels': 0, 'significant_pixels': 0,
+               'erosion_volume': 0.0, 'deposition_volume': 0.0,
+               'erosion_volume_raw': 0.0, 'deposition_volume_raw': 0.0,
+               'erosion_area': 0.0, 'deposition_area': 0.0}
+    try:
+        ref = rasterio.open(new_dem)
+        opened.append(ref)
+        old = open_raster(old_dem, ref, Resampling.bilinear)
+        prec_new = open_raster(new_precision, ref, Resampling.nearest)
+        prec_old = open_raster(old_precision, ref, Resampling.nearest)
+        pixel_area = abs(ref.transform.a * ref.transform.e)
+
+        profile = {'driver': 'GTiff', 'width': ref.width, 'height': ref.height, 'count': 3, 'dtype': 'float32',
+                   'crs': ref.crs, 'transform': ref.transform, 'nodata': NODATA, 'tiled': True,
+                   'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate', 'BIGTIFF': 'IF_SAFER'}
+        with rasterio.open(out_path, 'w', **profile) as dst:
+            for row_off in range(0, ref.height, tile_size):
+                for col_off in range(0, ref.width, tile_size):
+                    window = Window(col_off, row_off, min(tile_size, ref.width - col_off),
+                                    min(tile_size, ref.height - row_off))
+                    shape = (int(window.height), int(window.width))
+                    dz = _read(ref, window) - _read(old, window)
+                    sigma2 = (np.square(_precision(prec_new, window, shape))
+                              + np.square(_precision(prec_old, window, shape)) + registration_error ** 2)
+                    lod = t * np.sqrt(sigma2)
+                    valid = ~np.isnan(dz) & ~np.isnan(lod)
+                    significant = valid & (np.abs(dz) >= lod)
+                    dz_lod = np.where(significant, dz, 0.0)
+
+                    summary['pixels'] += int(valid.sum())
+                    summary['significant_pixels'] += int(significant.sum())
+                    summary['erosion_volume'] += float(dz_lod[dz_lod < 0].sum()) * pixel_area
+                    summary['deposition_volume'] += float(dz_lod[dz_lod > 0].sum()) * pixel_area
+                    raw = dz[valid]
+                    summary['erosion_volume_raw'] += float(raw[raw < 0].sum()) * pixel_area
+                    summary['deposition_volume_raw'] += float(raw[raw > 0].sum()) * pixel_area
+                    summary['erosion_area'] += int((dz_lod < 0).sum()) * pixel_area
+                    summary['deposition_area'] += int((dz_lod > 0).sum()) * pixel_area
+
+                    for band, values in enumerate([dz, lod, dz_lod], start=1):
+                        dst.write(np.where(valid, values, NODATA).astype(np.float32), band, window=window)
+            dst.set_band_description(1, 'dz (m)')
+            dst.set_band_description(2, f'LoD {confidence:g} (m)')
+            dst.set_band_description(3, 'dz thresholded (m)')
+    finally:
+        for src in opened:
+            src.close()
+
+    summary['net_volume'] = summary['erosion_volume'] + summary['deposition_volume']
+    summary['net_volume_raw'] = summary['erosion_volume_raw'] + summary['deposition_volume_raw']
+    return summary
+
+
+def _precision_arg(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precision-weighted DEM of difference with LoD thresholding.')
+    parser.add_argument('new_dem', help='Later DEM GeoTIFF, defines the output grid')
+    parser.add_argument('old_dem', help='Earlier DEM GeoTIFF')
+    parser.add_argument('-o', '--output', dest='output', default=None, help='Output GeoTIFF [default=<new_dem>_DoD.tif]')
+    parser.add_argument('-new_prec', default=None, help='sZ raster (m) of the later DEM, or a constant sZ in metres')
+    parser.add_argument('-old_prec', default=None, help='sZ raster (m) of the earlier DEM, or a constant sZ in metres')
+    parser.add_argument('-confidence', type=float, default=0.95, help='Confidence level of the LoD [default=0.95]')
+    parser.add_argument('-reg', type=float, default=0.0, help='Registration error (m) added to the LoD')
+    parser.add_argument('-tile', type=int, default=TILE_SIZE, help='Tile size in pixels')
+    args = parser.parse_args()
+
+    out_path = args.output or os.path.splitext(args.new_dem)[0] + '_DoD.tif'
+    summary = dem_of_difference(args.new_dem, args.old_dem, out_path, _precision_arg(args.new_prec),
+                                _precision_arg(args.old_prec), args.confidence, args.reg, args.tile)
+    with open(os.path.splitext(out_path)[0] + '_volumes.json', 'w') as f:
+        json.dump(summary, f, indent=1)
+    print(f"Wrote {out_path}")
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import numpy as np
+
+# Small array geometry helpers shared by the precision index and the camera selection scripts.
+
+
+def points_in_polygon(x, y, polygon):
+    """
+    Even-odd rule point in polygon test of arrays of points
+        args:
+            x, y = (n,) arrays
+            polygon = (m, 2) array of vertices (closed or not)
+        returns:
+            (n,) bool array
+    """
+    poly = np.asarray(polygon, dtype=np.float64)
+    inside = np.zeros(len(x), dtype=bool)
+    xj, yj = poly[-1]
+    for xi, yi in poly:
+        crosses = (yi > y) != (yj > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = (xj - xi) * (y - yi) / (yj - yi) + xi
+        inside ^= crosses & (x < x_cross)
+        xj, yj = xi, yi
+    return inside
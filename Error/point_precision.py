@@ -0,0 +1,448 @@
+import os
+import sys
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+
+try:
+    from pyproj import CRS, Transformer
+    from pyproj.exceptions import CRSError
+except ImportError:
+    # optional, EPSG coordinate systems are then projected point by point by Metashape
+    Transformer = None
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Driver'))
+from Worker_Python import use_python_executable
+
+# Vectorized point coordinate precision export (James et al.), shared by the
+# Export_Point_Coordinate_Precision scripts.
+# Valid tie point coordinates and covariances are gathered once into (N, 4) and (N, 3, 3) arrays.
+# The chunk transform, covariance rotation (one einsum) and CRS projection are applied to the whole
+# array, and the text is formatted in blocks with one format string per row.
+# The output matches the original per point export to the printed precision.
+#
+# Binary output: <name>_pt_prec.npy holds a (columns, N) float64 array, so every column is contiguous
+# and can be memory-mapped, next to <name>_pt_prec.json with the column names, units and CRS.
+# read_precision() reads either format.
+#
+# Batch export: export_precision_parallel() extracts the arrays of each chunk in the Metashape process
+# and hands the covariance rotation, projection and writing to a process pool, so the next chunk is
+# extracted while the previous ones are written. A manifest CSV lists every file written.
+
+HEADER = ['X(m)', 'Y(m)', 'Z(m)', 'sX(mm)', 'sY(mm)', 'sZ(mm)',
+          'covXX(m2)', 'covXY(m2)', 'covXZ(m2)', 'covYY(m2)', 'covYZ(m2)', 'covZZ(m2)']
+ROW_FORMAT = '\t'.join(['%.5f'] * 3 + ['%.7f'] * 3 + ['%.9f'] * 6)
+TEXT_SUFFIX = '_pt_prec.txt'
+BINARY_SUFFIX = '_pt_prec.npy'
+FORMAT_VERSION = 1
+
+# geographic WGS 84, geocentric coordinates are converted with numpy instead of crs.project
+WGS84_GEOGRAPHIC = ('EPSG::4326',)
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+# EPSG coordinate systems are projected in one pyproj call, checked against crs.project on a few points
+# (pyproj may pick a different datum transformation than Metashape)
+CHECK_POINTS = 8
+CHECK_TOLERANCE = 1e-6          # m, and height of geographic systems
+CHECK_TOLERANCE_DEGREES = 1e-10
+
+
+def _matrix(m, n):
+    return np.array([[m[i, j] for j in range(n)] for i in range(n)], dtype=np.float64)
+
+
+def chunk_transform(chunk):
+    """
+    Transforms of the chunk to the real-world coordinate system
+    Note, this resets the region to the default (as in the original script)
+        returns:
+            M = (4, 4) array, internal to geocentric coordinates
+            R = (3, 3) array, rotation (and scale) of covariances into the local frame of the CRS
+    """
+    M = chunk.transform.matrix
+    T = chunk.crs.localframe(M.mulp(chunk.region.center)) * M
+    if chunk.transform.scale:
+        R = chunk.transform.scale * T.rotation()
+    else:
+        R = T.rotation()
+    return _matrix(M, 4), _matrix(R, 3)
+
+
+def gather_valid_points(points):
+    """
+    Coordinates and covariances of all valid tie points
+        args:
+            points = chunk.tie_points.points
+        returns:
+            coords = (N, 4) array of homogeneous internal coordinates
+            covs = (N, 3, 3) array of internal covariance matrices
+    """
+    coords = []
+    covs = []
+    for point in points:
+        if not point.valid:
+            continue
+        c = point.coord
+        v = point.cov
+        coords.append((c[0], c[1], c[2], c[3]))
+        covs.append((v[0, 0], v[0, 1], v[0, 2], v[1, 0], v[1, 1], v[1, 2], v[2, 0], v[2, 1], v[2, 2]))
+    coords = np.array(coords, dtype=np.float64).reshape(-1, 4)
+    covs = np.array(covs, dtype=np.float64).reshape(-1, 3, 3)
+    return coords, covs
+
+
+def geocentric_to_geographic(V, a=WGS84_A, f=WGS84_F):
+    """
+    (N, 3) geocentric coordinates to longitude, latitude (degrees) and ellipsoidal height (m)
+    """
+    x, y, z = V[:, 0], V[:, 1], V[:, 2]
+    e2 = f * (2 - f)
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p * (1 - e2))
+    for _ in range(5):
+        sin_lat = np.sin(lat)
+        N = a / np.sqrt(1 - e2 * sin_lat * sin_lat)
+        h = p / np.cos(lat) - N
+        lat = np.arctan2(z, p * (1 - e2 * N / (N + h)))
+    sin_lat = np.sin(lat)
+    N = a / np.sqrt(1 - e2 * sin_lat * sin_lat)
+    # height from the form that stays accurate near the poles
+    h = p * np.cos(lat) + z * sin_lat - a * a / N
+    return np.column_stack([np.degrees(np.arctan2(y, x)), np.degrees(lat), h])
+
+
+def epsg_transformer(crs, height=True):
+    """
+    pyproj transformer from WGS 84 geocentric coordinates to the EPSG coordinate system of crs
+        args:
+            crs = Metashape.CoordinateSystem
+            height = the height is used, compound systems (geoid heights) are then left to Metashape
+        returns:
+            pyproj.Transformer (always_xy), None when Metashape has to project
+    """
+    authority = getattr(crs, 'authority', None) or ''
+    if Transformer is None or not authority.startswith('EPSG::') or authority in WGS84_GEOGRAPHIC:
+        return None
+    try:
+        target = CRS.from_user_input(authority.replace('::', ':'))
+        if height:
+            if target.is_compound or target.is_vertical:
+                return None
+            # ellipsoidal height, as crs.project returns for horizontal systems
+            target = target.to_3d()
+        return Transformer.from_crs('EPSG:4978', target, always_xy=True)
+    except CRSError:
+        return None
+
+
+def _project_each(crs, V):
+    import Metashape
+    return np.array([tuple(crs.project(Metashape.Vector(v))) for v in V.tolist()], dtype=np.float64).reshape(-1, 3)
+
+
+def project_points(crs, V):
+    """
+    Project (N, 3) geocentric coordinates into crs
+        args:
+            crs = Metashape.CoordinateSystem (or None to keep V)
+            V = (N, 3) array
+        returns:
+            (N, 3) array of projected coordinates
+    """
+    if not crs:
+        return V
+    if getattr(crs, 'authority', None) in WGS84_GEOGRAPHIC:
+        return geocentric_to_geographic(V)
+    transformer = epsg_transformer(crs)
+    if transformer is not None:
+        projected = np.column_stack(transformer.transform(V[:, 0], V[:, 1], V[:, 2]))
+        sample = np.unique(np.linspace(0, len(V) - 1, min(CHECK_POINTS, len(V))).astype(np.int64))
+        expected = _project_each(crs, V[sample])
+        xy_tolerance = CHECK_TOLERANCE_DEGREES if transformer.target_crs.is_geographic else CHECK_TOLERANCE
+        if (np.abs(projected[sample, :2] - expected[:, :2]).max(initial=0) <= xy_tolerance
+                and np.abs(projected[sample, 2] - expected[:, 2]).max(initial=0) <= CHECK_TOLERANCE):
+            return projected
+        print("pyproj does not match Metashape in " + str(crs.name) + ", projecting point by point")
+    # other coordinate systems (geoids, local systems) go through Metashape point by point
+    return _project_each(crs, V)
+
+
+def chunk_arrays(chunk, points=None):
+    """
+    Everything precision_table needs from Metashape, as numpy arrays (can be sent to another process)
+        returns:
+            dict with M, R, coords, covs and either V_projected (projected in this process) or geographic
+    """
+    if points is None:
+        points = chunk.tie_points.points
+    M, R = chunk_transform(chunk)
+    coords, covs = gather_valid_points(points)
+    arrays = {'M': M, 'R': R, 'coords': coords, 'covs': covs, 'geographic': False, 'V_projected': None}
+    crs = chunk.crs
+    if crs and getattr(crs, 'authority', None) in WGS84_GEOGRAPHIC:
+        arrays['geographic'] = True
+    elif crs:
+        # other coordinate systems need crs.project, which is only available here
+        arrays['V_projected'] = project_points(crs, (coords @ M.T)[:, :3])
+    return arrays
+
+
+def table_from_arrays(arrays):
+    """
+    Coordinates, precisions and covariances from the arrays of chunk_arrays
+        returns:
+            (N, 12) array with the columns of HEADER
+    """
+    M, R, coords, covs = arrays['M'], arrays['R'], arrays['coords'], arrays['covs']
+
+    # Transform the point coordinates into the output local coordinate system
+    if arrays['V_projected'] is not None:
+        pt_coord = arrays['V_projected']
+    else:
+        V = (coords @ M.T)[:, :3]
+        pt_coord = geocentric_to_geographic(V) if arrays['geographic'] else V
+
+    # Transform the point covariance matrices into the output local coordinate system, R * cov * R.t()
+    pt_covars = np.einsum('ij,njk,lk->nil', R, covs, R)
+
+    table = np.empty((len(coords), 12), dtype=np.float64)
+    table[:, 0:3] = pt_coord
+    table[:, 3] = np.sqrt(pt_covars[:, 0, 0]) * 1000
+    table[:, 4] = np.sqrt(pt_covars[:, 1, 1]) * 1000
+    table[:, 5] = np.sqrt(pt_covars[:, 2, 2]) * 1000
+    table[:, 6] = pt_covars[:, 0, 0]
+    table[:, 7] = pt_covars[:, 0, 1]
+    table[:, 8] = pt_covars[:, 0, 2]
+    table[:, 9] = pt_covars[:, 1, 1]
+    table[:, 10] = pt_covars[:, 1, 2]
+    table[:, 11] = pt_covars[:, 2, 2]
+    return table
+
+
+def precision_table(chunk, points=None):
+    """
+    Coordinates, precisions and covariances of all valid tie points of a chunk
+        returns:
+            (N, 12) array with the columns of HEADER
+    """
+    return table_from_arrays(chunk_arrays(chunk, points))
+
+
+def write_precision_table(out_path, table, block_size=100000):
+    """
+    Write a precision table as the tab separated _pt_prec.txt text file
+    """
+    with open(out_path, "w") as fid:
+        fid.write('\t'.join(HEADER) + '\n')
+        for start in range(0, len(table), block_size):
+            rows = table[start:start + block_size].tolist()
+            fid.write('\n'.join([ROW_FORMAT % tuple(row) for row in rows]))
+            fid.write('\n')
+
+
+def binary_path(path):
+    """ <name>_pt_prec.npy for <name>_pt_prec.txt (or any other path) """
+    return os.path.splitext(path)[0] + '.npy'
+
+
+def header_path(path):
+    """ JSON header of a binary precision file """
+    return os.path.splitext(path)[0] + '.json'
+
+
+def _unit(column):
+    return column[column.index('(') + 1:column.index(')')] if '(' in column else ''
+
+
+def write_precision_header(npy_path, columns, points, crs=None, extra=None):
+    """
+    Write the JSON header of a binary precision file
+        args:
+            npy_path = str path of the .npy file
+            columns = column names in the order of the array rows
+            points = number of points
+            crs = str WKT (or name) of the coordinate system of X, Y, Z
+            extra = dict of additional header entries
+    """
+    columns = list(columns)
+    header = {
+        'format': 'pt_prec',
+        'version': FORMAT_VERSION,
+        'layout': 'columns',
+        'points': int(points),
+        'columns': columns,
+        'units': {column: _unit(column) for column in columns},
+        'crs': crs,
+    }
+    if extra:
+        header.update(extra)
+    with open(header_path(npy_path), 'w') as f:
+        json.dump(header, f, indent=1)
+    return header
+
+
+def write_precision_binary(out_path, table, columns=None, crs=None, extra=None):
+    """
+    Write a precision table as <name>.npy (columns x N float64) and <name>.json
+        args:
+            out_path = str path, the extension is replaced by .npy
+            table = (N, ncolumns) array
+            columns = column names [default = HEADER]
+            crs, extra = see write_precision_header
+        returns:
+            path of the .npy file
+    """
+    npy_path = binary_path(out_path)
+    np.save(npy_path, np.ascontiguousarray(np.asarray(table, dtype=np.float64).T))
+    write_precision_header(npy_path, columns or HEADER, len(table), crs, extra)
+    return npy_path
+
+
+def read_precision_header(path):
+    """
+    Header of a precision file
+        returns:
+            dict with columns, points (None for text files until read) and crs
+    """
+    if path.endswith('.npy') or path.endswith('.json'):
+        with open(header_path(path)) as f:
+            return json.load(f)
+    with open(path) as f:
+        columns = f.readline().rstrip('\r\n').split('\t')
+    return {'format': 'pt_prec', 'layout': 'rows', 'points': None, 'columns': columns,
+            'units': {column: _unit(column) for column in columns}, 'crs': None}
+
+
+def read_precision(path, mmap=True):
+    """
+    Read a text or binary precision file
+        args:
+            path = str _pt_prec.txt, _pt_prec.npy or its .json header
+            mmap = memory-map binary files instead of reading them
+        returns:
+            columns = dict of {column name: 1D float64 array} (views of the memory-mapped file)
+            header = dict from read_precision_header
+    """
+    header = read_precision_header(path)
+    if path.endswith('.npy') or path.endswith('.json'):
+        data = np.load(binary_path(path), mmap_mode='r' if mmap else None)
+    else:
+        data = np.loadtxt(path, delimiter='\t', skiprows=1, dtype=np.float64, ndmin=2).T
+        header['points'] = data.shape[1]
+    return {column: data[i] for i, column in enumerate(header['columns'])}, header
+
+
+def precision_files(folder):
+    """
+    Precision files in a folder, the binary file is used when both formats exist for a name
+        returns:
+            sorted list of paths
+    """
+    names = os.listdir(folder)
+    binary = {name[:-len(BINARY_SUFFIX)] for name in names if name.endswith(BINARY_SUFFIX)}
+    files = [name for name in names if name.endswith(BINARY_SUFFIX)]
+    files += [name for name in names if name.endswith(TEXT_SUFFIX) and name[:-len(TEXT_SUFFIX)] not in binary]
+    return [os.path.join(folder, name) for name in sorted(files)]
+
+
+def export_chunk_precision(chunk, out_path, points=None, binary=False):
+    """
+    Export the point coordinate precision of one chunk
+        args:
+            chunk = Metashape.Chunk with tie points
+            out_path = str path of the _pt_prec.txt file
+            binary = write <name>_pt_prec.npy and .json instead of the text file
+        returns:
+            number of points written
+    """
+    table = precision_table(chunk, points)
+    if binary:
+        crs = getattr(chunk.crs, 'wkt', None) if chunk.crs else None
+        write_precision_binary(out_path, table, crs=crs, extra={'chunk': chunk.label})
+    else:
+        write_precision_table(out_path, table)
+    return len(table)
+
+
+MANIFEST_FIELDS = ['file', 'project', 'chunk', 'points', 'extract_s', 'write_s', 'total_s', 'error']
+
+
+def _export_arrays(job):
+    """ Worker of export_precision_parallel: compute and write one table """
+    out_path, arrays, binary, crs, label = job
+    start = time.perf_counter()
+    try:
+        table = table_from_arrays(arrays)
+        if binary:
+            out_path = write_precision_binary(out_path, table, crs=crs, extra={'chunk': label})
+        else:
+            write_precision_table(out_path, table)
+        return out_path, len(table), time.perf_counter() - start, None
+    except (OSError, ValueError) as e:
+        return out_path, 0, time.perf_counter() - start, str(e)
+
+
+def export_precision_parallel(jobs, manifest_path=None, max_workers=None, binary=False):
+    """
+    Export the precision of many chunks, writing in worker processes while the next chunk is extracted
+        args:
+            jobs = iterable of (project, chunk, out_path), consumed lazily so projects can be opened
+                   one at a time by a generator
+            manifest_path = str path of the manifest CSV (None = no manifest)
+            max_workers = number of worker processes [default = cpu count], 1 = no pool
+            binary = write .npy/.json instead of text files
+        returns:
+            list of manifest rows (dicts with MANIFEST_FIELDS)
+    """
+    rows = []
+    pending = {}
+    workers = max_workers or os.cpu_count() or 1
+    pool = None
+    if workers > 1:
+        use_python_executable()
+        pool = ProcessPoolExecutor(max_workers=workers)
+    # at most two chunks per worker are held in memory waiting to be written
+    max_pending = 2 * workers
+
+    def finish(row, result):
+        out_path, npoints, write_s, error = result
+        row.update(file=out_path, points=npoints, write_s=round(write_s, 3),
+                   total_s=round(row['extract_s'] + write_s, 3), error=error or '')
+        if error:
+            print(f"Failed to export {row['chunk']}: {error}")
+        else:
+            print(f"Exported {npoints} points for {row['chunk']} to {out_path}")
+        rows.append(row)
+
+    def collect(futures):
+        for future in futures:
+            finish(pending.pop(future), future.result())
+
+    try:
+        for project, chunk, out_path in jobs:
+            start = time.perf_counter()
+            arrays = chunk_arrays(chunk)
+            crs = getattr(chunk.crs, 'wkt', None) if chunk.crs else None
+            row = {'project': project, 'chunk': chunk.label, 'extract_s': round(time.perf_counter() - start, 3)}
+            job = (out_path, arrays, binary, crs, chunk.label)
+            if pool is None:
+                finish(row, _export_arrays(job))
+                continue
+            pending[pool.submit(_export_arrays, job)] = row
+            if len(pending) >= max_pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(list(pending))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if manifest_path:
+        with open(manifest_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote manifest of {len(rows)} files to {manifest_path}")
+    return rows
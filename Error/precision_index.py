@@ -0,0 +1,195 @@
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from precision_stats import iter_precision_blocks
+from precision_raster import xy_columns
+from geometry import points_in_polygon
+
+# Spatial grid index over the points of a _pt_prec file, for precision around a location.
+# Points are sorted by grid cell once and saved next to the file as <name>_pt_prec_index.npz
+# (cell size chosen for ~32 points per cell, cell offsets, sorted X/Y and sX/sY/sZ). Radius, k nearest
+# neighbour and polygon queries only touch the cells they overlap. The index stores the size and
+# modification time of its precision file and is rebuilt when they change.
+
+INDEX_SUFFIX = '_index.npz'
+POINTS_PER_CELL = 32
+MAX_CELLS = 1 << 22
+AXES = ['sX(mm)', 'sY(mm)', 'sZ(mm)']
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + INDEX_SUFFIX
+
+
+def _signature(path):
+    st = os.stat(path)
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def precision_statistics(values):
+    """
+    Statistics (m) of an (n, 3) array of sX, sY, sZ (mm)
+        returns:
+            dict with count, X/Y/Z mean and rms, Z median, p95 and max
+    """
+    stats = {'count': len(values)}
+    if len(values) == 0:
+        return stats
+    values = values / 1000
+    for i, axis in enumerate(['X', 'Y', 'Z']):
+        stats[axis + ' mean'] = float(values[:, i].mean())
+        stats[axis + ' rms'] = float(np.sqrt(np.square(values[:, i]).mean()))
+    stats['Z median'], stats['Z p95'] = [float(v) for v in np.percentile(values[:, 2], [50, 95])]
+    stats['Z max'] = float(values[:, 2].max())
+    return stats
+
+
+class PrecisionIndex():
+    """
+    Grid index of one precision file, build with PrecisionIndex.open(path)
+    """
+
+    def __init__(self, origin, cell_size, shape, offsets, xy, precision, order):
+        self.origin = origin
+        self.cell_size = float(cell_size)
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.offsets = offsets
+        self.xy = xy
+        self.precision = precision
+        self.order = order
+
+    @classmethod
+    def build(cls, path, block_size=1000000):
+        """ Read a precision file (text or binary) and sort its points by grid cell """
+        x_column, y_column = xy_columns(path)
+        blocks = list(iter_precision_blocks(path, [x_column, y_column] + AXES, block_size))
+        data = np.concatenate(blocks) if blocks else np.zeros((0, 5))
+        xy, precision = data[:, :2], data[:, 2:]
+        if len(xy):
+            lo, hi = xy.min(axis=0), xy.max(axis=0)
+        else:
+            lo = hi = np.zeros(2)
+        extent = np.maximum(hi - lo, 1e-9)
+        cell_size = np.sqrt(extent[0] * extent[1] * POINTS_PER_CELL / max(len(xy), 1))
+        cell_size = max(cell_size, np.sqrt(extent[0] * extent[1] / MAX_CELLS), 1e-9)
+        shape = (np.floor(extent / cell_size).astype(np.int64) + 1)[::-1]
+        cells = cls._cells_of(xy, lo, cell_size, shape)
+        order = np.argsort(cells, kind='stable')
+        offsets = np.searchsorted(cells[order], np.arange(shape[0] * shape[1] + 1))
+        return cls(lo, cell_size, shape, offsets, xy[order], precision[order], order)
+
+    @staticmethod
+    def _cells_of(xy, origin, cell_size, shape):
+        col = np.clip(((xy[:, 0] - origin[0]) // cell_size).astype(np.int64), 0, shape[1] - 1)
+        row = np.clip(((xy[:, 1] - origin[1]) // cell_size).astype(np.int64), 0, shape[0] - 1)
+        return row * shape[1] + col
+
+    def save(self, out_path, signature):
+        np.savez(out_path, origin=self.origin, cell_size=self.cell_size, shape=np.array(self.shape),
+                 offsets=self.offsets, xy=self.xy, precision=self.precision, order=self.order, signature=signature)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['origin'], f['cell_size'], f['shape'], f['offsets'], f['xy'], f['precision'], f['order'])
+
+    @classmethod
+    def open(cls, path, rebuild=False):
+        """
+        Index of a precision file, loaded from <name>_pt_prec_index.npz or built (and saved) when missing
+        or older than the file
+        """
+        out_path = index_path(path)
+        signature = _signature(path)
+        if not rebuild and os.path.exists(out_path):
+            with np.load(out_path) as f:
+                current = np.array_equal(f['signature'], signature)
+            if current:
+                return cls.load(out_path)
+        index = cls.build(path)
+        index.save(out_path, signature)
+        return index
+
+    def _candidates(self, xmin, ymin, xmax, ymax):
+        """ Positions (in the sorted arrays) of the points in the cells overlapping a box """
+        c0 = max(int((xmin - self.origin[0]) // self.cell_size), 0)
+        c1 = min(int((xmax - self.origin[0]) // self.cell_size), self.shape[1] - 1)
+        r0 = max(int((ymin - self.origin[1]) // self.cell_size), 0)
+        r1 = min(int((ymax - self.origin[1]) // self.cell_size), self.shape[0] - 1)
+        if c0 > c1 or r0 > r1:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.arange(r0, r1 + 1) * self.shape[1]
+        # cells of one grid row are contiguous in the sorted arrays
+        starts = self.offsets[rows + c0]
+        stops = self.offsets[rows + c1 + 1]
+        return np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+
+    def radius(self, x, y, r):
+        """ Precision statistics of the points within r of (x, y) """
+        idx = self._candidates(x - r, y - r, x + r, y + r)
+        d2 = np.square(self.xy[idx, 0] - x) + np.square(self.xy[idx, 1] - y)
+        return precision_statistics(self.precision[idx[d2 <= r * r]])
+
+    def knn(self, x, y, k):
+        """ Precision statistics of the k points nearest to (x, y), with the distance of the farthest """
+        n = len(self.xy)
+        k = min(k, n)
+        if k == 0:
+            return precision_statistics(self.precision[:0])
+        r = self.cell_size
+        while True:
+            idx = self._candidates(x - r, y - r, x + r, y + r)
+            # the box contains every point within r, so the k nearest are final once the k-th is within r
+            if len(idx) >= k:
+                d2 = np.square(self.xy[idx, 0] - x) + np.square(self.xy[idx, 1] - y)
+                nearest = np.argpartition(d2, k - 1)[:k]
+                if d2[nearest].max() <= r * r or len(idx) == n:
+                    stats = precision_statistics(self.precision[idx[nearest]])
+                    stats['distance'] = float(np.sqrt(d2[nearest].max()))
+                    return stats
+            r *= 2
+
+    def polygon(self, polygon):
+        """ Precision statistics of the points inside a polygon ((m, 2) vertices in the file CRS) """
+        poly = np.asarray(polygon, dtype=np.float64)
+        idx = self._candidates(poly[:, 0].min(), poly[:, 1].min(), poly[:, 0].max(), poly[:, 1].max())
+        inside = points_in_polygon(self.xy[idx, 0], self.xy[idx, 1], poly)
+        return precision_statistics(self.precision[idx[inside]])
+
+    def batch(self, points, r=None, k=None):
+        """
+        Radius (r) or k nearest neighbour (k) statistics of many checkpoints
+            args:
+                points = (n, 2) array of X, Y
+            returns:
+                list of statistics dicts, one per checkpoint
+        """
+        if (r is None) == (k is None):
+            raise ValueError("Give either r or k")
+        if r is not None:
+            return [self.radius(x, y, r) for x, y in np.asarray(points, dtype=np.float64)[:, :2]]
+        return [self.knn(x, y, k) for x, y in np.asarray(points, dtype=np.float64)[:, :2]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precision around checkpoints from a spatial index of a _pt_prec file.')
+    parser.add_argument('file', help='_pt_prec.txt/.npy file (the index is built next to it)')
+    parser.add_argument('-points', default=None, help='CSV of checkpoints with label, X, Y columns and a header row')
+    parser.add_argument('-r', type=float, default=None, help='Search radius in file units')
+    parser.add_argument('-k', type=int, default=None, help='Number of nearest points')
+    parser.add_argument('-rebuild', action='store_true', help='Rebuild the index')
+    args = parser.parse_args()
+    index = PrecisionIndex.open(args.file, args.rebuild)
+    print(f"Index of {len(index.xy)} points, {index.shape[0]} x {index.shape[1]} cells of {index.cell_size:.3f}")
+    if args.points:
+        labels = np.loadtxt(args.points, delimiter=',', skiprows=1, usecols=0, dtype=str, ndmin=1)
+        points = np.loadtxt(args.points, delimiter=',', skiprows=1, usecols=(1, 2), ndmin=2)
+        for label, stats in zip(labels, index.batch(points, args.r, args.k)):
+            print(label, stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import os
+import sys
+import argparse
+import numpy as np
+
+try:
+    import rasterio
+    from rasterio.transform import Affine
+except ImportError:
+    rasterio = None
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from point_precision import read_precision_header
+from precision_stats import iter_precision_blocks
+
+# Gridded vertical precision (sZ) maps from _pt_prec files, for level of detection analysis.
+# Points are binned onto a grid aligned to an exported DEM (the DEM pixels, or an integer multiple of
+# them) and accumulated block by block with np.bincount, so only the grid and one block of points are
+# in memory. Each output GeoTIFF has two float32 bands: the statistic of sZ in metres and the number
+# of points per cell. Requires rasterio (pip install rasterio).
+
+STATISTICS = ['mean', 'rms', 'max']
+NODATA = -32767.0
+
+
+def _require_rasterio():
+    if rasterio is None:
+        raise ImportError("precision_raster needs rasterio to read and write GeoTIFFs (pip install rasterio)")
+
+
+def grid_from_dem(dem_path, scale=1):
+    """
+    Grid aligned to a DEM GeoTIFF
+        args:
+            dem_path = str path of the DEM
+            scale = int, cells of the precision grid are scale x scale DEM pixels
+        returns:
+            grid = dict with transform (Affine), width, height and crs
+    """
+    _require_rasterio()
+    with rasterio.open(dem_path) as dem:
+        transform, width, height, crs = dem.transform, dem.width, dem.height, dem.crs
+    if transform.b != 0 or transform.d != 0:
+        raise ValueError(f"{dem_path} is rotated, only north-up DEMs are supported")
+    return {'transform': transform * Affine.scale(scale),
+            'width': int(np.ceil(width / scale)), 'height': int(np.ceil(height / scale)), 'crs': crs}
+
+
+def grid_from_bounds(xmin, ymin, xmax, ymax, resolution, crs=None):
+    """ North-up grid covering a bounding box, for when there is no DEM to align to """
+    _require_rasterio()
+    width = int(np.ceil((xmax - xmin) / resolution))
+    height = int(np.ceil((ymax - ymin) / resolution))
+    return {'transform': Affine(resolution, 0, xmin, 0, -resolution, ymax),
+            'width': width, 'height': height, 'crs': crs}
+
+
+def xy_columns(path):
+    """ Easting(m), Northing(m) of a reprojected file (convert_pt_prec_to_UTM.py), X(m), Y(m) otherwise """
+    columns = read_precision_header(path)['columns']
+    if 'Easting(m)' in columns and 'Northing(m)' in columns:
+        return 'Easting(m)', 'Northing(m)'
+    return 'X(m)', 'Y(m)'
+
+
+def rasterize_precision(path, grid, statistic='mean', column='sZ(mm)', block_size=1000000):
+    """
+    Bin the precision of the points of one file onto a grid
+        args:
+            path = str _pt_prec.txt/.npy (coordinates in the CRS of the grid)
+            grid = dict from grid_from_dem or grid_from_bounds
+            statistic = 'mean', 'rms' or 'max' of the column per cell
+            column = precision column (mm)
+            block_size = points read at a time
+        returns:
+            values = (height, width) float32 statistic in metres, NaN where there are no points
+            count = (height, width) int64 number of points per cell
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"statistic must be one of {STATISTICS}, got {statistic}")
+    t = grid['transform']
+    width, height = grid['width'], grid['height']
+    ncells = width * height
+    count = np.zeros(ncells, dtype=np.int64)
+    acc = np.zeros(ncells, dtype=np.float64)
+    if statistic == 'max':
+        acc[:] = -np.inf
+
+    x_column, y_column = xy_columns(path)
+    for block in iter_precision_blocks(path, [x_column, y_column, column], block_size):
+        cols = np.floor((block[:, 0] - t.c) / t.a).astype(np.int64)
+        rows = np.floor((block[:, 1] - t.f) / t.e).astype(np.int64)
+        inside = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+        index = rows[inside] * width + cols[inside]
+        values = block[inside, 2] / 1000
+        count += np.bincount(index, minlength=ncells)
+        if statistic == 'mean':
+            acc += np.bincount(index, weights=values, minlength=ncells)
+        elif statistic == 'rms':
+            acc += np.bincount(index, weights=values * values, minlength=ncells)
+        else:
+            np.maximum.at(acc, index, values)
+
+    result = np.full(ncells, np.nan, dtype=np.float64)
+    filled = count > 0
+    if statistic == 'mean':
+        result[filled] = acc[filled] / count[filled]
+    elif statistic == 'rms':
+        result[filled] = np.sqrt(acc[filled] / count[filled])
+    else:
+        result[filled] = acc[filled]
+    return result.astype(np.float32).reshape(height, width), count.reshape(height, width)
+
+
+def write_precision_raster(out_path, grid, values, count, statistic='mean'):
+    """
+    Write the statistic (band 1, metres) and the point count (band 2) as a GeoTIFF
+    """
+    _require_rasterio()
+    profile = {'driver': 'GTiff', 'width': grid['width'], 'height': grid['height'], 'count': 2,
+               'dtype': 'float32', 'crs': grid['crs'], 'transform': grid['transform'], 'nodata': NODATA,
+               'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate'}
+    with rasterio.open(out_path, 'w', **profile) as dst:
+        dst.write(np.where(np.isnan(values), NODATA, values).astype(np.float32), 1)
+        dst.write(count.astype(np.float32), 2)
+        dst.set_band_description(1, f'sZ {statistic} (m)')
+        dst.set_band_description(2, 'points')
+    return out_path
+
+
+def precision_raster_path(path, statistic='mean'):
+    return os.path.splitext(path)[0] + '_sZ_' + statistic + '.tif'
+
+
+def export_precision_raster(path, dem_path, statistic='mean', scale=1, out_path=None, block_size=1000000):
+    """
+    Gridded sZ map of one precision file, aligned to a DEM
+        returns:
+            out_path of the GeoTIFF
+    """
+    grid = grid_from_dem(dem_path, scale)
+    values, count = rasterize_precision(path, grid, statistic, block_size=block_size)
+    out_path = out_path or precision_raster_path(path, statistic)
+    write_precision_raster(out_path, grid, values, count, statistic)
+    print(f"Wrote sZ {statistic} of {int(count.sum())} points in {int((count > 0).sum())} cells to {out_path}")
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gridded sZ precision rasters aligned to a DEM.')
+    parser.add_argument('files', nargs='+', help='_pt_prec.txt/.npy files (coordinates in the DEM CRS)')
+    parser.add_argument('-dem', required=True, help='DEM GeoTIFF defining the grid')
+    parser.add_argument('-statistic', default='mean', choices=STATISTICS, help='Statistic of sZ per cell')
+    parser.add_argument('-scale', type=int, default=1, help='Cell size as a multiple of the DEM pixel size')
+    args = parser.parse_args()
+    for path in args.files:
+        export_precision_raster(path, args.dem, args.statistic, args.scale)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,50 +1,142 @@
 import Metashape
+import os
+import sys
+import numpy as np
 
-def point_inside(point, poly):
-
-	x, y = point.x, point.y
-	inside = False
-
-	p1x, p1y = poly[0]
-	for i in range(len(poly) + 1):
-		p2x, p2y = poly[i % len(poly)]
-		if y >= min(p1y, p2y):
-			if y <= max(p1y, p2y):
-				if x <= max(p1x, p2x):
-					if p1y != p2y:
-						xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-					if p1x == p2x or x <= xinters:
-						inside = not inside
-		p1x, p1y = p2x, p2y
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from point_precision import project_points, WGS84_GEOGRAPHIC
+from geometry import points_in_polygon
+
+try:
+	from shapely import STRtree, points as shapely_points, polygons as shapely_polygons
+except ImportError:
+	STRtree = None
+
+try:
+	from pyproj import Transformer
+	from pyproj.exceptions import CRSError
+except ImportError:
+	Transformer = None
+
+# Remove (or disable) the cameras that are not inside any of the selected polygon shapes.
+# All camera centers are transformed into one geocentric array. WGS84 shapes are converted in numpy,
+# shapes in an EPSG projection (UTM...) are projected in one pyproj call when pyproj is installed;
+# other coordinate systems fall back to crs.project per camera. Each polygon is tested only against
+# the cameras inside its bounding box, and the ray casting runs in numpy over the cameras x edges.
+# With many polygons (and shapely installed) an STR-tree is used instead.
+
+# polygons at which the STR-tree is used, when shapely is available
+STRTREE_POLYGONS = 64
+
+
+def project_xy(crs, V):
+	"""
+	X, Y of (N, 3) WGS84 geocentric coordinates in crs, in one batch where possible
+	"""
+	authority = getattr(crs, 'authority', None) or ''
+	if Transformer is not None and authority.startswith('EPSG::') and authority not in WGS84_GEOGRAPHIC:
+		try:
+			# only X, Y are used, so the vertical datum (geoid) of compound systems does not matter
+			transformer = Transformer.from_crs('EPSG:4978', authority.replace('::', ':'), always_xy=True)
+		except CRSError:
+			transformer = None
+		if transformer is not None:
+			x, y, _ = transformer.transform(V[:, 0], V[:, 1], V[:, 2])
+			return np.column_stack([x, y])
+	return project_points(crs, V)[:, :2]
+
+
+def camera_coordinates(chunk, crs):
+	"""
+	X, Y of all cameras in crs: aligned cameras from their estimated center, others from their reference
+		returns:
+			cameras = list of cameras with a position
+			xy = (N, 2) array
+	"""
+	T = chunk.transform.matrix
+	M = np.array([[T[i, j] for j in range(4)] for i in range(4)], dtype=np.float64)
+	aligned = [camera for camera in chunk.cameras if camera.transform]
+	centers = np.array([(c.center[0], c.center[1], c.center[2], 1.0) for c in aligned], dtype=np.float64).reshape(-1, 4)
+	xy = project_xy(crs, (centers @ M.T)[:, :3])
+
+	# cameras without an alignment are placed from their reference location
+	referenced = [camera for camera in chunk.cameras if not camera.transform and camera.reference.location]
+	if referenced:
+		ref_V = np.array([tuple(chunk.crs.unproject(camera.reference.location)) for camera in referenced],
+						 dtype=np.float64)
+		xy = np.vstack([xy, project_xy(crs, ref_V)])
+	return aligned + referenced, xy
+
+
+def inside_polygons(xy, polygons):
+	"""
+	Points inside any of the polygons
+		args:
+			xy = (N, 2) array
+			polygons = list of (m, 2) vertex arrays
+		returns:
+			(N,) bool array
+	"""
+	inside = np.zeros(len(xy), dtype=bool)
+	if len(xy) == 0 or not polygons:
+		return inside
+	if STRtree is not None and len(polygons) >= STRTREE_POLYGONS:
+		tree = STRtree(shapely_polygons([np.asarray(p, dtype=np.float64) for p in polygons]))
+		point_index, _ = tree.query(shapely_points(xy), predicate='within')
+		inside[point_index] = True
+		return inside
+	for poly in polygons:
+		poly = np.asarray(poly, dtype=np.float64)
+		# bounding box prefilter, only cameras not already inside another polygon
+		candidates = np.flatnonzero(~inside & (xy[:, 0] >= poly[:, 0].min()) & (xy[:, 0] <= poly[:, 0].max())
+									& (xy[:, 1] >= poly[:, 1].min()) & (xy[:, 1] <= poly[:, 1].max()))
+		if len(candidates):
+			inside[candidates] = points_in_polygon(xy[candidates, 0], xy[candidates, 1], poly)
 	return inside
 
-doc = Metashape.app.document
-chunk = doc.chunk
-shapes = chunk.shapes
-crs = shapes.crs
-T = chunk.transform.matrix
-polygons = dict()
-
-for shape in shapes:
-	if not shape.selected: #skipping not selected shapes
-		continue
-	if shape.type == Metashape.Shape.Polygon:
-		polygons[shape] = [[v.x, v.y] for v in shape.vertices]
-		
-for camera in chunk.cameras:
-	camera.selected = True
-	if not camera.transform:
-		if camera.reference.location:
-			camera_coord = crs.project(chunk.crs.unproject(camera.reference.location))
-		else:
-			continue
+
+def cameras_outside_polygons(chunk, shapes=None):
+	"""
+	Cameras of the chunk that are outside all selected polygon shapes (or have no position)
+		args:
+			chunk = Metashape.Chunk
+			shapes = list of polygon shapes [default = the selected polygons of chunk.shapes]
+		returns:
+			list of cameras
+	"""
+	crs = chunk.shapes.crs
+	if shapes is None:
+		shapes = [shape for shape in chunk.shapes if shape.selected and shape.type == Metashape.Shape.Polygon]
+	polygons = [[[v.x, v.y] for v in shape.vertices] for shape in shapes]
+	cameras, xy = camera_coordinates(chunk, crs)
+	inside = inside_polygons(xy, polygons)
+	kept = {camera.key for camera, keep in zip(cameras, inside) if keep}
+	return [camera for camera in chunk.cameras if camera.key not in kept]
+
+
+def select_cameras_by_polygons(chunk, action='remove', shapes=None):
+	"""
+	Remove or disable the cameras outside the selected polygons in one call
+		args:
+			action = 'remove' or 'disable'
+		returns:
+			list of the cameras removed or disabled
+	"""
+	outside = cameras_outside_polygons(chunk, shapes)
+	if action == 'remove':
+		chunk.remove(outside)
+	elif action == 'disable':
+		for camera in outside:
+			camera.enabled = False
 	else:
-		camera_coord = crs.project(T.mulp(camera.center))
-	for shape in polygons.keys():
-		if point_inside(Metashape.Vector([camera_coord.x, camera_coord.y]), polygons[shape]):
-			camera.selected = False
-
-#Delete all selected cameras
-chunk.remove(camera for camera in chunk.cameras if camera.selected)
-			
-print("Script finished")
\ No newline at end of file
+		raise ValueError("action must be 'remove' or 'disable'")
+	print(f"{action.capitalize()}d {len(outside)} cameras outside the selected polygons")
+	return outside
+
+
+if __name__ == '__main__':
+	doc = Metashape.app.document
+	chunk = doc.chunk
+	select_cameras_by_polygons(chunk)
+
+	print("Script finished")
@@ -1,6 +1,9 @@
 import Metashape
-import csv
-import math
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Error'))
+from point_precision import export_chunk_precision
 
 # For use with Metashape Pro v.1.5
 #
@@ -29,6 +32,10 @@ import math
 # Contact: m.james at lancaster.ac.uk
 # Updates: Check http://tinyurl.com/sfmgeoref
 
+# Set BINARY_OUTPUT = True to write <name>_pt_prec.npy (columns as float64, memory-mappable) with a
+# <name>_pt_prec.json header (columns, units, CRS) instead of the text file, see point_precision.py.
+BINARY_OUTPUT = False
+
 
 doc = Metashape.app.document
 chunk = doc.chunk
@@ -47,51 +54,8 @@ for chunk in doc.chunks:
 
 		out_path = doc.path[0:(len(doc.path)-4)] + '_' + chunk_name + '_pt_prec.txt'
 
-		# Get transforms to account for real-world coordinate system (CRS)
-		# Note, this resets the region to the default
-		M = chunk.transform.matrix
-		region = chunk.region
-		T = chunk.crs.localframe(M.mulp(chunk.region.center)) * M
-		if chunk.transform.scale:
-			R = chunk.transform.scale * T.rotation()
-		else:
-			R = T.rotation()
-   
+		# Coordinates, precisions and covariances of all valid points are computed as arrays and
+		# written in blocks (see Error/point_precision.py)
 		print(f"Exporting precision estimates for {chunk_name} to {out_path}")
-		# Open the output file and write the precision estimates to file
-		with open(out_path, "w") as fid:
-			# Open the output file
-			fwriter = csv.writer(fid, delimiter='\t', lineterminator='\n')
-			
-			# Write the header line
-			fwriter.writerow( [	'X(m)', 'Y(m)', 'Z(m)', 'sX(mm)', 'sY(mm)', 'sZ(mm)',
-								'covXX(m2)', 'covXY(m2)', 'covXZ(m2)', 'covYY(m2)', 'covYZ(m2)', 'covZZ(m2)'] )					
-
-			# Iterate through all valid points, writing a line to the file for each point
-			for point in points:
-				if not point.valid:
-					continue
-				
-				# Transform the point coordinates into the output local coordinate system
-				if chunk.crs:
-					V = M * (point.coord)
-					V.size = 3
-					pt_coord = chunk.crs.project(V)
-				else:
-					V = M * (point.coord)
-					V.size = 3
-					pt_coord = V
-
-				# Transform the point covariance matrix into the output local coordinate system
-				pt_covars = R * point.cov * R.t()
-
-				# Write the line of coordinates, precisions and covariances to the text file
-				fwriter.writerow( [ 
-					'{0:0.5f}'.format( pt_coord[0] ), '{0:0.5f}'.format( pt_coord[1] ), '{0:0.5f}'.format( pt_coord[2] ),
-					'{0:0.7f}'.format( math.sqrt(pt_covars[0, 0])*1000 ), '{0:0.7f}'.format( math.sqrt(pt_covars[1,1])*1000 ), '{0:0.7f}'.format( math.sqrt(pt_covars[2, 2] )*1000),
-					'{0:0.9f}'.format( pt_covars[0, 0] ), '{0:0.9f}'.format( pt_covars[0, 1] ), '{0:0.9f}'.format( pt_covars[0, 2] ),
-					'{0:0.9f}'.format( pt_covars[1, 1] ), '{0:0.9f}'.format( pt_covars[1, 2] ), '{0:0.9f}'.format( pt_covars[2, 2] ) ] )
-
-						
-			# Close the text file
-			fid.close()
\ No newline at end of file
+		npoints = export_chunk_precision(chunk, out_path, points, binary=BINARY_OUTPUT)
+		print(f"Exported {npoints} points")
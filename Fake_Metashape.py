@@ -0,0 +1,1386 @@
+"""
+------------------------------------------------------------------------------
+Fake in-memory Metashape backend
+
+Pure-Python stand-in for the subset of the Agisoft Metashape API used by the
+workflow scripts (Document, Chunk.copy, tie_points.points/tracks/projections,
+TiePoints.Filter, optimizeCameras meta, camera.reference, CoordinateSystem...).
+It lets the gradual selection engine, the metrics and the build/export helpers
+be exercised and benchmarked on machines without a Metashape license.
+
+usage:
+    import Fake_Metashape
+    Metashape = Fake_Metashape.install()       # registers sys.modules['Metashape']
+    doc = Fake_Metashape.make_document(n_cameras=500, n_points=100000)
+
+Synthetic blocks are deterministic for a given seed. Tie point metrics
+(reconstruction uncertainty, projection accuracy, reprojection error) are drawn
+from log-normal distributions roughly matching Wingtra/DJI surveys, so that the
+threshold search loops behave the same way they do on real projects.
+
+Expensive calls (matchPhotos, alignCameras, optimizeCameras, buildDepthMaps,
+buildPointCloud, buildDem, buildOrthomosaic, exportRaster, Chunk.copy,
+Document.save) are charged to the module level `timing` model. Each charge is
+recorded in timing.calls; with timing.scale > 0 the call also sleeps for the
+simulated duration multiplied by scale (scale = 1.0 is roughly real time on a
+workstation, 0.0 = no sleeping, which is the default).
+------------------------------------------------------------------------------
+"""
+
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+from array import array
+
+
+# ==================== TIMING HOOKS ===========================================
+
+class TimingModel():
+    """
+    Simulated cost of the expensive Metashape calls.
+    Cost of a call = base + per_unit * units (seconds), where units is the
+    number of cameras, points or pixels the call works on.
+    """
+
+    # name: (base seconds, seconds per unit)
+    default_costs = {
+        'matchPhotos': (2.0, 0.25),           # per camera
+        'alignCameras': (2.0, 0.05),          # per camera
+        'optimizeCameras': (0.5, 2.0e-6),     # per projection
+        'Chunk.copy': (0.2, 1.0e-7),          # per tie point
+        'buildDepthMaps': (5.0, 1.5),         # per camera
+        'buildPointCloud': (5.0, 0.8),        # per camera
+        'buildDem': (2.0, 1.0e-7),            # per dense point
+        'buildOrthomosaic': (5.0, 0.4),       # per camera
+        'exportRaster': (1.0, 2.0e-8),        # per output pixel
+        'exportPointCloud': (1.0, 5.0e-8),    # per dense point
+        'Document.save': (0.5, 2.0e-8),       # per byte
+        'importReference': (0.05, 1.0e-4),    # per row
+        'addPhotos': (0.05, 2.0e-3),          # per photo
+    }
+
+    def __init__(self, scale=0.0, costs=None):
+        self.scale = scale
+        self.costs = dict(self.default_costs)
+        if costs:
+            self.costs.update(costs)
+        self.calls = []
+
+    def charge(self, name, units=0):
+        """
+        Record a call and sleep for its simulated duration times scale.
+            args:
+                name = key in costs
+                units = number of work units processed by the call
+            returns:
+                simulated duration in seconds
+        """
+        base, per_unit = self.costs.get(name, (0.0, 0.0))
+        seconds = base + per_unit * units
+        self.calls.append((name, units, seconds))
+        if self.scale > 0:
+            time.sleep(seconds * self.scale)
+        return seconds
+
+    def total(self, name=None):
+        """ Total simulated seconds, optionally for one call name """
+        return sum(s for n, _, s in self.calls if name is None or n == name)
+
+    def reset(self):
+        self.calls = []
+
+
+timing = TimingModel()
+
+
+def set_time_scale(scale):
+    """ Set the sleep multiplier of the module timing model (0 disables sleeping) """
+    timing.scale = scale
+
+
+# ==================== VECTOR / MATRIX ========================================
+
+class Vector():
+    """ Minimal Metashape.Vector """
+
+    def __init__(self, values=()):
+        self._v = [float(v) for v in values]
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, idx):
+        return self._v[idx]
+
+    def __setitem__(self, idx, value):
+        self._v[idx] = float(value)
+
+    def __bool__(self):
+        return len(self._v) > 0
+
+    def __repr__(self):
+        return 'Vector([' + ', '.join(repr(v) for v in self._v) + '])'
+
+    def __eq__(self, other):
+        return isinstance(other, Vector) and self._v == other._v
+
+    def __add__(self, other):
+        return Vector([a + b for a, b in zip(self._v, other)])
+
+    def __sub__(self, other):
+        return Vector([a - b for a, b in zip(self._v, other)])
+
+    def __neg__(self):
+        return Vector([-a for a in self._v])
+
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            return sum(a * b for a, b in zip(self._v, other._v))
+        return Vector([a * other for a in self._v])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return Vector([a / other for a in self._v])
+
+    @property
+    def size(self):
+        return len(self._v)
+
+    @size.setter
+    def size(self, n):
+        if n < len(self._v):
+            self._v = self._v[:n]
+        else:
+            self._v = self._v + [0.0] * (n - len(self._v))
+
+    @property
+    def x(self):
+        return self._v[0]
+
+    @property
+    def y(self):
+        return self._v[1]
+
+    @property
+    def z(self):
+        return self._v[2]
+
+    @property
+    def w(self):
+        return self._v[3]
+
+    def norm(self):
+        return math.sqrt(sum(a * a for a in self._v))
+
+    def norm2(self):
+        return sum(a * a for a in self._v)
+
+    def normalized(self):
+        n = self.norm()
+        return Vector([a / n for a in self._v]) if n else Vector(self._v)
+
+    def copy(self):
+        return Vector(self._v)
+
+    def list(self):
+        return list(self._v)
+
+
+class Matrix():
+    """ Minimal Metashape.Matrix (row major) """
+
+    def __init__(self, rows):
+        self._m = [[float(v) for v in row] for row in rows]
+
+    @classmethod
+    def Diag(cls, values):
+        values = list(values)
+        n = len(values)
+        return cls([[values[i] if i == j else 0.0 for j in range(n)] for i in range(n)])
+
+    @classmethod
+    def Translation(cls, vector):
+        m = cls.Diag([1, 1, 1, 1])
+        for i in range(3):
+            m._m[i][3] = vector[i]
+        return m
+
+    @classmethod
+    def Rotation(cls, matrix):
+        m = cls.Diag([1, 1, 1, 1])
+        for i in range(3):
+            for j in range(3):
+                m._m[i][j] = matrix[i, j]
+        return m
+
+    @property
+    def size(self):
+        return (len(self._m), len(self._m[0]))
+
+    def __repr__(self):
+        return 'Matrix(' + repr(self._m) + ')'
+
+    def __getitem__(self, idx):
+        if isinstance(idx, tuple):
+            return self._m[idx[0]][idx[1]]
+        return Vector(self._m[idx])
+
+    def __setitem__(self, idx, value):
+        self._m[idx[0]][idx[1]] = float(value)
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix):
+            cols = list(zip(*other._m))
+            return Matrix([[sum(a * b for a, b in zip(row, col)) for col in cols] for row in self._m])
+        if isinstance(other, Vector):
+            return Vector([sum(a * b for a, b in zip(row, other)) for row in self._m])
+        return Matrix([[a * other for a in row] for row in self._m])
+
+    def __rmul__(self, other):
+        return Matrix([[a * other for a in row] for row in self._m])
+
+    def __add__(self, other):
+        return Matrix([[a + b for a, b in zip(r1, r2)] for r1, r2 in zip(self._m, other._m)])
+
+    def t(self):
+        return Matrix([list(col) for col in zip(*self._m)])
+
+    def mulp(self, v):
+        """ Transform point (homogeneous w = 1) """
+        m = self._m
+        x, y, z = v[0], v[1], v[2]
+        return Vector([m[i][0] * x + m[i][1] * y + m[i][2] * z + m[i][3] for i in range(3)])
+
+    def mulv(self, v):
+        """ Transform vector (homogeneous w = 0) """
+        m = self._m
+        x, y, z = v[0], v[1], v[2]
+        return Vector([m[i][0] * x + m[i][1] * y + m[i][2] * z for i in range(3)])
+
+    def scale(self):
+        return math.sqrt(sum(self._m[i][0] ** 2 for i in range(3)))
+
+    def rotation(self):
+        s = self.scale() or 1.0
+        return Matrix([[self._m[i][j] / s for j in range(3)] for i in range(3)])
+
+    def translation(self):
+        return Vector([self._m[i][3] for i in range(3)])
+
+    def inv(self):
+        n = len(self._m)
+        a = [row[:] + [1.0 if i == j else 0.0 for j in range(n)] for i, row in enumerate(self._m)]
+        for c in range(n):
+            p = max(range(c, n), key=lambda r: abs(a[r][c]))
+            a[c], a[p] = a[p], a[c]
+            pv = a[c][c]
+            a[c] = [v / pv for v in a[c]]
+            for r in range(n):
+                if r != c and a[r][c]:
+                    f = a[r][c]
+                    a[r] = [v - f * w for v, w in zip(a[r], a[c])]
+        return Matrix([row[n:] for row in a])
+
+    def copy(self):
+        return Matrix(self._m)
+
+
+# ==================== ENUMS / SIMPLE TYPES ===================================
+
+class _Enum():
+    """ Named constant, compares by identity like the Metashape enums """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'Metashape.' + self.name
+
+
+class DataSource():
+    TiePointsData = _Enum('TiePointsData')
+    PointCloudData = _Enum('PointCloudData')
+    DepthMapsData = _Enum('DepthMapsData')
+    ModelData = _Enum('ModelData')
+    ElevationData = _Enum('ElevationData')
+    OrthomosaicData = _Enum('OrthomosaicData')
+    ImagesData = _Enum('ImagesData')
+
+
+NoFiltering = _Enum('NoFiltering')
+MildFiltering = _Enum('MildFiltering')
+ModerateFiltering = _Enum('ModerateFiltering')
+AggressiveFiltering = _Enum('AggressiveFiltering')
+DisabledInterpolation = _Enum('DisabledInterpolation')
+EnabledInterpolation = _Enum('EnabledInterpolation')
+Extrapolated = _Enum('Extrapolated')
+MosaicBlending = _Enum('MosaicBlending')
+AverageBlending = _Enum('AverageBlending')
+ReferenceFormatCSV = _Enum('ReferenceFormatCSV')
+PointCloudFormatPLY = _Enum('PointCloudFormatPLY')
+ReferencePreselectionSource = _Enum('ReferencePreselectionSource')
+
+
+class PointClass():
+    Created = 0
+    Unclassified = 1
+    Ground = 2
+
+
+class ImageCompression():
+    def __init__(self):
+        self.tiff_big = False
+        self.tiff_tiled = False
+        self.tiff_overviews = True
+
+
+class OrthoProjection():
+    class Type():
+        Planar = _Enum('OrthoProjection.Type.Planar')
+        Cylindrical = _Enum('OrthoProjection.Type.Cylindrical')
+
+    def __init__(self):
+        self.crs = None
+        self.type = OrthoProjection.Type.Planar
+
+
+class BBox():
+    def __init__(self, min=None, max=None):
+        self.min = min if min is not None else Vector([0, 0])
+        self.max = max if max is not None else Vector([0, 0])
+
+
+class Region():
+    def __init__(self, center, size):
+        self.center = center
+        self.size = size
+        self.rot = Matrix.Diag([1, 1, 1])
+
+
+class MetaData(dict):
+    """ chunk.meta, values are strings like in Metashape """
+    pass
+
+
+# ==================== COORDINATE SYSTEM ======================================
+
+class CoordinateSystem():
+    """
+    Local engineering CRS: geocentric = projected + origin.
+    Good enough for the workflow math (project/unproject/localframe) to round-trip.
+    """
+
+    geoids = []
+
+    def __init__(self, init='LOCAL_CS["Local Coordinates (m)",LOCAL_DATUM["Local Datum",0],UNIT["metre",1]]'):
+        self.init = init
+        self.wkt = init
+        if 'EPSG::' in init:
+            self.name = init
+        else:
+            self.name = init.split('"')[1] if '"' in init else init
+        self.origin = Vector([0.0, 0.0, 0.0])
+
+    def __repr__(self):
+        return "<CoordinateSystem '" + self.name + "'>"
+
+    def __bool__(self):
+        return True
+
+    @staticmethod
+    def addGeoid(path):
+        CoordinateSystem.geoids.append(path)
+
+    @staticmethod
+    def transform(point, source, target):
+        return target.project(source.unproject(point))
+
+    def project(self, v):
+        return Vector([v[0] - self.origin[0], v[1] - self.origin[1], v[2] - self.origin[2]])
+
+    def unproject(self, v):
+        return Vector([v[0] + self.origin[0], v[1] + self.origin[1], v[2] + self.origin[2]])
+
+    def localframe(self, v):
+        return Matrix.Translation(-Vector([v[0], v[1], v[2]]))
+
+
+# ==================== CAMERAS ================================================
+
+class CameraReference():
+    def __init__(self):
+        self.location = None
+        self.rotation = None
+        self.accuracy = None
+        self.rotation_accuracy = None
+        self.enabled = True
+        self.location_enabled = True
+        self.rotation_enabled = True
+
+    def copy(self):
+        ref = CameraReference()
+        ref.__dict__.update(self.__dict__)
+        return ref
+
+
+class Photo():
+    def __init__(self, path):
+        self.path = path
+        self.meta = MetaData()
+
+
+class CameraGroup():
+    Folder = _Enum('CameraGroup.Folder')
+    Station = _Enum('CameraGroup.Station')
+
+    def __init__(self, label=''):
+        self.label = label
+        self.type = CameraGroup.Folder
+        self.selected = False
+
+    def __repr__(self):
+        return "<CameraGroup '" + self.label + "'>"
+
+
+class Sensor():
+    def __init__(self, width=5472, height=3648, focal=3650.0):
+        self.width = width
+        self.height = height
+        self.focal_length = 8.8
+        self.f = focal
+        self.label = 'Synthetic Sensor'
+
+
+class Camera():
+    """ Nadir pinhole camera in the chunk internal frame """
+
+    def __init__(self, key, label, sensor, group=None, path=None):
+        self.key = key
+        self.label = label
+        self.sensor = sensor
+        self.group = group
+        self.photo = Photo(path if path is not None else label + '.JPG')
+        self.reference = CameraReference()
+        self.transform = None
+        self.center = None
+        self.enabled = True
+        self.selected = False
+        self.meta = MetaData()
+
+    def __repr__(self):
+        return "<Camera '" + self.label + "'>"
+
+    def project(self, coord):
+        """ Project an internal point into image coordinates """
+        c = self.center
+        depth = c[2] - coord[2]
+        if depth <= 0:
+            return None
+        f = self.sensor.f
+        return Vector([self.sensor.width / 2 + f * (coord[0] - c[0]) / depth,
+                       self.sensor.height / 2 + f * (coord[1] - c[1]) / depth])
+
+    def error(self, point, proj):
+        """ Reprojection residual of a point against a measured projection (pixels) """
+        p = self.project(point)
+        if p is None:
+            return Vector([0.0, 0.0])
+        return Vector([p[0] - proj[0], p[1] - proj[1]])
+
+
+# ==================== TIE POINTS =============================================
+
+class _TrackData():
+    """
+    Column storage shared by the Points/Projections views of one TiePoints.
+    Arrays are indexed by track id.
+    """
+
+    def __init__(self, n_tracks):
+        self.x = array('d', bytes(8 * n_tracks))
+        self.y = array('d', bytes(8 * n_tracks))
+        self.z = array('d', bytes(8 * n_tracks))
+        self.sx = array('d', bytes(8 * n_tracks))
+        self.sy = array('d', bytes(8 * n_tracks))
+        self.sz = array('d', bytes(8 * n_tracks))
+        self.ru = array('d', bytes(8 * n_tracks))
+        self.pa = array('d', bytes(8 * n_tracks))
+        self.re = array('d', bytes(8 * n_tracks))
+        self.views = 4
+        self.step = 1
+
+    def copy(self):
+        other = _TrackData(0)
+        for name in ('x', 'y', 'z', 'sx', 'sy', 'sz', 'ru', 'pa', 're'):
+            setattr(other, name, array('d', getattr(self, name)))
+        other.views = self.views
+        other.step = self.step
+        return other
+
+
+class TiePointsPoint():
+    """ View of one tie point, created on access like Metashape's wrapper objects """
+
+    __slots__ = ('_tp', '_track')
+
+    def __init__(self, tie_points, track_id):
+        self._tp = tie_points
+        self._track = track_id
+
+    @property
+    def track_id(self):
+        return self._track
+
+    @property
+    def coord(self):
+        d = self._tp._data
+        t = self._track
+        return Vector([d.x[t], d.y[t], d.z[t], 1.0])
+
+    @property
+    def valid(self):
+        return self._tp._valid[self._track] == 1
+
+    @valid.setter
+    def valid(self, value):
+        self._tp._valid[self._track] = 1 if value else 0
+
+    @property
+    def selected(self):
+        return self._tp._selected[self._track] == 1
+
+    @selected.setter
+    def selected(self, value):
+        self._tp._selected[self._track] = 1 if value else 0
+
+    @property
+    def cov(self):
+        d = self._tp._data
+        t = self._track
+        sx, sy, sz = d.sx[t], d.sy[t], d.sz[t]
+        cxy = 0.1 * sx * sy
+        return Matrix([[sx * sx, cxy, 0.0], [cxy, sy * sy, 0.0], [0.0, 0.0, sz * sz]])
+
+
+class TiePointsPoints():
+    """ chunk.tie_points.points sequence """
+
+    def __init__(self, tie_points):
+        self._tp = tie_points
+
+    def __len__(self):
+        return len(self._tp._point_tracks)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [TiePointsPoint(self._tp, t) for t in self._tp._point_tracks[idx]]
+        return TiePointsPoint(self._tp, self._tp._point_tracks[idx])
+
+    def __iter__(self):
+        tp = self._tp
+        for t in tp._point_tracks:
+            yield TiePointsPoint(tp, t)
+
+
+class TiePointsProjection():
+    __slots__ = ('track_id', 'coord', 'size')
+
+    def __init__(self, track_id, coord, size=4.0):
+        self.track_id = track_id
+        self.coord = coord
+        self.size = size
+
+
+class TiePointsProjections():
+    """ chunk.tie_points.projections, indexed by camera, generated lazily """
+
+    def __init__(self, tie_points):
+        self._tp = tie_points
+
+    def __getitem__(self, camera):
+        tp = self._tp
+        return tp._camera_projections(camera)
+
+
+class TiePointsTrack():
+    __slots__ = ('color',)
+
+    def __init__(self):
+        self.color = (128, 128, 128)
+
+
+class TiePointsTracks():
+    def __init__(self, tie_points):
+        self._tp = tie_points
+
+    def __len__(self):
+        return self._tp._n_tracks
+
+    def __getitem__(self, idx):
+        if idx >= self._tp._n_tracks:
+            raise IndexError(idx)
+        return TiePointsTrack()
+
+
+class TiePoints():
+    """ chunk.tie_points """
+
+    class Filter():
+        ReprojectionError = _Enum('TiePoints.Filter.ReprojectionError')
+        ReconstructionUncertainty = _Enum('TiePoints.Filter.ReconstructionUncertainty')
+        ProjectionAccuracy = _Enum('TiePoints.Filter.ProjectionAccuracy')
+        ImageCount = _Enum('TiePoints.Filter.ImageCount')
+
+        def __init__(self):
+            self._tp = None
+            self.values = []
+            self.criterion = None
+
+        def init(self, chunk, criterion):
+            tp = chunk.tie_points
+            self._tp = tp
+            self.criterion = criterion
+            self.values = tp._criterion_values(criterion)
+
+        def selectPoints(self, threshold):
+            tp = self._tp
+            sel = tp._selected
+            valid = tp._valid
+            for t, value in zip(tp._point_tracks, self.values):
+                sel[t] = 1 if (valid[t] and value > threshold) else 0
+
+        def resetSelection(self):
+            tp = self._tp
+            for t in tp._point_tracks:
+                tp._selected[t] = 0
+
+        def removePoints(self, threshold):
+            self.selectPoints(threshold)
+            self._tp.removeSelectedPoints()
+
+    def __init__(self, chunk, data, n_tracks, point_tracks):
+        self._chunk = chunk
+        self._data = data
+        self._n_tracks = n_tracks
+        self._point_tracks = point_tracks
+        self._valid = bytearray(b'\x01') * n_tracks
+        self._selected = bytearray(n_tracks)
+        # residual multiplier, lowered by each optimizeCameras
+        self._re_scale = 1.0
+
+    @property
+    def points(self):
+        return TiePointsPoints(self)
+
+    @property
+    def tracks(self):
+        return TiePointsTracks(self)
+
+    @property
+    def projections(self):
+        return TiePointsProjections(self)
+
+    def copy(self, chunk):
+        other = TiePoints(chunk, self._data.copy(), self._n_tracks, array('l', self._point_tracks))
+        other._valid = bytearray(self._valid)
+        other._selected = bytearray(self._selected)
+        other._re_scale = self._re_scale
+        return other
+
+    def removeSelectedPoints(self):
+        sel = self._selected
+        self._point_tracks = array('l', (t for t in self._point_tracks if not sel[t]))
+        self._selected = bytearray(self._n_tracks)
+
+    def removeTrack(self, track_id):
+        pass
+
+    def _criterion_values(self, criterion):
+        d = self._data
+        tracks = self._point_tracks
+        if criterion is TiePoints.Filter.ReconstructionUncertainty:
+            return [d.ru[t] for t in tracks]
+        if criterion is TiePoints.Filter.ProjectionAccuracy:
+            return [d.pa[t] for t in tracks]
+        if criterion is TiePoints.Filter.ReprojectionError:
+            s = self._re_scale
+            return [d.re[t] * s for t in tracks]
+        if criterion is TiePoints.Filter.ImageCount:
+            return [float(d.views)] * len(tracks)
+        raise ValueError('Unsupported filter criterion ' + repr(criterion))
+
+    def _camera_tracks(self, camera_index, n_cameras):
+        """ Track ids observed by camera_index: t with (t + j * step) % n == camera_index """
+        d = self._data
+        n_tracks = self._n_tracks
+        for j in range(d.views):
+            start = (camera_index - j * d.step) % n_cameras
+            for t in range(start, n_tracks, n_cameras):
+                yield t
+
+    def _camera_projections(self, camera):
+        chunk = self._chunk
+        index = chunk._camera_index(camera)
+        if index is None or camera.center is None:
+            return []
+        d = self._data
+        s = self._re_scale
+        c = camera.center
+        f = camera.sensor.f
+        w2 = camera.sensor.width / 2
+        h2 = camera.sensor.height / 2
+        out = []
+        for t in self._camera_tracks(index, len(chunk._cameras)):
+            depth = c[2] - d.z[t]
+            if depth <= 0:
+                continue
+            # residual along a track dependent direction, magnitude = RE value
+            r = d.re[t] * s
+            ang = t * 2.399963
+            out.append(TiePointsProjection(t, Vector([w2 + f * (d.x[t] - c[0]) / depth - r * math.cos(ang),
+                                                      h2 + f * (d.y[t] - c[1]) / depth - r * math.sin(ang)])))
+        return out
+
+    def _projection_count(self):
+        return len(self._point_tracks) * self._data.views
+
+
+# ==================== DENSE PRODUCTS =========================================
+
+class DepthMaps():
+    def __init__(self, cameras):
+        self.cameras = list(cameras)
+        self.label = 'Depth Maps'
+        self.meta = MetaData()
+
+
+class PointCloud():
+    """ chunk.point_cloud, confidence stored per point (1-255) """
+
+    def __init__(self, confidence):
+        self._confidence = confidence
+        self._classes = bytearray(b'\x01') * len(confidence)
+        self._filter = None
+        self.label = 'Point Cloud'
+        self.meta = MetaData()
+
+    @property
+    def point_count(self):
+        return len(self._confidence)
+
+    def copy(self):
+        other = PointCloud(bytearray(self._confidence))
+        other._classes = bytearray(self._classes)
+        return other
+
+    def setConfidenceFilter(self, min_confidence, max_confidence):
+        self._filter = (min_confidence, max_confidence)
+
+    def resetFilters(self):
+        self._filter = None
+
+    def removePoints(self, point_classes):
+        if self._filter is None:
+            keep = [i for i, c in enumerate(self._classes) if c not in point_classes]
+        else:
+            lo, hi = self._filter
+            keep = [i for i, c in enumerate(self._confidence) if not (lo <= c <= hi)]
+        self._confidence = bytearray(self._confidence[i] for i in keep)
+        self._classes = bytearray(self._classes[i] for i in keep)
+
+    def compactPoints(self):
+        pass
+
+    def classifyGroundPoints(self, **kwargs):
+        rng = random.Random(len(self._classes))
+        self._classes = bytearray(2 if rng.random() < 0.6 else 1 for _ in self._classes)
+
+
+class Elevation():
+    def __init__(self, resolution, bounds=(0.0, 0.0, 1.0, 1.0), crs=None):
+        self.resolution = resolution
+        self.left, self.bottom, self.right, self.top = bounds
+        self.crs = crs
+        self.meta = MetaData()
+
+
+class Orthomosaic():
+    def __init__(self, resolution, bounds=(0.0, 0.0, 1.0, 1.0), crs=None):
+        self.resolution = resolution
+        self.left, self.bottom, self.right, self.top = bounds
+        self.crs = crs
+        self.meta = MetaData()
+
+
+class Shape():
+    Polygon = _Enum('Shape.Polygon')
+    Polyline = _Enum('Shape.Polyline')
+    Point = _Enum('Shape.Point')
+
+    def __init__(self, vertices, type=None):
+        self.vertices = [Vector(v) for v in vertices]
+        self.type = type if type is not None else Shape.Polygon
+        self.selected = False
+        self.label = ''
+
+
+class Shapes():
+    def __init__(self, crs):
+        self.crs = crs
+        self._shapes = []
+
+    def __iter__(self):
+        return iter(list(self._shapes))
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def addShape(self, vertices=(), type=None):
+        shape = Shape(vertices, type)
+        self._shapes.append(shape)
+        return shape
+
+
+class ChunkTransform():
+    def __init__(self, matrix=None, scale=1.0):
+        self.matrix = matrix if matrix is not None else Matrix.Diag([1, 1, 1, 1])
+        self.scale = scale
+
+    def copy(self):
+        return ChunkTransform(self.matrix.copy(), self.scale)
+
+
+# ==================== CHUNK ==================================================
+
+class Chunk():
+    def __init__(self, document, label='Chunk 1'):
+        self._document = document
+        self._label = label
+        self._cameras = []
+        self._camera_keys = {}
+        self.camera_groups = []
+        self.sensors = [Sensor()]
+        self.tie_points = None
+        self.depth_maps_sets = []
+        self.point_cloud = None
+        self.elevation = None
+        self.orthomosaic = None
+        self.crs = CoordinateSystem()
+        self.transform = ChunkTransform()
+        self.region = Region(Vector([0, 0, 0]), Vector([1, 1, 1]))
+        self.shapes = Shapes(self.crs)
+        self.meta = MetaData()
+        self.tiepoint_accuracy = 1.0
+        self.marker_projection_accuracy = 0.5
+        self.enabled = True
+        self.selected = False
+
+    def __repr__(self):
+        return "<Chunk '" + self._label + "'>"
+
+    @property
+    def label(self):
+        return self._label
+
+    @label.setter
+    def label(self, value):
+        self._label = value
+
+    @property
+    def cameras(self):
+        return list(self._cameras)
+
+    def _camera_index(self, camera):
+        return self._camera_keys.get(camera.key)
+
+    def _reindex_cameras(self):
+        self._camera_keys = {camera.key: i for i, camera in enumerate(self._cameras)}
+
+    # ---------------- structure ----------------
+    def addCameraGroup(self):
+        group = CameraGroup('Group ' + str(len(self.camera_groups) + 1))
+        self.camera_groups.append(group)
+        return group
+
+    def addPhotos(self, filenames, group=None, **kwargs):
+        if isinstance(group, int):
+            group = self.camera_groups[group]
+        filenames = list(filenames)
+        timing.charge('addPhotos', len(filenames))
+        for path in filenames:
+            key = self._document._next_key()
+            label = os.path.splitext(os.path.basename(path))[0]
+            self._cameras.append(Camera(key, label, self.sensors[0], group, path))
+        self._reindex_cameras()
+
+    def remove(self, items):
+        items = list(items) if not isinstance(items, (Camera, CameraGroup)) else [items]
+        groups = [item for item in items if isinstance(item, CameraGroup)]
+        keys = {item.key for item in items if isinstance(item, Camera)}
+        if groups:
+            keys.update(c.key for c in self._cameras if any(c.group is g for g in groups))
+            self.camera_groups = [g for g in self.camera_groups if not any(g is r for r in groups)]
+        if keys:
+            self._cameras = [c for c in self._cameras if c.key not in keys]
+            self._reindex_cameras()
+
+    def copy(self, items=None, keypoints=True, **kwargs):
+        """ Copy the chunk into the same document. items = list of DataSource to copy (default all) """
+        doc = self._document
+        npoints = len(self.tie_points._point_tracks) if self.tie_points is not None else 0
+        if items is not None and DataSource.TiePointsData not in items:
+            npoints = 0
+        timing.charge('Chunk.copy', npoints)
+        new = Chunk(doc, self._label)
+        group_map = {}
+        for g in self.camera_groups:
+            ng = CameraGroup(g.label)
+            ng.type = g.type
+            group_map[id(g)] = ng
+            new.camera_groups.append(ng)
+        new.sensors = self.sensors
+        for c in self._cameras:
+            nc = Camera(c.key, c.label, c.sensor, group_map.get(id(c.group)), c.photo.path)
+            nc.reference = c.reference.copy()
+            nc.transform = c.transform
+            nc.center = c.center
+            nc.enabled = c.enabled
+            new._cameras.append(nc)
+        new._reindex_cameras()
+
+        def wanted(source):
+            return items is None or source in items
+
+        if self.tie_points is not None and wanted(DataSource.TiePointsData):
+            new.tie_points = self.tie_points.copy(new)
+        if wanted(DataSource.DepthMapsData):
+            new.depth_maps_sets = list(self.depth_maps_sets)
+        if self.point_cloud is not None and wanted(DataSource.PointCloudData):
+            new.point_cloud = self.point_cloud.copy()
+        if wanted(DataSource.ElevationData):
+            new.elevation = self.elevation
+        if wanted(DataSource.OrthomosaicData):
+            new.orthomosaic = self.orthomosaic
+        new.crs = self.crs
+        new.transform = self.transform.copy()
+        new.region = Region(self.region.center.copy(), self.region.size.copy())
+        new.shapes = self.shapes
+        new.meta = MetaData(self.meta)
+        new.tiepoint_accuracy = self.tiepoint_accuracy
+        doc._chunks.append(new)
+        return new
+
+    # ---------------- alignment ----------------
+    def matchPhotos(self, **kwargs):
+        timing.charge('matchPhotos', len(self._cameras))
+
+    def alignCameras(self, cameras=None, reset_alignment=False, **kwargs):
+        """ Place unaligned cameras on a flight grid, generate tie points if the chunk has none """
+        targets = self._cameras if cameras is None else list(cameras)
+        timing.charge('alignCameras', len(targets))
+        n = len(self._cameras)
+        if n == 0:
+            return
+        cols = max(1, int(math.sqrt(n)))
+        for i, camera in enumerate(self._cameras):
+            if camera.transform is not None and not reset_alignment:
+                continue
+            if cameras is not None and not any(camera is c for c in targets):
+                continue
+            _place_camera(camera, i, cols)
+        if self.tie_points is None:
+            _generate_tie_points(self, n_points=200 * n, seed=n)
+
+    def optimizeCameras(self, **kwargs):
+        tp = self.tie_points
+        if tp is None:
+            return
+        timing.charge('optimizeCameras', tp._projection_count())
+        # each adjustment absorbs part of the remaining residual
+        tp._re_scale *= 0.97
+        d = tp._data
+        tracks = tp._point_tracks
+        if len(tracks):
+            step = max(1, len(tracks) // 20000)
+            sample = [d.re[t] for t in tracks[::step]]
+            rms = math.sqrt(sum(v * v for v in sample) / len(sample)) * tp._re_scale
+        else:
+            rms = 0.0
+        sigma0 = rms / max(self.tiepoint_accuracy, 1e-6) * 2.5
+        self.meta['OptimizeCameras/sigma0'] = str(sigma0)
+        self.meta['OptimizeCameras/duration'] = str(timing.calls[-1][2])
+
+    def importReference(self, path, format=None, columns='nxyz', delimiter=',', skip_rows=0, **kwargs):
+        """ Assign reference location/rotation/accuracy by camera label from a CSV file """
+        layout = _parse_columns(columns)
+        by_label = {camera.label: camera for camera in self._cameras}
+        nrows = 0
+        with open(path, newline='') as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            for _ in range(skip_rows):
+                next(reader, None)
+            for row in reader:
+                nrows += 1
+                if 'n' not in layout or len(row) <= layout['n']:
+                    continue
+                label = os.path.splitext(os.path.basename(row[layout['n']].strip()))[0]
+                camera = by_label.get(label)
+                if camera is None:
+                    continue
+                ref = camera.reference
+                if all(k in layout for k in 'xyz'):
+                    ref.location = Vector([float(row[layout[k]]) for k in 'xyz'])
+                if all(k in layout for k in 'abc'):
+                    ref.rotation = Vector([float(row[layout[k]]) for k in 'abc'])
+                if all(k in layout for k in 'XYZ'):
+                    ref.accuracy = Vector([float(row[layout[k]]) for k in 'XYZ'])
+        timing.charge('importReference', nrows)
+
+    # ---------------- dense products ----------------
+    def buildDepthMaps(self, downscale=4, filter_mode=None, cameras=None, **kwargs):
+        targets = [c for c in self._cameras if c.transform is not None and c.enabled] if cameras is None else list(cameras)
+        timing.charge('buildDepthMaps', len(targets) * 4.0 / max(downscale, 1))
+        self.depth_maps_sets.append(DepthMaps(targets))
+
+    def buildPointCloud(self, point_confidence=False, point_colors=True, **kwargs):
+        if not self.depth_maps_sets:
+            raise RuntimeError('Empty depth maps')
+        cameras = self.depth_maps_sets[-1].cameras
+        timing.charge('buildPointCloud', len(cameras))
+        rng = random.Random(len(cameras))
+        n = 2000 * len(cameras)
+        # confidence ~ number of depth maps agreeing on a point, heavy at the low end
+        self.point_cloud = PointCloud(bytearray(min(255, 1 + int(rng.expovariate(0.35))) for _ in range(n)))
+
+    def buildDem(self, source_data=None, interpolation=None, projection=None, resolution=0, **kwargs):
+        npts = self.point_cloud.point_count if self.point_cloud is not None else 0
+        timing.charge('buildDem', npts)
+        self.elevation = Elevation(resolution or 0.05, self._region_bounds(), self.crs)
+
+    def buildOrthomosaic(self, surface_data=None, resolution=0, **kwargs):
+        timing.charge('buildOrthomosaic', len(self._cameras))
+        self.orthomosaic = Orthomosaic(resolution or 0.02, self._region_bounds(), self.crs)
+
+    def _region_bounds(self):
+        c, s = self.region.center, self.region.size
+        return (c[0] - s[0] / 2, c[1] - s[1] / 2, c[0] + s[0] / 2, c[1] + s[1] / 2)
+
+    def exportRaster(self, path='', source_data=None, projection=None, resolution=0, region=None, **kwargs):
+        """ Write a small placeholder raster file, charged by the number of output pixels """
+        product = self.orthomosaic if source_data is DataSource.OrthomosaicData else self.elevation
+        if product is None:
+            raise RuntimeError('Null ' + ('orthomosaic' if source_data is DataSource.OrthomosaicData else 'elevation'))
+        res = resolution or product.resolution
+        if region is not None:
+            width = region.max[0] - region.min[0]
+            height = region.max[1] - region.min[1]
+        else:
+            width = self.region.size[0]
+            height = self.region.size[1]
+        pixels = max(1, int(width / res) * int(height / res))
+        timing.charge('exportRaster', pixels)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'chunk': self._label, 'source': repr(source_data), 'resolution': res,
+                       'pixels': pixels}, f)
+
+    def exportPointCloud(self, path='', source_data=None, format=None, binary=True, save_point_confidence=False,
+                         **kwargs):
+        """ Binary little endian PLY with float x, y, z (zeros) and optionally uchar confidence """
+        if self.point_cloud is None:
+            raise RuntimeError('Null point cloud')
+        confidence = self.point_cloud._confidence
+        timing.charge('exportPointCloud', len(confidence))
+        header = ['ply', 'format binary_little_endian 1.0', 'element vertex ' + str(len(confidence)),
+                  'property float x', 'property float y', 'property float z']
+        if save_point_confidence:
+            header.append('property uchar confidence')
+        header.append('end_header')
+        record = bytes(12)
+        with open(path, 'wb') as f:
+            f.write(('\n'.join(header) + '\n').encode('ascii'))
+            if save_point_confidence:
+                f.write(b''.join(record + bytes([c]) for c in confidence))
+            else:
+                f.write(record * len(confidence))
+
+
+def _parse_columns(columns):
+    """ Map Metashape importReference column codes to row indices, '[XY]' shares one column """
+    layout = {}
+    idx = 0
+    i = 0
+    while i < len(columns):
+        ch = columns[i]
+        if ch == '[':
+            j = columns.index(']', i)
+            for code in columns[i + 1:j]:
+                layout[code] = idx
+            idx += 1
+            i = j + 1
+            continue
+        if ch != '|':
+            layout[ch] = idx
+        idx += 1
+        i += 1
+    return layout
+
+
+# ==================== DOCUMENT / APP =========================================
+
+_projects = {}
+
+
+class Document():
+    def __init__(self):
+        self._chunks = []
+        self._active = None
+        self._key = 0
+        self.path = ''
+        self.meta = MetaData()
+        self.read_only = False
+
+    @property
+    def chunks(self):
+        return list(self._chunks)
+
+    @property
+    def chunk(self):
+        if self._active is None and self._chunks:
+            self._active = self._chunks[0]
+        return self._active
+
+    @chunk.setter
+    def chunk(self, value):
+        self._active = value
+
+    def _next_key(self):
+        self._key += 1
+        return self._key
+
+    def addChunk(self):
+        chunk = Chunk(self, 'Chunk ' + str(len(self._chunks) + 1))
+        self._chunks.append(chunk)
+        return chunk
+
+    def append(self, document, chunks=None, progress=None):
+        """ Copy chunks (default all) of another document into this one """
+        for chunk in (document.chunks if chunks is None else chunks):
+            new = chunk.copy()
+            new._document._chunks.remove(new)
+            new._document = self
+            self._chunks.append(new)
+
+    def remove(self, items):
+        items = [items] if isinstance(items, Chunk) else list(items)
+        self._chunks = [c for c in self._chunks if not any(c is r for r in items)]
+        if self._active is not None and not any(self._active is c for c in self._chunks):
+            self._active = None
+
+    def save(self, path=None, chunks=None, **kwargs):
+        """ Write a JSON summary of the project and keep the chunks for a later open() """
+        if path:
+            self.path = path
+        if not self.path:
+            raise OSError('Document has no path')
+        nbytes = sum(_chunk_bytes(c) for c in self._chunks)
+        timing.charge('Document.save', nbytes)
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({'chunks': [c.label for c in self._chunks], 'bytes': nbytes}, f)
+        _projects[os.path.abspath(self.path)] = self
+
+    def open(self, path, read_only=False, ignore_lock=False, **kwargs):
+        saved = _projects.get(os.path.abspath(path))
+        if saved is not None and saved is not self:
+            self._chunks = saved._chunks
+            self._active = saved._active
+            self._key = saved._key
+            for chunk in self._chunks:
+                chunk._document = self
+        elif saved is None and not os.path.exists(path):
+            raise OSError("Can't open file: " + path)
+        self.path = path
+        self.read_only = read_only
+
+
+def _chunk_bytes(chunk):
+    """ Approximate .psx payload of a chunk, used to charge Document.save """
+    nbytes = 4096 + 512 * len(chunk._cameras)
+    if chunk.tie_points is not None:
+        nbytes += 64 * len(chunk.tie_points._point_tracks) + 16 * chunk.tie_points._projection_count()
+    if chunk.point_cloud is not None:
+        nbytes += 20 * chunk.point_cloud.point_count
+    return nbytes
+
+
+class Application():
+    def __init__(self):
+        self.document = Document()
+        self.version = '2.1.0 (fake)'
+
+    def getBool(self, label=''):
+        return True
+
+
+app = Application()
+
+
+def _rot(axis, degrees):
+    c, s = math.cos(math.radians(degrees)), math.sin(math.radians(degrees))
+    if axis == 'x':
+        return Matrix([[1, 0, 0], [0, c, -s], [0, s, c]])
+    if axis == 'y':
+        return Matrix([[c, 0, s], [0, 1, 0], [-s, 0, c]])
+    return Matrix([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+
+class Utils():
+    """
+    Orientation helpers, camera frame (x right, y up, z back) to local east/north/up.
+    ypr: Rz(-yaw) Rx(pitch) Ry(roll), opk: Rx(omega) Ry(phi) Rz(kappa), angles in degrees.
+    """
+
+    @staticmethod
+    def ypr2mat(ypr):
+        return _rot('z', -ypr[0]) * _rot('x', ypr[1]) * _rot('y', ypr[2])
+
+    @staticmethod
+    def opk2mat(opk):
+        return _rot('x', opk[0]) * _rot('y', opk[1]) * _rot('z', opk[2])
+
+    @staticmethod
+    def mat2ypr(m):
+        pitch = math.degrees(math.asin(max(-1.0, min(1.0, m[2, 1]))))
+        roll = math.degrees(math.atan2(-m[2, 0], m[2, 2]))
+        yaw = math.degrees(math.atan2(m[0, 1], m[1, 1])) % 360.0
+        return Vector([yaw, pitch, roll])
+
+    @staticmethod
+    def mat2opk(m):
+        phi = math.degrees(math.asin(max(-1.0, min(1.0, m[0, 2]))))
+        omega = math.degrees(math.atan2(-m[1, 2], m[2, 2]))
+        kappa = math.degrees(math.atan2(-m[0, 1], m[0, 0]))
+        return Vector([omega, phi, kappa])
+
+
+# ==================== SYNTHETIC BLOCKS =======================================
+
+def _place_camera(camera, index, cols, spacing=40.0, altitude=120.0):
+    """ Place a camera on a nadir flight grid in the chunk internal frame """
+    x = (index % cols) * spacing
+    y = (index // cols) * spacing
+    camera.center = Vector([x, y, altitude])
+    camera.transform = Matrix.Translation(camera.center)
+
+
+def _generate_tie_points(chunk, n_points, views=4, seed=0, untriangulated_every=20):
+    """ Fill chunk.tie_points with n_points synthetic points spread under the cameras """
+    rng = random.Random(seed)
+    # one track in untriangulated_every never gets a point, like real blocks
+    n_tracks = n_points + n_points // (untriangulated_every - 1) + 1
+    data = _TrackData(n_tracks)
+    data.views = views
+    n_cams = max(1, len(chunk._cameras))
+    data.step = max(1, int(math.sqrt(n_cams)) // 2)
+    xs = [c.center[0] for c in chunk._cameras if c.center is not None] or [0.0]
+    ys = [c.center[1] for c in chunk._cameras if c.center is not None] or [0.0]
+    x0, x1 = min(xs) - 40, max(xs) + 40
+    y0, y1 = min(ys) - 40, max(ys) + 40
+    lognorm = rng.lognormvariate
+    uni = rng.uniform
+    for t in range(n_tracks):
+        data.x[t] = uni(x0, x1)
+        data.y[t] = uni(y0, y1)
+        data.z[t] = uni(0.0, 15.0)
+        s = lognorm(math.log(0.02), 0.5)
+        data.sx[t] = s
+        data.sy[t] = s * uni(0.8, 1.2)
+        data.sz[t] = s * uni(1.5, 3.0)
+        data.ru[t] = lognorm(math.log(8.0), 0.6)
+        data.pa[t] = lognorm(math.log(2.5), 0.5)
+        data.re[t] = lognorm(math.log(0.3), 0.6)
+    point_tracks = array('l', (t for t in range(n_tracks) if t % untriangulated_every != untriangulated_every - 1))
+    point_tracks = point_tracks[:n_points]
+    chunk.tie_points = TiePoints(chunk, data, n_tracks, point_tracks)
+    chunk.region = Region(Vector([(x0 + x1) / 2, (y0 + y1) / 2, 7.5]), Vector([x1 - x0, y1 - y0, 15.0]))
+    chunk.meta['OptimizeCameras/sigma0'] = '1.0'
+
+
+def make_chunk(doc, label='Raw_Photos_Align', n_cameras=500, n_points=100000, n_groups=1,
+               views=4, seed=0, aligned=True, reference=True, photo_dir='synthetic'):
+    """
+    Add a synthetic block to a document.
+        args:
+            doc = Document to add the chunk to
+            label = chunk label
+            n_cameras = number of cameras, split evenly over n_groups camera groups
+            n_points = number of valid tie points
+            views = projections per tie point
+            seed = random seed, same seed gives the same block
+            aligned = place cameras and generate tie points
+            reference = give cameras noisy GNSS reference locations and accuracies
+        returns:
+            chunk = new chunk
+    """
+    rng = random.Random(seed)
+    chunk = doc.addChunk()
+    chunk.label = label
+    groups = []
+    for g in range(n_groups):
+        group = chunk.addCameraGroup()
+        group.label = 'Flight_' + str(g + 1)
+        groups.append(group)
+    cols = max(1, int(math.sqrt(n_cameras)))
+    per_group = max(1, -(-n_cameras // max(n_groups, 1)))
+    for i in range(n_cameras):
+        group = groups[min(i // per_group, len(groups) - 1)] if groups else None
+        label = 'IMG_' + str(i).zfill(5)
+        camera = Camera(doc._next_key(), label, chunk.sensors[0], group, os.path.join(photo_dir, label + '.JPG'))
+        chunk._cameras.append(camera)
+        if aligned:
+            _place_camera(camera, i, cols)
+        if reference:
+            x, y = (i % cols) * 40.0, (i // cols) * 40.0
+            camera.reference.location = Vector([x + rng.gauss(0, 0.03), y + rng.gauss(0, 0.03), 120.0 + rng.gauss(0, 0.05)])
+            camera.reference.accuracy = Vector([0.02, 0.02, 0.05])
+            camera.reference.rotation = Vector([rng.uniform(0, 360), rng.gauss(0, 2), rng.gauss(0, 2)])
+    chunk._reindex_cameras()
+    if aligned and n_points:
+        _generate_tie_points(chunk, n_points, views=views, seed=seed)
+    return chunk
+
+
+def make_document(n_cameras=500, n_points=100000, n_groups=1, label='Raw_Photos_Align', views=4, seed=0, path=''):
+    """
+    Create a Document with one synthetic aligned chunk and make it the app document.
+        returns:
+            doc = Document, doc.chunk is the synthetic chunk
+    """
+    doc = Document()
+    chunk = make_chunk(doc, label=label, n_cameras=n_cameras, n_points=n_points, n_groups=n_groups,
+                       views=views, seed=seed)
+    doc.chunk = chunk
+    doc.path = path
+    app.document = doc
+    return doc
+
+
+def install():
+    """
+    Register this module as 'Metashape' so the workflow scripts import it.
+        returns:
+            the module
+    """
+    module = sys.modules[__name__]
+    sys.modules['Metashape'] = module
+    return module
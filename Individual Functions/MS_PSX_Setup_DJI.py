@@ -7,6 +7,74 @@ group_name = "Group 2"
 
 
     
+def photo_label(photo):
+    # Metashape labels a camera with the photo file name up to the first "."
+    return os.path.basename(photo).split(".")[0]
+
+
+def index_cameras(chunk):
+    """
+    Index the cameras already in a chunk
+        args:
+            chunk = Metashape.Chunk
+        returns:
+            camera_index = dict with sets of camera 'labels' and normalized photo 'paths'
+    """
+    labels = set()
+    paths = set()
+    for camera in chunk.cameras:
+        labels.add(camera.label)
+        if camera.photo is not None and camera.photo.path:
+            paths.add(os.path.normcase(os.path.abspath(camera.photo.path)))
+    return {'labels': labels, 'paths': paths}
+
+
+def add_new_photos(chunk, photos, group, camera_index=None):
+    """
+    Add only photos that are not already in the chunk, in one addPhotos call
+        args:
+            chunk = Metashape.Chunk
+            photos = list of photo paths
+            group = index of the camera group in chunk.camera_groups
+            camera_index = index from index_cameras(chunk), updated with the added photos
+                           [default = build a new one]
+        returns:
+            added = number of photos added
+            skipped = number of photos already in the chunk (or repeated in photos)
+    """
+    if camera_index is None:
+        camera_index = index_cameras(chunk)
+    new_photos = []
+    for photo in photos:
+        label = photo_label(photo)
+        path = os.path.normcase(os.path.abspath(photo))
+        if label in camera_index['labels'] or path in camera_index['paths']:
+            continue
+        camera_index['labels'].add(label)
+        camera_index['paths'].add(path)
+        new_photos.append(photo)
+    if len(new_photos) > 0:
+        chunk.addPhotos(new_photos, group=group)
+    return len(new_photos), len(photos) - len(new_photos)
+
+
+def find_photos(flight_folder):
+    """
+    List photos in every sub directory with "100" in its name (DJI 100MEDIA folders)
+    """
+    photos = []
+    # Walk through the subdirectories and files in the flight_folder
+    for root, dirs, files in os.walk(flight_folder):
+        # Identify subdirectories that contain "100" in their name
+        photo_dirs = [d for d in dirs if "100" in d]
+        for photo_dir in photo_dirs:
+            # Construct the full path to the photo directory
+            full_photo_dir_path = os.path.join(root, photo_dir)
+            # List all photos in the directory
+            photos += [os.path.join(full_photo_dir_path, f) for f in os.listdir(full_photo_dir_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    return photos
+
+
 def setup_psx(flight_folder_dict):
     # Open the Metashape document
 
@@ -18,41 +86,25 @@ def setup_psx(flight_folder_dict):
     else:
         chunk = chunk.copy()
         chunk.label = "Raw_Photos"
-    # Iterate through each flight folder
-    group_dict ={}
+    # labels and paths of the cameras already in the chunk, kept current as photos are added
+    camera_index = index_cameras(chunk)
+    counts = {}
 
     for group_name, flight_folder in flight_folder_dict.items():
-        if any([camera_group.label == group_name for camera_group in chunk.camera_groups]):
-            pass
+        group_labels = [camera_group.label for camera_group in chunk.camera_groups]
+        if group_name in group_labels:
+            group = group_labels.index(group_name)
         else:
             current_group = chunk.addCameraGroup()
             current_group.label = group_name
-        if group_name not in group_dict:
-            if not group_dict:
-                group_dict[group_name] = 0
-            else:
-                group_dict[group_name] = max(group_dict.values()) + 1
-        # Walk through the subdirectories and files in the flight_folder
-        for root, dirs, files in os.walk(flight_folder):
-            # Identify subdirectories that contain "100" in their name
-            photo_dirs = [d for d in dirs if "100" in d]
-            for photo_dir in photo_dirs:
-                # Construct the full path to the photo directory
-                full_photo_dir_path = os.path.join(root, photo_dir)
-                # List all photos in the directory
-                photos = [os.path.join(full_photo_dir_path, f) for f in os.listdir(full_photo_dir_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-                cameras = chunk.cameras
-                #check if the photo is already in the chunk
-                if len(photos) > 0:
-                    for photo in photos:
-                        photoname = os.path.basename(photo).split(".")[0]
-                        for camera in cameras:
-                            if camera.label == photoname:
-                                print(f"Photo {photoname} is already in the chunk.")
-                                photos.remove(photo)
-                if len(photos) > 0:
-                    chunk.addPhotos(photos, group=group_dict[group_name])
-                    print(f"Loading photos from {full_photo_dir_path} into {group_name} group.")
+            group = len(chunk.camera_groups) - 1
+        photos = find_photos(flight_folder)
+        added, skipped = add_new_photos(chunk, photos, group, camera_index)
+        counts[group_name] = (added, skipped)
+        print(f"Loaded {added} photos from {flight_folder} into {group_name} group, {skipped} already in the chunk.")
+    added = sum(c[0] for c in counts.values())
+    skipped = sum(c[1] for c in counts.values())
+    print(f"Added {added} photos, skipped {skipped} duplicates.")
     return chunk
 
 def main():
@@ -1,5 +1,8 @@
 import Metashape
 import os 
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Driver'))
+from Chunk_Index import find_chunks, refresh_chunk_index, copy_chunk, chunk_exists, reset_chunk_index
 
 def activate_chunk(doc, chunk_name):
     """
@@ -10,23 +13,24 @@ def activate_chunk(doc, chunk_name):
         returns:
             chunk = activated chunk
     """
-    # Get list of chunk labels
-    chunk_label_list = [chunk.label for chunk in doc.chunks]
-    # find all indices of chunks labeled chunk_name in document
-    chunk_idx = [idx for idx, label in enumerate(chunk_label_list) if label == chunk_name]
-    if len(chunk_idx) == 0:
+    # find all chunks labeled chunk_name in the document label index
+    chunk_list = find_chunks(doc, chunk_name)
+    if len(chunk_list) == 0:
+        # chunk may have been added outside the index helpers, rebuild the index once before giving up
+        chunk_list = refresh_chunk_index(doc).get(chunk_name, [])
+    if len(chunk_list) == 0:
         # no chunks with that label
         # print exception so it will be visible in console
         print('Exception: No chunk named ' + '"' + chunk_name + '"' + ' in project, stopping execution.')
         #raise Exception('No chunk named ' + '"' + chunk_name + '"' + ' in project.')
         return None
-    if len(chunk_idx) > 1:
+    if len(chunk_list) > 1:
         # more than one chunk with that label
         # print exception so it will be visible in console
         print('Exception: More than one chunk named ' + '"' + chunk_name + '"' + ' in project, stopping execution.')
         raise Exception('More than one chunk named ' + '"' + chunk_name + '"' + ' in project.')
     # if only one chunk with that name, then activate chunk
-    doc.chunk = doc.chunks[chunk_idx[0]]
+    doc.chunk = chunk_list[0]
     chunk = doc.chunk
     return chunk
 
@@ -48,16 +52,14 @@ def classify_ground_points(chunk, params):
 def duplicate_chunk(doc, chunk_index, params):
     chunk = doc.chunks[chunk_index]
 
-    # Duplicate the chunk
-    new_chunk = chunk.copy()
-
     # Create a name for the chunk based on the parameters
     chunk_name = (
         f"Chunk_{chunk_index}_Angle_{params['max_angle']}_Dist_{params['max_distance']}_"
         f"Slope_{params['max_terrain_slope']}_Cell_{params['cell_size']}_"
         f"Ero_{params['erosion_radius']}"
     )
-    new_chunk.label = chunk_name
+    # Duplicate the chunk
+    new_chunk = copy_chunk(doc, chunk, chunk_name)
 
     return new_chunk
 def buildDEMOrtho(input_chunk, doc, ortho_res = None, dem_res = None, interpolation = False, buildOrtho = True):
@@ -212,6 +214,7 @@ def main():
     doc = Metashape.app.document
     doc.save()
     doc.open(project_path)
+    reset_chunk_index(doc)
 
     # Select the original chunk to work on
     original_chunk_list = [0,1]  # Change this index if you have multiple chunks
@@ -246,12 +249,8 @@ def main():
 
                             # Duplicate the original chunk and classify ground points
                             #check if chunk already exists
-                            chunk_exists = False
                             chunk_label = f"Chunk_{original_chunk_index}_Angle_{params['max_angle']}_Dist_{params['max_distance']}_Slope_{params['max_terrain_slope']}_Cell_{params['cell_size']}_Ero_{params['erosion_radius']}"
-                            for chunk in doc.chunks:
-                                if chunk.label == chunk_label:
-                                    chunk_exists = True
-                            if chunk_exists == False:
+                            if not chunk_exists(doc, chunk_label):
                                 new_chunk = duplicate_chunk(doc, original_chunk_index, params)
                                 classify_ground_points(new_chunk, params)
                             else:
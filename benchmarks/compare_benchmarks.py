@@ -0,0 +1,74 @@
+"""
+------------------------------------------------------------------------------
+Regression gate for benchmark results written by run_benchmarks.py
+
+usage:
+compare_benchmarks.py baseline.json current.json [-threshold [float]]
+    Exits with status 1 if any benchmark present in both files is slower than
+    baseline * (1 + threshold). [Default threshold=0.2]
+------------------------------------------------------------------------------
+"""
+
+import sys
+import json
+import argparse
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """
+    Compare two benchmark reports.
+        args:
+            baseline = report dict (json loaded) of the reference run
+            current = report dict of the new run
+            threshold = allowed slowdown fraction (0.2 = 20% slower is still ok)
+        returns:
+            list of dicts with name, baseline, current, ratio and regression flag,
+            sorted from largest to smallest slowdown
+    """
+    rows = []
+    base_results = baseline.get('results', {})
+    for name, result in current.get('results', {}).items():
+        if name not in base_results:
+            continue
+        base_s = base_results[name]['seconds']
+        cur_s = result['seconds']
+        ratio = cur_s / base_s if base_s > 0 else float('inf')
+        rows.append({
+            'name': name,
+            'baseline': base_s,
+            'current': cur_s,
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold,
+        })
+    rows.sort(key=lambda row: row['ratio'], reverse=True)
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"{'Benchmark':40s} {'Baseline (s)':>12s} {'Current (s)':>12s} {'Ratio':>8s}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['name']:40s} {row['baseline']:12.4f} {row['current']:12.4f} {row['ratio']:8.2f}{flag}")
+    nreg = len([row for row in rows if row['regression']])
+    print(f"{nreg} of {len(rows)} benchmarks slower than {threshold * 100:.0f}% over baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark JSON files and flag slowdowns.')
+    parser.add_argument('baseline', type=str, help='Reference results JSON')
+    parser.add_argument('current', type=str, help='New results JSON')
+    parser.add_argument('-threshold', '--threshold', dest='threshold', default=0.2, type=float,
+                        help='Allowed slowdown fraction before flagging a regression [default=0.2]')
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare_results(baseline, current, args.threshold)
+    print_comparison(rows, args.threshold)
+    if any(row['regression'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
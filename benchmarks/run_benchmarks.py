@@ -0,0 +1,246 @@
+"""
+------------------------------------------------------------------------------
+Benchmarks for the gradual selection and metrics hot paths
+
+Runs the workflow functions against synthetic blocks from Fake_Metashape and
+writes the timings as JSON so successive runs can be compared with
+compare_benchmarks.py.
+
+usage:
+run_benchmarks.py [-h]
+                [-sizes [str]]
+                    Comma separated block sizes to run [Default=100k]
+                    100k = 100,000 tie points / 500 cameras
+                    1M   = 1,000,000 tie points / 2,000 cameras
+                    5M   = 5,000,000 tie points / 5,000 cameras
+                [-only [str]]
+                    Comma separated benchmark names to run [Default=all]
+                [-repeat [int]]
+                    Timed runs per benchmark, the minimum is reported [Default=3]
+                [-output [str]]
+                    JSON results file [Default=benchmarks/results/<date>.json]
+                [-baseline [str]]
+                    Previous JSON results file, run the regression gate against it
+                [-threshold [float]]
+                    Allowed slowdown before a benchmark is flagged (0.2 = 20%) [Default=0.2]
+------------------------------------------------------------------------------
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import runpy
+import argparse
+import platform
+import subprocess
+import importlib.util
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRIVER_DIR = os.path.join(REPO_DIR, 'Driver')
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, DRIVER_DIR)
+
+import Fake_Metashape
+Metashape = Fake_Metashape.install()
+
+from compare_benchmarks import compare_results, print_comparison
+
+# name: (tie points, cameras)
+SIZES = {
+    '100k': (100000, 500),
+    '1M': (1000000, 2000),
+    '5M': (5000000, 5000),
+}
+
+
+def load_module(path, name):
+    """ Import a workflow script by path (some file names contain spaces) """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def time_call(func, repeat, setup=None):
+    """
+    Time func() repeat times, running setup() untimed before every run.
+        returns:
+            list of elapsed seconds
+    """
+    runs = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        if setup is not None:
+            func(arg)
+        else:
+            func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def bench_block(size, repeat, only=None):
+    """
+    Run every benchmark on one synthetic block.
+        args:
+            size = key in SIZES
+            repeat = timed runs per benchmark
+            only = optional list of benchmark names to run
+        returns:
+            dict of {benchmark[size]: result dict}
+    """
+    npoints, ncameras = SIZES[size]
+    print(f"Generating synthetic block {size}: {npoints} tie points, {ncameras} cameras")
+    gen_start = time.perf_counter()
+    doc = Fake_Metashape.make_document(n_cameras=ncameras, n_points=npoints, n_groups=2,
+                                       label='LM2_PostError_PCFiltered')
+    chunk = doc.chunk
+    print(f"Generated in {time.perf_counter() - gen_start:.1f} s")
+    # a project with a realistic number of chunks for the label scans
+    for i in range(30):
+        extra = doc.addChunk()
+        extra.label = f"Chunk_{i}_Angle_15_Dist_1_Slope_10_Cell_1_Ero_2"
+
+    error_functions = load_module(os.path.join(DRIVER_DIR, 'Error_Functions.py'), 'Error_Functions')
+    setup = load_module(os.path.join(DRIVER_DIR, 'Setup.py'), 'Setup')
+    gradual = load_module(os.path.join(DRIVER_DIR, 'Gradual Selection.py'), 'Gradual_Selection')
+    # Driver modules are executed together inside Metashape, wire the metrics in the same way
+    gradual.calc_RMS_error = error_functions.calc_RMS_error
+    gradual.calc_camera_error = error_functions.calc_camera_error
+    gradual.calc_camera_accuracy = error_functions.calc_camera_accuracy
+    import Args
+    cam_opt_param = Args.defaults.cam_opt_param
+
+    points = chunk.tie_points.points
+    select = Metashape.TiePoints.Filter()
+    select.init(chunk, criterion=Metashape.TiePoints.Filter.ReconstructionUncertainty)
+    select.selectPoints(15)
+
+    def count_selected():
+        return len([True for point in points if point.valid is True and point.selected is True])
+
+    def count_valid():
+        return len([True for point in points if point.valid is True])
+
+    def fresh_copy():
+        Fake_Metashape.timing.reset()
+        return chunk.copy()
+
+    def threshold_search(ru_chunk):
+        gradual.reconstruction_uncertainty(ru_chunk, 10, 0.5, 1, cam_opt_param)
+        doc.remove(ru_chunk)
+
+    def activate_last_chunk():
+        for label in ('LM2_PostError_PCFiltered', doc.chunks[-1].label, 'Missing_Chunk'):
+            setup.activate_chunk(doc, label)
+
+    def precision_export():
+        doc.chunk = chunk
+        runpy.run_path(os.path.join(REPO_DIR, 'Export_Point_Coordinate_Precision.py'))
+
+    doc.path = os.path.join(REPO_DIR, 'benchmarks', 'results', 'scratch', 'bench.psx')
+    os.makedirs(os.path.dirname(doc.path), exist_ok=True)
+
+    benchmarks = {
+        'calc_RMS_error': (lambda: error_functions.calc_RMS_error(chunk), None),
+        'calc_camera_error': (lambda: error_functions.calc_camera_error(chunk), None),
+        'count_selected_points': (count_selected, None),
+        'count_valid_points': (count_valid, None),
+        'threshold_search_ru': (threshold_search, fresh_copy),
+        'activate_chunk': (activate_last_chunk, None),
+        'precision_export': (precision_export, None),
+    }
+    results = {}
+    for name, (func, setup_func) in benchmarks.items():
+        if only and name not in only:
+            continue
+        # silence the progress prints of the workflow functions while timing
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            runs = time_call(func, repeat, setup_func)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        key = f"{name}[{size}]"
+        results[key] = {
+            'benchmark': name,
+            'size': size,
+            'points': npoints,
+            'cameras': ncameras,
+            'seconds': min(runs),
+            'runs': runs,
+        }
+        print(f"{key:40s} {min(runs):10.4f} s")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the gradual selection and metrics hot paths '
+                                                 'on synthetic tie point clouds.')
+    parser.add_argument('-sizes', '--sizes', dest='sizes', default='100k', type=str,
+                        help='Comma separated block sizes: ' + ', '.join(SIZES) + ' [default=100k]')
+    parser.add_argument('-only', '--only', dest='only', default=None, type=str,
+                        help='Comma separated benchmark names to run [default=all]')
+    parser.add_argument('-repeat', '--repeat', dest='repeat', default=3, type=int,
+                        help='Timed runs per benchmark [default=3]')
+    parser.add_argument('-output', '--output', dest='output', default=None, type=str,
+                        help='JSON results file [default=benchmarks/results/<date>.json]')
+    parser.add_argument('-baseline', '--baseline', dest='baseline', default=None, type=str,
+                        help='Previous JSON results to compare against')
+    parser.add_argument('-threshold', '--threshold', dest='threshold', default=0.2, type=float,
+                        help='Allowed slowdown fraction before flagging a regression [default=0.2]')
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    for size in sizes:
+        if size not in SIZES:
+            raise Exception('Unknown benchmark size "' + size + '", choose from ' + ', '.join(SIZES))
+    only = [s.strip() for s in args.only.split(',')] if args.only else None
+
+    results = {}
+    for size in sizes:
+        results.update(bench_block(size, args.repeat, only))
+
+    output = args.output
+    if output is None:
+        output = os.path.join(REPO_DIR, 'benchmarks', 'results',
+                              datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    report = {
+        'meta': {
+            'date': str(datetime.now()),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to ' + output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison = compare_results(baseline, report, args.threshold)
+        print_comparison(comparison, args.threshold)
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
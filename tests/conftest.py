@@ -0,0 +1,14 @@
+import os
+import sys
+
+# The Driver and Error scripts import their neighbours by module name (they run inside Metashape with
+# their folder on sys.path), and Metashape itself is replaced by the Fake_Metashape backend.
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in [REPO_DIR, os.path.join(REPO_DIR, 'Driver'), os.path.join(REPO_DIR, 'Error'),
+               os.path.join(REPO_DIR, 'Error', 'YPK')]:
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+
+import Fake_Metashape
+
+Fake_Metashape.install()
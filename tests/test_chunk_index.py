@@ -0,0 +1,43 @@
+import pytest
+
+import Fake_Metashape
+import Chunk_Index
+from Chunk_Index import (copy_chunk, relabel_chunk, remove_chunk, find_chunks, chunk_exists, chunk_labels,
+                         chunk_labels_with_suffix, get_chunk_index)
+
+
+@pytest.fixture
+def doc():
+    doc = Fake_Metashape.make_document(n_cameras=10, n_points=200, label='Raw')
+    yield doc
+    Chunk_Index.reset_chunk_index(doc)
+
+
+def test_copy_relabel_remove_keep_the_index_current(doc):
+    copy = copy_chunk(doc, doc.chunk, 'A')
+    assert chunk_labels(doc) == ['Raw', 'A']
+    relabel_chunk(doc, copy, 'B')
+    assert not chunk_exists(doc, 'A')
+    assert find_chunks(doc, 'B') == [copy]
+    remove_chunk(doc, copy)
+    assert chunk_labels(doc) == ['Raw']
+
+
+def test_chunks_added_outside_the_helpers_are_found(doc):
+    get_chunk_index(doc)
+    doc.chunk.copy().label = 'Outside'
+    assert chunk_exists(doc, 'Outside')
+
+
+def test_index_is_keyed_by_project_path(doc, tmp_path):
+    doc.save(str(tmp_path / 'project.psx'))
+    get_chunk_index(doc)
+    assert str(tmp_path / 'project.psx') in Chunk_Index._chunk_indexes
+    assert id(doc) not in Chunk_Index._chunk_indexes
+
+
+def test_suffix_lookup_sees_relabels_outside_the_helpers(doc):
+    copy_chunk(doc, doc.chunk, 'Flight_1_PostError')
+    assert chunk_labels_with_suffix(doc, '_PostError') == ['Flight_1_PostError']
+    find_chunks(doc, 'Flight_1_PostError')[0].label = 'Flight_1'
+    assert chunk_labels_with_suffix(doc, '_PostError') == []
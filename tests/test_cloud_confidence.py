@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import Fake_Metashape
+from Cloud_Confidence import (MAX_CONFIDENCE, suggest_maxconf, filter_report, confidence_histogram, choose_maxconf,
+                              COUNT_KEY)
+
+
+def histogram(counts):
+    hist = np.zeros(MAX_CONFIDENCE + 1, dtype=np.int64)
+    hist[:len(counts)] = counts
+    return hist
+
+
+def test_suggest_maxconf_for_a_retained_fraction():
+    hist = histogram([10, 20, 30, 40])
+    # removing 0..1 keeps 70 of 100 points, removing 0..2 keeps 40
+    assert suggest_maxconf(hist, retain=0.7) == 1
+    assert suggest_maxconf(hist, retain=0.5) == 1
+    assert suggest_maxconf(hist, retain=0.95) == 0
+
+
+def test_suggest_maxconf_for_a_density():
+    hist = histogram([10, 20, 30, 40])
+    assert suggest_maxconf(hist, density=0.4, area=100.0) == 2
+    with pytest.raises(ValueError):
+        suggest_maxconf(hist, density=0.4)
+    with pytest.raises(ValueError):
+        suggest_maxconf(hist, retain=0.5, density=0.4, area=100.0)
+
+
+def test_filter_report():
+    report = filter_report(histogram([10, 20, 30, 40]), 1, bytes_per_point=10)
+    assert report == {'maxconf': 1, 'total': 100, 'removed': 30, 'kept': 70, 'kept_fraction': 0.7,
+                      'saved_bytes': 300}
+    assert filter_report(histogram([]), 3)['kept_fraction'] == 0.0
+
+
+def test_histogram_of_a_point_cloud_is_cached():
+    chunk = Fake_Metashape.make_document(n_cameras=10, n_points=200).chunk
+    chunk.buildDepthMaps()
+    chunk.buildPointCloud(point_confidence=True)
+    hist = confidence_histogram(chunk)
+    assert hist.shape == (MAX_CONFIDENCE + 1,)
+    assert hist.sum() == chunk.point_cloud.point_count
+    assert chunk.point_cloud.meta[COUNT_KEY] == str(chunk.point_cloud.point_count)
+    np.testing.assert_array_equal(confidence_histogram(chunk), hist)
+
+
+def test_fixed_maxconf_does_not_build_a_histogram():
+    chunk = Fake_Metashape.make_document(n_cameras=10, n_points=200).chunk
+    # no point cloud: a histogram would raise
+    assert choose_maxconf(chunk, '3') == (3, None)
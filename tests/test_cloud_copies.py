@@ -0,0 +1,64 @@
+import pytest
+
+import Metashape
+import Fake_Metashape
+import Build
+from Setup import activate_chunk
+
+SOURCE = 'Raw_Photos_Align_RU10_PA3_RE0.3_TPA0.1'
+
+
+@pytest.fixture
+def build(monkeypatch):
+    # Build.py runs in the Metashape console next to Driver.py and uses its globals
+    monkeypatch.setattr(Build, 'Metashape', Metashape, raising=False)
+    monkeypatch.setattr(Build, 'activate_chunk', activate_chunk, raising=False)
+    return Build
+
+
+@pytest.fixture
+def doc():
+    doc = Fake_Metashape.make_document(n_cameras=12, n_points=2000, n_groups=2, label=SOURCE)
+    chunk = doc.chunk
+    chunk.buildDepthMaps(downscale=4)
+    chunk.buildPointCloud(point_confidence=True)
+    return doc
+
+
+@pytest.fixture
+def copy_calls(monkeypatch):
+    calls = []
+    copy = Fake_Metashape.Chunk.copy
+
+    def recording_copy(self, items=None, keypoints=True, **kwargs):
+        calls.append((items, keypoints))
+        return copy(self, items=items, keypoints=keypoints, **kwargs)
+
+    monkeypatch.setattr(Fake_Metashape.Chunk, 'copy', recording_copy)
+    return calls
+
+
+@pytest.mark.parametrize('light', [False, True])
+def test_one_copy_per_camera_group(build, doc, copy_calls, light):
+    source = doc.chunk
+    labels = build.copy_chunks_for_cloud(SOURCE, doc, light=light)
+    groups = [group.label for group in source.camera_groups]
+    assert labels == [group + '_PostError' for group in groups]
+    for group, label in zip(groups, labels):
+        copy = [c for c in doc.chunks if c.label == label][0]
+        assert [g.label for g in copy.camera_groups] == [group]
+        assert {c.group.label for c in copy.cameras} == {group}
+        # the tie points (depth range of the cameras) are copied in both modes
+        assert copy.tie_points is not None
+        assert (copy.point_cloud is None) == light
+        assert (len(copy.depth_maps_sets) == 0) == light
+    if light:
+        assert copy_calls == [([Metashape.DataSource.TiePointsData], False)] * len(groups)
+    else:
+        assert copy_calls == [(None, True)] * len(groups)
+
+
+def test_existing_copies_are_reused(build, doc, copy_calls):
+    labels = build.copy_chunks_for_cloud(SOURCE, doc, light=True)
+    assert build.copy_chunks_for_cloud(SOURCE, doc, light=True) == labels
+    assert len(copy_calls) == len(labels)
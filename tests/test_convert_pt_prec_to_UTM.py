@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pyproj import Transformer
+
+from point_precision import HEADER, read_precision, write_precision_binary, write_precision_table
+from convert_pt_prec_to_UTM import convert_pt_prec_file, convert_pt_prec_files, output_name
+
+
+def lonlat_table(n, seed):
+    """ Precision table with WGS 84 longitudes and latitudes around Boulder in X(m), Y(m) """
+    rng = np.random.default_rng(seed)
+    table = rng.normal(0.0, 1.0, (n, len(HEADER)))
+    table[:, 0] = -105.3 + rng.uniform(-0.05, 0.05, n)
+    table[:, 1] = 40.0 + rng.uniform(-0.05, 0.05, n)
+    table[:, 2] = 1600.0 + rng.uniform(0.0, 200.0, n)
+    return table
+
+
+def expected(x, y):
+    return Transformer.from_crs("EPSG:4326", "EPSG:26913", always_xy=True).transform(x, y)
+
+
+def test_text_file_is_converted_in_chunks(tmp_path):
+    path = str(tmp_path / 'a_pt_prec.txt')
+    write_precision_table(path, lonlat_table(103, 0))
+    out = str(tmp_path / 'a_utm.txt')
+    # 103 rows in chunks of 10, the header is only written once
+    assert convert_pt_prec_file(path, out, chunksize=10) == 103
+    source = pd.read_csv(path, sep='\t')
+    df = pd.read_csv(out, sep='\t')
+    assert list(df.columns) == HEADER + ['Easting(m)', 'Northing(m)']
+    pd.testing.assert_frame_equal(df[HEADER], source)
+    eastings, northings = expected(source['X(m)'].values, source['Y(m)'].values)
+    np.testing.assert_allclose(df['Easting(m)'], eastings, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(df['Northing(m)'], northings, rtol=0, atol=1e-6)
+
+
+def test_binary_file_is_converted_through_a_memmap(tmp_path):
+    table = lonlat_table(103, 1)
+    path = write_precision_binary(str(tmp_path / 'b_pt_prec.txt'), table, crs='WGS 84')
+    out = str(tmp_path / 'b_utm.npy')
+    assert convert_pt_prec_file(path, out, chunksize=10) == 103
+    columns, header = read_precision(out)
+    assert header['columns'] == HEADER + ['Easting(m)', 'Northing(m)']
+    assert (header['points'], header['crs'], header['easting_northing_crs']) == (103, 'WGS 84', 'EPSG:26913')
+    np.testing.assert_array_equal(np.column_stack([columns[c] for c in HEADER]), table)
+    eastings, northings = expected(table[:, 0], table[:, 1])
+    np.testing.assert_allclose(columns['Easting(m)'], eastings, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(columns['Northing(m)'], northings, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_files_are_converted_by_a_process_pool(tmp_path, max_workers):
+    paths = [write_precision_binary(str(tmp_path / 'c_pt_prec.txt'), lonlat_table(50, 2)),
+             str(tmp_path / 'd_pt_prec.txt'), str(tmp_path / 'missing_pt_prec.txt')]
+    write_precision_table(paths[1], lonlat_table(60, 3))
+    results = convert_pt_prec_files(paths, chunksize=16, max_workers=max_workers)
+    assert [(r[1], r[2]) for r in results] == [(output_name(p), n) for p, n in zip(paths, [50, 60, 0])]
+    assert [r[3] is None for r in results] == [True, True, False]
+    columns, _ = read_precision(output_name(paths[0]))
+    eastings, _ = expected(columns['X(m)'], columns['Y(m)'])
+    np.testing.assert_allclose(columns['Easting(m)'], eastings, rtol=0, atol=1e-6)
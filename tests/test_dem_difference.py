@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip('rasterio')
+from rasterio.transform import Affine
+
+from dem_difference import dem_of_difference, t_value
+from precision_raster import NODATA
+
+# 3 x 4 grid of 2 m pixels (4 m2)
+TRANSFORM = Affine(2.0, 0, 500.0, 0, -2.0, 1006.0)
+DZ = np.array([[0.50, -0.50, 0.05, -0.05],
+               [0.20, -0.30, 0.00, 1.00],
+               [-1.00, 0.10, 0.15, -0.12]])
+
+
+def write_raster(path, values, transform=TRANSFORM, nodata=NODATA):
+    values = np.asarray(values, dtype=np.float32)
+    with rasterio.open(path, 'w', driver='GTiff', width=values.shape[1], height=values.shape[0], count=1,
+                       dtype='float32', crs='EPSG:6342', transform=transform, nodata=nodata) as dst:
+        dst.write(np.where(np.isnan(values), nodata, values), 1)
+    return str(path)
+
+
+def test_t_value():
+    assert t_value(0.95) == pytest.approx(1.959964)
+    assert t_value(0.68) == pytest.approx(0.994458)
+
+
+def test_dod_matches_numpy_on_a_synthetic_grid(tmp_path):
+    new = write_raster(tmp_path / 'new.tif', 10.0 + DZ)
+    # the old DEM is on a 1 m grid, it is warped onto the grid of the new DEM
+    old = write_raster(tmp_path / 'old.tif', np.full((6, 8), 10.0), Affine(1.0, 0, 500.0, 0, -1.0, 1006.0))
+    sz_new = np.full(DZ.shape, 0.05)
+    sz_new[0, 3] = np.nan         # no tie points in this cell
+    sz_new[1, :] = 0.02
+    new_prec = write_raster(tmp_path / 'new_sZ.tif', sz_new)
+    out = str(tmp_path / 'dod.tif')
+    # tiles of 2 x 2 pixels, the last column and row of tiles are partial
+    summary = dem_of_difference(new, old, out, new_prec, 0.03, confidence=0.95, registration_error=0.01,
+                                tile_size=2)
+
+    lod = t_value(0.95) * np.sqrt(sz_new ** 2 + 0.03 ** 2 + 0.01 ** 2)
+    valid = ~np.isnan(lod)
+    dz_lod = np.where(valid & (np.abs(DZ) >= lod), DZ, 0.0)
+    with rasterio.open(out) as src:
+        assert src.count == 3 and src.transform == TRANSFORM
+        bands = src.read().astype(np.float64)
+    for band, expected in zip(bands, [DZ, lod, dz_lod]):
+        np.testing.assert_allclose(band[valid], expected[valid], atol=1e-6)
+        assert (band[~valid] == NODATA).all()
+
+    assert summary['pixels'] == 11
+    assert summary['significant_pixels'] == int((dz_lod != 0).sum())
+    assert summary['erosion_volume'] == pytest.approx(4 * dz_lod[dz_lod < 0].sum(), abs=1e-5)
+    assert summary['deposition_volume'] == pytest.approx(4 * dz_lod[dz_lod > 0].sum(), abs=1e-5)
+    raw = DZ[valid]
+    assert summary['erosion_volume_raw'] == pytest.approx(4 * raw[raw < 0].sum(), abs=1e-5)
+    assert summary['deposition_volume_raw'] == pytest.approx(4 * raw[raw > 0].sum(), abs=1e-5)
+    assert summary['erosion_area'] == 4 * (dz_lod < 0).sum()
+    assert summary['net_volume'] == pytest.approx(summary['erosion_volume'] + summary['deposition_volume'])
@@ -0,0 +1,26 @@
+import Metashape
+import Fake_Metashape
+
+
+def test_conftest_installs_the_fake_backend():
+    assert Metashape is Fake_Metashape
+
+
+def test_synthetic_blocks_are_deterministic():
+    a = Fake_Metashape.make_document(n_cameras=20, n_points=300, n_groups=2, seed=3).chunk
+    b = Fake_Metashape.make_document(n_cameras=20, n_points=300, n_groups=2, seed=3).chunk
+    assert Metashape.app.document.chunk is b
+    assert [g.label for g in a.camera_groups] == ['Flight_1', 'Flight_2']
+    assert len(a.cameras) == 20 and len(a.tie_points.points) == 300
+    assert [c.label for c in a.cameras] == [c.label for c in b.cameras]
+    assert [list(p.coord) for p in a.tie_points.points[:10]] == [list(p.coord) for p in b.tie_points.points[:10]]
+
+
+def test_expensive_calls_are_charged_to_the_timing_model():
+    chunk = Fake_Metashape.make_document(n_cameras=10, n_points=100).chunk
+    Fake_Metashape.timing.reset()
+    chunk.matchPhotos()
+    chunk.copy()
+    assert [name for name, _, _ in Fake_Metashape.timing.calls] == ['matchPhotos', 'Chunk.copy']
+    base, per_camera = Fake_Metashape.timing.costs['matchPhotos']
+    assert Fake_Metashape.timing.total('matchPhotos') == base + 10 * per_camera
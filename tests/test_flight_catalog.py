@@ -0,0 +1,47 @@
+import os
+
+from Flight_Catalog import scan_flight_folders, match_flights, query_catalog
+
+
+def make_flight(root, name, photos):
+    output = os.path.join(root, name, 'OUTPUT')
+    os.makedirs(output)
+    for photo in photos:
+        open(os.path.join(output, photo), 'w').close()
+    return output
+
+
+def test_scan_finds_output_folders_and_photos(tmp_path):
+    root = str(tmp_path / 'trip')
+    make_flight(root, 'MM Flight 01', ['a.JPG', 'b.jpg', 'notes.txt'])
+    make_flight(root, 'UM1 Flight 02', ['c.jpg'])
+    flights = scan_flight_folders([root], catalog_path=str(tmp_path / 'catalog.sqlite'))
+    assert [f['name'] for f in flights] == ['MM Flight 01', 'UM1 Flight 02']
+    assert flights[0]['photos'] == ['a.JPG', 'b.jpg']
+
+
+def test_rescan_lists_only_changed_folders(tmp_path, capsys):
+    root = str(tmp_path / 'trip')
+    make_flight(root, 'MM Flight 01', ['a.jpg'])
+    output = make_flight(root, 'MM Flight 02', ['b.jpg'])
+    catalog = str(tmp_path / 'catalog.sqlite')
+    scan_flight_folders([root], catalog_path=catalog)
+    capsys.readouterr()
+    scan_flight_folders([root], catalog_path=catalog)
+    assert '0 listed' in capsys.readouterr().out
+    open(os.path.join(output, 'c.jpg'), 'w').close()
+    os.utime(output, ns=(0, os.stat(output).st_mtime_ns + 10 ** 9))
+    flights = scan_flight_folders([root], catalog_path=catalog)
+    assert '1 listed' in capsys.readouterr().out
+    assert flights[1]['photos'] == ['b.jpg', 'c.jpg']
+
+
+def test_match_and_query_by_user_tag(tmp_path):
+    root = str(tmp_path / 'trip')
+    make_flight(root, 'MM Flight 01', ['a.jpg'])
+    make_flight(root, 'UM1 Flight 02', ['b.jpg'])
+    catalog = str(tmp_path / 'catalog.sqlite')
+    flights = scan_flight_folders([root], catalog_path=catalog)
+    matched = match_flights(flights, ['UM'])
+    assert [(f['group_name'], f['ref_name']) for f in matched] == [('UM1', 'UM1 Flight 02 geotags.csv')]
+    assert [f['name'] for f in query_catalog(['MM'], catalog_path=catalog)] == ['MM Flight 01']
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from Image_Metadata import read_jpeg_header, parse_metadata, build_catalog, catalog_path, photo_metadata
+
+DJI_XMP = (b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF><rdf:Description '
+           b'drone-dji:RelativeAltitude="+99.80" drone-dji:GimbalPitchDegree="-90.00" '
+           b'drone-dji:FlightYawDegree="+12.5" drone-dji:RtkStdLon="0.03" drone-dji:RtkStdLat="0.04" '
+           b'drone-dji:RtkStdHgt="0.05"/></rdf:RDF></x:xmpmeta>')
+
+
+def write_photo(path, endian='<', altitude_ref=0, xmp=DJI_XMP):
+    exif = Image.Exif()
+    exif.endian = endian
+    exif[0x010F] = 'DJI'
+    exif[0x0110] = 'FC6310R'
+    sub = exif.get_ifd(0x8769)
+    sub[0x9003] = '2023:07:20 10:11:12'
+    sub[0x9291] = '25'
+    sub[0x920A] = 8.8
+    gps = exif.get_ifd(0x8825)
+    gps[1] = 'N'
+    gps[2] = (40.0, 30.0, 15.5)
+    gps[3] = 'W'
+    gps[4] = (105.0, 45.0, 1.25)
+    gps[5] = altitude_ref
+    gps[6] = 2543.25
+    Image.new('RGB', (32, 24), (120, 130, 140)).save(str(path), exif=exif, xmp=xmp)
+    return str(path)
+
+
+@pytest.mark.parametrize('endian, marker', [('<', b'II'), ('>', b'MM')])
+def test_parse_matches_pillow(tmp_path, endian, marker):
+    path = write_photo(tmp_path / 'a.jpg', endian)
+    exif, xmp = read_jpeg_header(path)
+    assert exif[:2] == marker
+    row = parse_metadata(exif, xmp)
+
+    pil = Image.open(path).getexif()
+    gps = pil.get_ifd(0x8825)
+    sub = pil.get_ifd(0x8769)
+    assert (row['make'], row['model']) == (pil[0x010F], pil[0x0110])
+    assert row['focal_length'] == pytest.approx(float(sub[0x920A]))
+    assert row['capture_time'] == '2023-07-20T10:11:12.250000'
+    lat = [float(v) for v in gps[2]]
+    lon = [float(v) for v in gps[4]]
+    assert row['latitude'] == pytest.approx(lat[0] + lat[1] / 60 + lat[2] / 3600)
+    assert row['longitude'] == pytest.approx(-(lon[0] + lon[1] / 60 + lon[2] / 3600))
+    assert row['altitude'] == pytest.approx(float(gps[6]))
+
+
+def test_dji_xmp_fields(tmp_path):
+    row = parse_metadata(*read_jpeg_header(write_photo(tmp_path / 'a.jpg')))
+    assert row['relative_altitude'] == pytest.approx(99.8)
+    assert row['gimbal_pitch'] == pytest.approx(-90.0)
+    assert row['flight_yaw'] == pytest.approx(12.5)
+    assert row['h_accuracy'] == pytest.approx(0.05)
+    assert row['v_accuracy'] == pytest.approx(0.05)
+    assert 'rtk_std_lon' not in row
+
+
+def test_altitude_below_sea_level_and_no_xmp(tmp_path):
+    row = parse_metadata(*read_jpeg_header(write_photo(tmp_path / 'a.jpg', '>', altitude_ref=1, xmp=b'')))
+    assert row['altitude'] == pytest.approx(-2543.25)
+    assert 'relative_altitude' not in row
+
+
+def test_catalog_is_kept_outside_the_flight_and_reused(tmp_path, capsys):
+    output = tmp_path / 'MM Flight 01' / 'OUTPUT'
+    os.makedirs(output)
+    for name in ['a.jpg', 'b.JPG']:
+        write_photo(output / name)
+    catalogs = str(tmp_path / 'catalogs')
+    mtime = os.stat(output).st_mtime_ns
+    catalog = build_catalog(str(output), catalog_dir=catalogs)
+    assert list(catalog['name']) == ['a.jpg', 'b.JPG']
+    np.testing.assert_allclose(catalog['relative_altitude'], 99.8)
+    assert os.path.dirname(catalog_path(str(output), catalogs)) == catalogs
+    assert os.stat(output).st_mtime_ns == mtime
+    capsys.readouterr()
+    rows = photo_metadata([str(output / 'b.JPG')], catalog_dir=catalogs)
+    assert rows[str(output / 'b.JPG')]['altitude'] == pytest.approx(2543.25)
+    # served from the catalog, no photo read again
+    assert capsys.readouterr().out == ''
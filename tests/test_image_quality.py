@@ -0,0 +1,26 @@
+import os
+
+import pytest
+from PIL import Image
+
+import Image_Metadata
+from Image_Quality import photo_altitudes
+
+
+def test_photo_altitudes_skips_formats_without_a_catalog(tmp_path, monkeypatch):
+    output = tmp_path / 'MM Flight 01' / 'OUTPUT'
+    os.makedirs(output)
+    exif = Image.Exif()
+    exif.get_ifd(0x8825)[6] = 2500.0
+    for name in ['a.jpg', 'b.jpg']:
+        Image.new('RGB', (16, 16)).save(str(output / name), exif=exif)
+    Image.new('RGB', (16, 16)).save(str(output / 'c.png'))
+    paths = [str(output / name) for name in ['a.jpg', 'b.jpg', 'c.png']]
+    builds = []
+    build_catalog = Image_Metadata.build_catalog
+    monkeypatch.setattr(Image_Metadata, 'build_catalog', lambda *a, **k: builds.append(a) or build_catalog(*a, **k))
+    catalogs = str(tmp_path / 'catalogs')
+    for _ in range(2):
+        altitudes = photo_altitudes(paths, catalog_dir=catalogs)
+        assert altitudes == {paths[0]: pytest.approx(2500.0), paths[1]: pytest.approx(2500.0)}
+    assert len(builds) == 1
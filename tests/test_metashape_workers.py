@@ -0,0 +1,65 @@
+import sys
+import json
+
+import Metashape_Workers
+from Metashape_Workers import worker_command, run_worker_queue, read_result
+
+# stand-in worker: records when it runs, sleeps, then writes its result file (or exits with an error)
+WORKER = """
+import sys, json, time
+log, result, job = sys.argv[1:4]
+with open(log, 'a') as f:
+    f.write(f"start {job} {time.time()}\\n")
+time.sleep(0.2)
+with open(log, 'a') as f:
+    f.write(f"end {job} {time.time()}\\n")
+if job == 'bad':
+    sys.exit(3)
+with open(result, 'w') as f:
+    json.dump({'job': job}, f)
+"""
+
+
+def running_at_once(log):
+    events = []
+    with open(log) as f:
+        for line in f:
+            kind, job, t = line.split()
+            events.append((float(t), kind == 'start'))
+    running = most = 0
+    for _, start in sorted(events):
+        running += 1 if start else -1
+        most = max(most, running)
+    return most
+
+
+def test_worker_command_runs_the_script_in_metashape(monkeypatch):
+    monkeypatch.setattr(Metashape_Workers, 'METASHAPE_ARGS', ['--platform', 'offscreen'])
+    assert worker_command('w.py', ['-n', 3], 'metashape.sh') == ['metashape.sh', '--platform', 'offscreen',
+                                                                   '-r', 'w.py', '-n', '3']
+
+
+def test_queue_runs_at_most_workers_processes(monkeypatch, tmp_path):
+    monkeypatch.setattr(Metashape_Workers, 'POLL_SECONDS', 0.02)
+    log = str(tmp_path / 'log.txt')
+    names = ['a', 'b', 'c', 'd', 'bad']
+    jobs = []
+    for name in names:
+        result = tmp_path / (name + '.json')
+        # a stale result of an earlier run must not be reported
+        result.write_text(json.dumps({'job': 'stale'}))
+        jobs.append((name, [sys.executable, '-c', WORKER, log, str(result), name], str(result)))
+    started, finished = [], {}
+    run_worker_queue(jobs, 2, lambda job, result, code: finished.update({job: (result, code)}), started.append)
+
+    assert started == names
+    assert finished == {'a': ({'job': 'a'}, 0), 'b': ({'job': 'b'}, 0), 'c': ({'job': 'c'}, 0),
+                        'd': ({'job': 'd'}, 0), 'bad': (None, 3)}
+    assert running_at_once(log) == 2
+
+
+def test_read_result_of_a_missing_or_partial_file(tmp_path):
+    partial = tmp_path / 'partial.json'
+    partial.write_text('{"r000_c000": {"status": ')
+    assert read_result(str(tmp_path / 'missing.json')) is None
+    assert read_result(str(partial)) is None
@@ -0,0 +1,56 @@
+import os
+import importlib.util
+
+import pytest
+
+import Fake_Metashape
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Individual Functions',
+                      'MS_PSX_Setup_DJI.py')
+
+
+@pytest.fixture
+def setup_dji():
+    """ MS_PSX_Setup_DJI loaded like a Metashape console script, on a document with 3 cameras """
+    doc = Fake_Metashape.make_document(n_cameras=3, n_points=10)
+    spec = importlib.util.spec_from_file_location('MS_PSX_Setup_DJI', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module, doc
+
+
+def test_add_new_photos_skips_cameras_already_in_the_chunk(setup_dji):
+    module, doc = setup_dji
+    chunk = doc.chunk
+    photos = ['synthetic/IMG_00001.JPG',       # same path as a camera of the chunk
+              'other/IMG_00002.jpg',           # same label
+              'new/IMG_00003.JPG', 'new/IMG_00004.JPG',
+              'new/IMG_00003.JPG']             # repeated in photos
+    camera_index = module.index_cameras(chunk)
+    assert camera_index['labels'] == {'IMG_00000', 'IMG_00001', 'IMG_00002'}
+    assert module.add_new_photos(chunk, photos, 0, camera_index) == (2, 3)
+    assert [c.label for c in chunk.cameras] == ['IMG_00000', 'IMG_00001', 'IMG_00002', 'IMG_00003', 'IMG_00004']
+    assert {'IMG_00003', 'IMG_00004'} <= camera_index['labels']
+    # adding the same photos again only skips
+    assert module.add_new_photos(chunk, photos, 0) == (0, 5)
+    assert len(chunk.cameras) == 5
+
+
+def test_setup_psx_adds_new_flights_to_their_groups(setup_dji, tmp_path):
+    module, doc = setup_dji
+    flights = {}
+    for flight, names in [('060422', ['DJI_0001.JPG', 'DJI_0002.JPG', 'notes.txt']), ('070422', ['DJI_0003.JPG'])]:
+        folder = tmp_path / flight / '100MEDIA'
+        folder.mkdir(parents=True)
+        for name in names:
+            (folder / name).write_text('')
+        flights[flight] = str(tmp_path / flight)
+    chunk = module.setup_psx(flights)
+    assert chunk.label == 'Raw_Photos'
+    groups = {c.label: c.group.label for c in chunk.cameras if c.label.startswith('DJI')}
+    assert groups == {'DJI_0001': '060422', 'DJI_0002': '060422', 'DJI_0003': '070422'}
+    # a second run over the same folders adds nothing
+    doc.chunk = chunk
+    cameras = len(chunk.cameras)
+    module.setup_psx(flights)
+    assert len(chunk.cameras) == cameras
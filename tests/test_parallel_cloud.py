@@ -0,0 +1,98 @@
+import os
+import sys
+
+import pytest
+
+import Fake_Metashape
+import Metashape_Workers
+import Parallel_Cloud
+from Parallel_Cloud import build_clouds_parallel, run_workers, worker_count
+
+# stand-in for `metashape -r Cloud_Worker.py -project <psx> -chunk <label> ...`: logs when it runs and
+# writes the result file of Cloud_Worker.py, the chunk labelled Flight_3_PostError fails without a result
+STAND_IN = """
+import sys, os, json, time
+args = sys.argv[sys.argv.index('-r') + 2:]
+project = args[args.index('-project') + 1]
+label = args[args.index('-chunk') + 1]
+root = os.path.splitext(project)[0]
+with open(root + '.log', 'w') as f:
+    f.write(f"{time.time()}\\n")
+    time.sleep(0.3)
+    f.write(f"{time.time()}\\n")
+if label == 'Flight_3_PostError':
+    sys.exit(2)
+stages = {'open': 0.1, 'depth_maps': 1.0, 'point_cloud': 0.5, 'filter': 0.2, 'save': 0.2}
+with open(root + '.result.json', 'w') as f:
+    json.dump({'project': project, 'chunk': label, 'filtered_chunk': label + '_PCFiltered', 'stages': stages,
+               'error': None, 'total': 2.0, 'args': args}, f)
+"""
+
+
+@pytest.fixture
+def stand_in(monkeypatch, tmp_path):
+    path = tmp_path / 'stand_in.py'
+    path.write_text(STAND_IN)
+    monkeypatch.setattr(Metashape_Workers, 'METASHAPE_ARGS', [str(path)])
+    monkeypatch.setattr(Metashape_Workers, 'POLL_SECONDS', 0.02)
+
+
+def most_running(projects):
+    events = []
+    for _, project in projects:
+        with open(os.path.splitext(project)[0] + '.log') as f:
+            start, end = [float(line) for line in f]
+        events += [(start, 1), (end, -1)]
+    running = most = 0
+    for _, step in sorted(events):
+        running += step
+        most = max(most, running)
+    return most
+
+
+def test_worker_count_is_bounded_by_memory(monkeypatch):
+    monkeypatch.setattr(Parallel_Cloud, 'available_memory_gb', lambda: 40.0)
+    assert worker_count(5, 8, memory_per_worker_gb=16.0) == 2
+    assert worker_count(1, 8, memory_per_worker_gb=16.0) == 1
+    monkeypatch.setattr(Parallel_Cloud, 'available_memory_gb', lambda: 4.0)
+    # always at least one worker
+    assert worker_count(5, 8, memory_per_worker_gb=16.0) == 1
+    monkeypatch.setattr(Parallel_Cloud, 'available_memory_gb', lambda: None)
+    assert worker_count(5, 3) == 3
+
+
+def test_run_workers_bounds_the_processes_and_collects_results(stand_in, tmp_path, capsys):
+    projects = [(f'Flight_{i}_PostError', str(tmp_path / f'Flight_{i}_PostError.psx')) for i in range(1, 5)]
+    results = run_workers(projects, 'auto', 2, metashape_exe=sys.executable, retain=0.8)
+    assert most_running(projects) == 2
+    by_chunk = {r['chunk']: r for r in results}
+    assert sorted(by_chunk) == [label for label, _ in projects]
+    assert by_chunk['Flight_1_PostError']['args'][-4:] == ['-maxconf', 'auto', '-retain', '0.8']
+    assert by_chunk['Flight_3_PostError']['error'] == "worker exited with code 2 without a result"
+    assert by_chunk['Flight_3_PostError']['stages'] == {}
+    out = capsys.readouterr().out
+    assert out.count('Starting point cloud worker for') == 4
+    assert 'Worker for Flight_3_PostError finished with error' in out
+
+
+def test_build_clouds_parallel_reports_the_workers(stand_in, tmp_path):
+    doc = Fake_Metashape.make_document(n_cameras=12, n_points=500, path=str(tmp_path / 'project.psx'))
+    labels = []
+    for i in range(1, 4):
+        copy = doc.chunk.copy()
+        copy.label = f'Flight_{i}_PostError'
+        labels.append(copy.label)
+    proclog = str(tmp_path / 'proclog.txt')
+    built = build_clouds_parallel(doc, labels, 2, max_workers=3, memory_per_worker_gb=0, import_back=False,
+                                  metashape_exe=sys.executable, proclog=proclog)
+    assert sorted(built) == ['Flight_1_PostError_PCFiltered', 'Flight_2_PostError_PCFiltered']
+    folder = str(tmp_path / 'project Clouds')
+    assert sorted(os.listdir(folder)) == sorted(
+        [label + ext for label in labels for ext in ('.psx', '.log')]
+        + [label + '.result.json' for label in labels[:2]])
+    with open(proclog) as f:
+        report = f.read()
+    assert 'Parallel point clouds: 3 chunks, 3 workers' in report
+    assert 'depth_maps: 2.0 s summed over workers' in report
+    assert 'failed: Flight_3_PostError' in report
+    assert 'per-date projects kept in ' + folder in report
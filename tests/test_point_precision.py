@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from pyproj import CRS, Transformer
+
+import Fake_Metashape
+import point_precision
+from point_precision import CHECK_POINTS, HEADER, project_points, epsg_transformer, precision_table
+
+
+@pytest.fixture(scope='module')
+def chunk():
+    return Fake_Metashape.make_document(n_cameras=10, n_points=500).chunk
+
+
+def test_precision_table_matches_the_per_point_export(chunk):
+    # the loop of the original Export_Point_Coordinate_Precision script
+    M = chunk.transform.matrix
+    T = chunk.crs.localframe(M.mulp(chunk.region.center)) * M
+    R = chunk.transform.scale * T.rotation() if chunk.transform.scale else T.rotation()
+    rows = []
+    for point in chunk.tie_points.points:
+        if not point.valid:
+            continue
+        V = M * point.coord
+        V.size = 3
+        coord = chunk.crs.project(V)
+        cov = R * point.cov * R.t()
+        rows.append([coord[0], coord[1], coord[2], cov[0, 0] ** 0.5 * 1000, cov[1, 1] ** 0.5 * 1000,
+                     cov[2, 2] ** 0.5 * 1000, cov[0, 0], cov[0, 1], cov[0, 2], cov[1, 1], cov[1, 2], cov[2, 2]])
+    table = precision_table(chunk)
+    assert table.shape == (len(rows), len(HEADER))
+    np.testing.assert_allclose(table, np.array(rows), rtol=1e-9, atol=1e-9)
+
+
+class EpsgCRS():
+    """ Stand-in for a Metashape EPSG coordinate system, crs.project through pyproj point by point """
+
+    def __init__(self, code, offset=0.0):
+        self.authority = 'EPSG::' + str(code)
+        self.name = self.authority
+        self.offset = offset
+        self.calls = 0
+        self.transformer = Transformer.from_crs('EPSG:4978', CRS.from_epsg(code).to_3d(), always_xy=True)
+
+    def __bool__(self):
+        return True
+
+    def project(self, v):
+        self.calls += 1
+        x, y, z = self.transformer.transform(v[0], v[1], v[2])
+        return Fake_Metashape.Vector([x + self.offset, y, z])
+
+
+def geocentric(n):
+    # points around Boulder, Colorado, at 1500-4000 m ellipsoidal height
+    rng = np.random.default_rng(3)
+    to_ecef = Transformer.from_crs('EPSG:4979', 'EPSG:4978', always_xy=True)
+    x, y, z = to_ecef.transform(rng.uniform(-105.6, -105.0, n), rng.uniform(39.8, 40.2, n), rng.uniform(1500, 4000, n))
+    return np.column_stack([x, y, z])
+
+
+def test_wgs84_geographic_matches_pyproj():
+    V = geocentric(1000)
+    crs = EpsgCRS(4326)
+    expected = np.column_stack(Transformer.from_crs('EPSG:4978', 'EPSG:4979', always_xy=True).transform(*V.T))
+    np.testing.assert_allclose(project_points(crs, V), expected, rtol=0, atol=1e-6)
+    assert crs.calls == 0
+
+
+@pytest.mark.parametrize('code', [32613, 6342, 4269])
+def test_epsg_systems_are_projected_in_one_batch(code):
+    V = geocentric(1000)
+    crs = EpsgCRS(code)
+    projected = project_points(crs, V)
+    # only the check points go through crs.project
+    assert crs.calls == CHECK_POINTS
+    crs.calls = 0
+    np.testing.assert_allclose(projected, point_precision._project_each(crs, V), rtol=0, atol=1e-6)
+
+
+def test_batch_falls_back_when_metashape_disagrees(capsys):
+    V = geocentric(100)
+    crs = EpsgCRS(32613, offset=0.01)
+    projected = project_points(crs, V)
+    assert crs.calls == CHECK_POINTS + 100
+    assert 'point by point' in capsys.readouterr().out
+    assert projected[0, 0] == pytest.approx(EpsgCRS(32613).project(V[0])[0] + 0.01)
+
+
+def test_compound_systems_are_left_to_metashape():
+    # NAD83(2011) / UTM 13N + NAVD88 height needs a geoid
+    assert epsg_transformer(EpsgCRS(6342)) is not None
+    crs = EpsgCRS(6342)
+    crs.authority = 'EPSG::6349'
+    assert epsg_transformer(crs) is None
+    assert epsg_transformer(crs, height=False) is not None
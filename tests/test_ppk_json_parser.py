@@ -0,0 +1,59 @@
+import csv
+import json
+import math
+
+import pytest
+
+from PPK_json_parser import iter_geotaglog_images, convert_geotaglog
+
+
+def geotaglog(n):
+    # Wingtra coordinates are latitude, longitude, altitude and the angles are in radians
+    images = []
+    for i in range(n):
+        images.append({'imageName': f'IMG_{i:04d}.JPG',
+                       'geotaggedImage': {'geoRef': {'coordinate': [40.25 + i * 1e-4, -105.5 + i * 1e-4, 2500.0 + i],
+                                                     'yaw': 0.01 * i, 'pitch': -0.02, 'roll': 0.03,
+                                                     'hAccuracy': 0.02, 'vAccuracy': 0.03}}})
+    return {'version': 2, 'flight': {'name': 'MM Flight 01'}, 'images': images,
+            'footer': {'count': n}}
+
+
+@pytest.mark.parametrize('layout', ['indent', 'spaced', 'compact'])
+def test_streamed_images_match_json_load(tmp_path, layout):
+    log = geotaglog(25)
+    if layout == 'indent':
+        text = json.dumps(log, indent=4)
+    elif layout == 'spaced':
+        # long white space between the key and its list, and between items
+        text = json.dumps(log).replace('"images": [', '"images":' + ' ' * 40 + '\n\n[').replace('}}}, ', '}}},\n' + ' ' * 30)
+    else:
+        text = json.dumps(log, separators=(',', ':'))
+    path = tmp_path / 'flight.geotaglog'
+    path.write_text(text)
+    with open(path) as f:
+        expected = json.load(f)['images']
+    for read_size in [7, 64, 1 << 20]:
+        assert list(iter_geotaglog_images(str(path), read_size=read_size)) == expected
+
+
+def test_log_without_images(tmp_path):
+    path = tmp_path / 'flight.geotaglog'
+    path.write_text(json.dumps({'version': 2, 'flight': {}}, indent=2))
+    assert list(iter_geotaglog_images(str(path), read_size=7)) == []
+
+
+def test_convert_geotaglog_writes_degrees(tmp_path):
+    path = tmp_path / 'flight.geotaglog'
+    path.write_text(json.dumps(geotaglog(5), indent=2))
+    out = str(tmp_path / 'flight geotags.csv')
+    assert convert_geotaglog(str(path), out, batch_size=2) == 5
+    with open(out, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0][0] == 'image name' and len(rows) == 6
+    name, lon, lat, alt, yaw, pitch, roll, hacc, vacc = rows[4]
+    assert name == 'IMG_0003.JPG'
+    assert (float(lon), float(lat), float(alt)) == pytest.approx((-105.4997, 40.2503, 2503.0))
+    assert (float(yaw), float(pitch), float(roll)) == pytest.approx((math.degrees(0.03), math.degrees(-0.02),
+                                                                     math.degrees(0.03)))
+    assert (float(hacc), float(vacc)) == (0.02, 0.03)
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+import Fake_Metashape
+from point_precision import (HEADER, export_chunk_precision, read_precision, read_precision_header,
+                             precision_files, precision_table, write_precision_binary)
+
+
+@pytest.fixture(scope='module')
+def chunk():
+    return Fake_Metashape.make_document(n_cameras=10, n_points=500).chunk
+
+
+def test_text_and_binary_exports_hold_the_same_table(chunk, tmp_path):
+    text = str(tmp_path / 'chunk_pt_prec.txt')
+    assert export_chunk_precision(chunk, text) == 500
+    export_chunk_precision(chunk, text, binary=True)
+    text_columns, text_header = read_precision(text)
+    binary_columns, binary_header = read_precision(str(tmp_path / 'chunk_pt_prec.npy'))
+    assert text_header['columns'] == binary_header['columns'] == HEADER
+    assert text_header['points'] == binary_header['points'] == 500
+    assert binary_header['chunk'] == chunk.label
+    for column in HEADER:
+        # the text file is rounded to 5 (X, Y, Z), 7 (sX, sY, sZ) and 9 (covariance) decimals
+        np.testing.assert_allclose(text_columns[column], binary_columns[column], rtol=0, atol=1e-5)
+
+
+def test_binary_round_trip_is_exact(chunk, tmp_path):
+    table = precision_table(chunk)
+    npy = write_precision_binary(str(tmp_path / 'chunk_pt_prec.txt'), table)
+    columns, header = read_precision(npy, mmap=False)
+    np.testing.assert_array_equal(np.column_stack([columns[c] for c in HEADER]), table)
+    assert header['units']['sZ(mm)'] == 'mm'
+    assert read_precision_header(npy)['crs'] is None
+
+
+def test_precision_files_prefer_binary(chunk, tmp_path):
+    for name in ['a', 'b']:
+        export_chunk_precision(chunk, str(tmp_path / (name + '_pt_prec.txt')), points=chunk.tie_points.points)
+    export_chunk_precision(chunk, str(tmp_path / 'b_pt_prec.txt'), binary=True)
+    names = [os.path.basename(p) for p in precision_files(str(tmp_path))]
+    assert names == ['a_pt_prec.txt', 'b_pt_prec.npy']
+
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+
+from point_precision import HEADER, write_precision_binary, write_precision_table
+from precision_index import PrecisionIndex, index_path, precision_statistics
+from geometry import points_in_polygon
+
+
+@pytest.fixture(scope='module')
+def table():
+    rng = np.random.default_rng(1)
+    table = np.zeros((5000, len(HEADER)))
+    table[:, 0] = rng.uniform(0, 1000, len(table))
+    table[:, 1] = rng.uniform(0, 500, len(table))
+    table[:, 3:6] = rng.uniform(1, 100, (len(table), 3))
+    return table
+
+
+@pytest.fixture(scope='module')
+def index(table, tmp_path_factory):
+    path = write_precision_binary(str(tmp_path_factory.mktemp('index') / 'a_pt_prec.txt'), table)
+    return PrecisionIndex.open(path)
+
+
+def test_radius_matches_brute_force(index, table):
+    d2 = np.square(table[:, 0] - 400) + np.square(table[:, 1] - 250)
+    expected = precision_statistics(table[d2 <= 30 ** 2, 3:6])
+    assert index.radius(400, 250, 30) == pytest.approx(expected)
+
+
+def test_knn_matches_brute_force(index, table):
+    d2 = np.square(table[:, 0] - 10) + np.square(table[:, 1] - 490)
+    nearest = np.argsort(d2)[:50]
+    stats = index.knn(10, 490, 50)
+    assert stats['distance'] == pytest.approx(np.sqrt(d2[nearest].max()))
+    del stats['distance']
+    assert stats == pytest.approx(precision_statistics(table[nearest, 3:6]))
+
+
+def test_polygon_matches_brute_force(index, table):
+    triangle = np.array([[100, 100], [600, 50], [300, 450]])
+    inside = points_in_polygon(table[:, 0], table[:, 1], triangle)
+    assert index.polygon(triangle) == pytest.approx(precision_statistics(table[inside, 3:6]))
+
+
+def test_batch_needs_r_or_k(index):
+    with pytest.raises(ValueError):
+        index.batch([[0, 0]])
+    assert len(index.batch([[0, 0], [500, 250]], k=3)) == 2
+
+
+def test_index_is_rebuilt_when_the_file_changes(table, tmp_path):
+    path = str(tmp_path / 'a_pt_prec.txt')
+    write_precision_table(path, table[:100])
+    assert PrecisionIndex.open(path).radius(500, 250, 2000)['count'] == 100
+    assert os.path.exists(index_path(path))
+    write_precision_table(path, table[:200])
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert PrecisionIndex.open(path).radius(500, 250, 2000)['count'] == 200
+
+
+def test_points_in_polygon_even_odd():
+    square = [[0, 0], [10, 0], [10, 10], [0, 10]]
+    x = np.array([5, 15, -1, 9.9])
+    y = np.array([5, 5, 5, 0.1])
+    assert points_in_polygon(x, y, square).tolist() == [True, False, False, True]
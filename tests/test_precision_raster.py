@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip('rasterio')
+from rasterio.transform import Affine
+
+from point_precision import HEADER, write_precision_binary
+from precision_raster import export_precision_raster, grid_from_dem, rasterize_precision, NODATA
+
+# (x, y, sZ mm) on a 2 x 2 grid of 2 m cells with its top left corner at (100, 204)
+POINTS = [(100.5, 203.5, 10.0), (101.5, 202.5, 20.0), (101.9, 202.1, 40.0),   # top left
+          (103.0, 203.0, 30.0),                                               # top right
+          (100.2, 200.5, 5.0),                                                # bottom left
+          (99.0, 203.0, 99.0), (102.0, 199.0, 99.0)]                          # outside
+
+
+@pytest.fixture
+def files(tmp_path):
+    # 4 x 3 pixel DEM, 1 m pixels
+    dem = str(tmp_path / 'dem.tif')
+    with rasterio.open(dem, 'w', driver='GTiff', width=4, height=3, count=1, dtype='float32',
+                       transform=Affine(1.0, 0, 100.0, 0, -1.0, 204.0), crs='EPSG:6342') as dst:
+        dst.write(np.zeros((1, 3, 4), dtype=np.float32))
+    table = np.zeros((len(POINTS), len(HEADER)))
+    table[:, [0, 1, 5]] = POINTS
+    return dem, write_precision_binary(str(tmp_path / 'a_pt_prec.txt'), table)
+
+
+def test_grid_from_dem_scales_the_dem_pixels(files):
+    grid = grid_from_dem(files[0], scale=2)
+    assert grid['transform'] == Affine(2.0, 0, 100.0, 0, -2.0, 204.0)
+    # the 3 pixel high DEM needs a second, partly covered row of cells
+    assert (grid['width'], grid['height']) == (2, 2)
+    assert grid['crs'].to_epsg() == 6342
+
+
+@pytest.mark.parametrize('statistic, top_left', [('mean', 70 / 3), ('rms', np.sqrt(2100 / 3)), ('max', 40.0)])
+def test_statistics_per_cell(files, statistic, top_left):
+    grid = grid_from_dem(files[0], scale=2)
+    # blocks of 2 points, cells collect points from several blocks
+    values, count = rasterize_precision(files[1], grid, statistic, block_size=2)
+    np.testing.assert_array_equal(count, [[3, 1], [1, 0]])
+    np.testing.assert_allclose(values, [[top_left / 1000, 0.030], [0.005, np.nan]], rtol=1e-6)
+
+
+def test_export_writes_the_statistic_and_count_bands(files, tmp_path):
+    out = export_precision_raster(files[1], files[0], 'max', scale=2, out_path=str(tmp_path / 'sz.tif'))
+    with rasterio.open(out) as src:
+        assert src.count == 2 and src.nodata == NODATA
+        assert src.transform == Affine(2.0, 0, 100.0, 0, -2.0, 204.0)
+        np.testing.assert_allclose(src.read(1), [[0.040, 0.030], [0.005, NODATA]], rtol=1e-6)
+        np.testing.assert_array_equal(src.read(2), [[3, 1], [1, 0]])
@@ -0,0 +1,45 @@
+import csv
+
+import numpy as np
+
+from point_precision import HEADER, write_precision_table, write_precision_binary
+from precision_stats import file_statistics, folder_statistics, write_precision_results
+
+
+def write_table(folder, name, sz, binary=False):
+    table = np.zeros((len(sz), len(HEADER)))
+    table[:, 3] = 1.0
+    table[:, 4] = 2.0
+    table[:, 5] = sz
+    path = str(folder / (name + '_pt_prec.txt'))
+    if binary:
+        return write_precision_binary(path, table)
+    write_precision_table(path, table)
+    return path
+
+
+def test_file_statistics_text_and_binary(tmp_path):
+    sz = np.random.default_rng(0).uniform(5, 50, 2001)
+    for path in [write_table(tmp_path, 'a', sz), write_table(tmp_path, 'b', sz, binary=True)]:
+        # small blocks to cover the block-wise accumulation
+        stats = file_statistics(path, block_size=300)
+        assert stats['points'] == 2001
+        assert abs(stats['X mean'] - 0.001) < 1e-12 and abs(stats['Y rms'] - 0.002) < 1e-12
+        assert abs(stats['Z mean'] - sz.mean() / 1000) < 1e-9
+        assert abs(stats['Z rms'] - np.sqrt(np.square(sz).mean()) / 1000) < 1e-9
+        # median and p95 come from a log histogram with 1000 bins per decade
+        assert abs(stats['Z median'] / (np.median(sz) / 1000) - 1) < 5e-3
+        assert abs(stats['Z p95'] / (np.percentile(sz, 95) / 1000) - 1) < 5e-3
+
+
+def test_folder_statistics_ranked_results(tmp_path):
+    write_table(tmp_path, 'coarse', np.full(10, 30.0))
+    write_table(tmp_path, 'fine', np.full(10, 10.0), binary=True)
+    stats = folder_statistics(str(tmp_path), max_workers=1)
+    assert sorted(s['file'] for s in stats) == ['coarse_pt_prec.txt', 'fine_pt_prec.npy']
+    out = str(tmp_path / 'precision_results.csv')
+    write_precision_results(stats, out)
+    with open(out) as f:
+        rows = list(csv.reader(f))
+    assert rows[0][:8] == ['File', 'Points', 'X Mean', 'Y Mean', 'Z Mean', 'X RMS', 'Y RMS', 'Z RMS']
+    assert [row[0] for row in rows[1:]] == ['fine_pt_prec.npy', 'coarse_pt_prec.txt']
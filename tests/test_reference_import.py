@@ -0,0 +1,42 @@
+import csv
+
+import Reference_Import
+from Reference_Import import sniff_layout, merge_reference_csvs, MERGED_HEADER
+
+
+def write_csv(path, rows, delimiter=','):
+    with open(path, 'w', newline='') as f:
+        csv.writer(f, delimiter=delimiter).writerows(rows)
+    return str(path)
+
+
+def test_sniff_layout_from_header_names(tmp_path):
+    path = write_csv(tmp_path / 'a.csv', [['Image Name', 'Latitude', 'Longitude', 'Altitude', 'Yaw', 'Pitch', 'Roll'],
+                                          ['a.jpg', '40.1', '-105.2', '2500', '10', '0', '1']])
+    layout = sniff_layout(path)
+    assert layout['delimiter'] == ','
+    assert layout['columns'] == {'label': 0, 'latitude': 1, 'longitude': 2, 'altitude': 3,
+                                 'yaw': 4, 'pitch': 5, 'roll': 6}
+
+
+def test_sniff_layout_is_cached_by_header(tmp_path):
+    header = ['label', 'lon', 'lat', 'alt']
+    first = sniff_layout(write_csv(tmp_path / 'a.txt', [header, ['a.jpg', '1', '2', '3']], '\t'))
+    second = sniff_layout(write_csv(tmp_path / 'b.txt', [header, ['b.jpg', '4', '5', '6']], '\t'))
+    assert first is second
+    assert first['delimiter'] == '\t'
+    assert ('\t', tuple(header)) in Reference_Import._layout_cache
+
+
+def test_merge_normalizes_column_order_and_skips_missing_files(tmp_path):
+    a = write_csv(tmp_path / 'a.csv', [['name', 'latitude', 'longitude', 'altitude'], ['a.jpg', '40', '-105', '2500']])
+    b = write_csv(tmp_path / 'b.csv', [['file', 'longitude', 'latitude', 'altitude', 'hacc', 'vacc'],
+                                       ['b.jpg', '-106', '41', '2600', '0.02', '0.03'], []])
+    merged = str(tmp_path / 'merged.csv')
+    nrows, used = merge_reference_csvs([a, str(tmp_path / 'missing.csv'), b], merged)
+    assert (nrows, used) == (2, [a, b])
+    with open(merged, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == MERGED_HEADER
+    assert rows[1] == ['a.jpg', '-105', '40', '2500', '', '', '', '', '']
+    assert rows[2] == ['b.jpg', '-106', '41', '2600', '', '', '', '0.02', '0.03']
@@ -0,0 +1,63 @@
+import pytest
+
+import Fake_Metashape
+from Save_Policy import SavePolicy, save_document, format_bytes
+
+
+class CountingDocument():
+    path = ''
+
+    def __init__(self):
+        self.saves = 0
+
+    def save(self, path=None):
+        self.saves += 1
+
+
+def test_unknown_mode_raises():
+    with pytest.raises(ValueError):
+        SavePolicy('never')
+
+
+@pytest.mark.parametrize('mode, saved', [
+    ('stage', ['stage', 'milestone', 'error']),
+    ('milestone', ['milestone']),
+    ('risky', ['risky', 'milestone', 'error']),
+])
+def test_events_saved_by_mode(mode, saved):
+    policy = SavePolicy(mode)
+    doc = CountingDocument()
+    for event in ['stage', 'milestone', 'risky', 'error']:
+        assert policy.save(doc, event) == (event in saved)
+    assert doc.saves == len(saved)
+
+
+def test_final_saves_only_unsaved_work():
+    policy = SavePolicy('milestone')
+    doc = CountingDocument()
+    assert not policy.save(doc, 'final')
+    policy.save(doc, 'stage')
+    assert policy.save(doc, 'final')
+    summary = policy.summary()
+    assert (summary['saves'], summary['skipped']) == (1, 2)
+
+
+def test_bytes_are_only_measured_when_asked(tmp_path):
+    doc = Fake_Metashape.Document()
+    path = str(tmp_path / 'project.psx')
+    policy = SavePolicy('stage')
+    policy.save(doc, 'stage', path=path)
+    assert policy.records[-1]['bytes'] is None
+
+
+def test_save_document_without_policy_skips_risky():
+    doc = CountingDocument()
+    assert not save_document(doc, None, 'risky')
+    assert save_document(doc, None, 'stage')
+    assert doc.saves == 1
+
+
+def test_format_bytes():
+    assert format_bytes(None) == 'unknown'
+    assert format_bytes(512) == '512.0 B'
+    assert format_bytes(3 * 1024 ** 3) == '3.0 GB'
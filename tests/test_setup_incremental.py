@@ -0,0 +1,36 @@
+import Fake_Metashape
+from Setup import add_new_cameras, align_new_cameras
+
+
+def test_only_new_cameras_are_added_and_aligned():
+    doc = Fake_Metashape.make_document(n_cameras=6, n_points=500)
+    source = doc.chunk
+    target = source.copy()
+    target.label = 'Raw_Photos_Align'
+    # the aligned chunk misses the last two cameras of the first flight and all of a second flight
+    target.remove(target.cameras[4:])
+    group = source.addCameraGroup()
+    group.label = 'Flight_2'
+    source.addPhotos(['flight2/IMG_10000.JPG', 'flight2/IMG_10001.JPG'], group=1)
+    aligned = {camera.label: camera.transform for camera in target.cameras}
+    assert all(transform is not None for transform in aligned.values())
+
+    new_cameras = add_new_cameras(source, target)
+    assert [c.label for c in new_cameras] == ['IMG_00004', 'IMG_00005', 'IMG_10000', 'IMG_10001']
+    assert [g.label for g in target.camera_groups] == ['Flight_1', 'Flight_2']
+    assert {c.label: c.group.label for c in new_cameras} == {'IMG_00004': 'Flight_1', 'IMG_00005': 'Flight_1',
+                                                            'IMG_10000': 'Flight_2', 'IMG_10001': 'Flight_2'}
+    assert all(c.transform is None for c in new_cameras)
+    # nothing new the second time
+    assert add_new_cameras(source, target) == []
+
+    calls = []
+    match_photos = target.matchPhotos
+    target.matchPhotos = lambda **kwargs: calls.append(kwargs) or match_photos(**kwargs)
+    align_new_cameras(target, new_cameras, {'downscale': 1, 'keep_keypoints': False, 'reset_matches': True})
+    assert len(calls) == 1
+    assert [c.label for c in calls[0]['cameras']] == [c.label for c in new_cameras]
+    assert (calls[0]['keep_keypoints'], calls[0]['reset_matches'], calls[0]['downscale']) == (True, False, 1)
+    assert all(c.transform is not None for c in new_cameras)
+    # the cameras aligned before keep their transforms
+    assert all(camera.transform is aligned[camera.label] for camera in target.cameras if camera.label in aligned)
@@ -0,0 +1,98 @@
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import Metashape
+import Fake_Metashape
+import Metashape_Workers
+import Tiled_Export
+from Save_Policy import SavePolicy
+from Tiled_Export import tile_grid, write_vrt, tile_path, DEM_NODATA
+
+
+def test_tile_grid_covers_the_bounds_on_the_pixel_grid():
+    origin, width, height, tiles = tile_grid((100.3, 200.1, 350.0, 330.7), 0.5, 100)
+    assert origin == (100.0, 331.0)
+    assert (width, height) == (500, 262)
+    assert [t['name'] for t in tiles][:6] == ['r000_c000', 'r000_c001', 'r000_c002', 'r000_c003', 'r000_c004',
+                                              'r001_c000']
+    assert sum(t['width'] * t['height'] for t in tiles) == width * height
+    last = tiles[-1]
+    assert (last['xoff'], last['yoff'], last['width'], last['height']) == (400, 200, 100, 62)
+    assert last['bbox'] == [300.0, 200.0, 350.0, 231.0]
+    assert all(t['status'] == 'pending' for t in tiles)
+
+
+def test_tile_grid_of_an_empty_extent_has_one_pixel():
+    origin, width, height, tiles = tile_grid((10.0, 10.0, 10.0, 10.0), 1.0, 64)
+    assert (width, height, len(tiles)) == (1, 1, 1)
+
+
+@pytest.mark.parametrize('product, bands', [('dem', 1), ('ortho', 4)])
+def test_write_vrt_without_gdal(monkeypatch, tmp_path, product, bands):
+    monkeypatch.setattr(Tiled_Export, 'gdal', None)
+    origin, width, height, tiles = tile_grid((0.0, 0.0, 30.0, 20.0), 1.0, 16)
+    tiles[1]['status'] = 'failed'
+    for tile in tiles:
+        if tile['status'] == 'pending':
+            tile['status'] = 'done'
+    state = {'product': product, 'crs': 'LOCAL_CS["Local Coordinates (m)"]', 'resolution': 1.0,
+             'origin': list(origin), 'width': width, 'height': height, 'folder': str(tmp_path / 'x_tiles'),
+             'base': 'x', 'tiles': tiles}
+    vrt = write_vrt(str(tmp_path / 'x.vrt'), state)
+    root = ET.parse(vrt).getroot()
+    assert (root.get('rasterXSize'), root.get('rasterYSize')) == ('30', '20')
+    assert root.find('SRS').text == state['crs']
+    assert [float(v) for v in root.find('GeoTransform').text.split(',')] == [0.0, 1.0, 0.0, 20.0, 0.0, -1.0]
+    band_elements = root.findall('VRTRasterBand')
+    assert len(band_elements) == bands
+    assert (band_elements[0].find('NoDataValue') is not None) == (product == 'dem')
+    if product == 'dem':
+        assert float(band_elements[0].find('NoDataValue').text) == DEM_NODATA
+    sources = band_elements[0].findall('SimpleSource')
+    # the failed tile is left out of the mosaic
+    assert [s.find('SourceFilename').text for s in sources] == [
+        'x_tiles/' + os.path.basename(tile_path(state, t)) for t in tiles if t['status'] == 'done']
+    dst = sources[-1].find('DstRect')
+    assert (dst.get('xOff'), dst.get('yOff'), dst.get('xSize'), dst.get('ySize')) == ('16', '16', '14', '4')
+
+
+# stand-in for `metashape -r Tile_Worker.py ...`: writes the requested tiles and their result file
+STAND_IN = """
+import sys, json, os
+args = sys.argv[sys.argv.index('-r') + 2:]
+args = dict(zip(args[::2], args[1::2]))
+with open(args['-state']) as f:
+    state = json.load(f)
+results = {}
+for name in args['-tiles'].split(','):
+    with open(os.path.join(state['folder'], state['base'] + '_' + name + '.tif'), 'w') as f:
+        f.write('tile')
+    results[name] = {'status': 'done', 'seconds': 0.5, 'error': None}
+with open(args['-result'], 'w') as f:
+    json.dump(results, f)
+"""
+
+
+def test_parallel_export_saves_through_the_policy(monkeypatch, tmp_path):
+    stand_in = tmp_path / 'stand_in.py'
+    stand_in.write_text(STAND_IN)
+    monkeypatch.setattr(Metashape_Workers, 'METASHAPE_ARGS', [str(stand_in)])
+    monkeypatch.setattr(Metashape_Workers, 'POLL_SECONDS', 0.02)
+    monkeypatch.setattr(Tiled_Export, 'gdal', None)
+    doc = Fake_Metashape.make_document(n_cameras=20, n_points=1000, path=str(tmp_path / 'project.psx'))
+    chunk = doc.chunk
+    chunk.buildDem(resolution=0.5)
+    projection = Metashape.OrthoProjection()
+    projection.crs = chunk.crs
+    # the milestone mode does not save risky events unless forced
+    policy = SavePolicy('milestone')
+
+    report = Tiled_Export.export_raster_tiled(doc, chunk, str(tmp_path / 'dem.vrt'), 'dem', projection,
+                                              resolution=5.0, tile_size=4, workers=3, metashape_exe=sys.executable,
+                                              save_policy=policy)
+    assert [(r['event'], r['label']) for r in policy.records] == [('risky', 'Tiled export dem')]
+    assert report['exported'] == report['tiles'] > 1 and report['failed'] == []
+    assert report['vrt'] == str(tmp_path / 'dem.vrt')